@@ -0,0 +1,141 @@
+# ai-report-generator/backend/alignment.py
+#
+# Assigns Whisper segments to diarization speakers and groups them into dialogue turns.
+# Each segment gets the speaker it overlaps with the most (summed over all of that
+# speaker's turns), computed for all segments at once with NumPy instead of scanning
+# every diarization turn per segment.
+
+import string
+import numpy as np
+
+UNKNOWN_SPEAKER = "Unknown"
+# Zero-length segments are widened to this many seconds so they can still overlap a turn
+MIN_SEGMENT_SECONDS = 1e-3
+
+
+def speaker_labels(unique_speakers):
+    """Display label per diarization speaker: A, B, C, ... (raw label beyond Z)."""
+    return {
+        speaker: string.ascii_uppercase[idx] if idx < len(string.ascii_uppercase) else speaker
+        for idx, speaker in enumerate(unique_speakers)
+    }
+
+
+def assign_by_overlap(seg_starts, seg_ends, turn_starts, turn_ends, turn_speakers, num_speakers):
+    """
+    Vectorized max-overlap assignment.
+
+    seg_*: per-segment start/end times. turn_*: per-diarization-turn start/end and speaker
+    index in [0, num_speakers). Returns an int array with the index of the speaker that
+    overlaps each segment the most, or -1 where no turn overlaps it.
+
+    Turns are sorted by start once. For each segment, np.searchsorted on the turn starts and on
+    the running maximum of turn ends gives the contiguous range of turns that can overlap it,
+    so the work is proportional to segments + overlapping pairs rather than segments x turns.
+    """
+    seg_starts = np.asarray(seg_starts, dtype=np.float64)
+    seg_ends = np.maximum(np.asarray(seg_ends, dtype=np.float64), seg_starts + MIN_SEGMENT_SECONDS)
+    num_segments = len(seg_starts)
+    assigned = np.full(num_segments, -1, dtype=np.int64)
+    if num_segments == 0 or len(turn_starts) == 0 or num_speakers == 0:
+        return assigned
+
+    order = np.argsort(np.asarray(turn_starts, dtype=np.float64), kind="stable")
+    t_starts = np.asarray(turn_starts, dtype=np.float64)[order]
+    t_ends = np.asarray(turn_ends, dtype=np.float64)[order]
+    t_speakers = np.asarray(turn_speakers, dtype=np.int64)[order]
+
+    # Turns before `lo` all end at or before the segment starts; turns from `hi` on start after it ends
+    running_max_end = np.maximum.accumulate(t_ends)
+    lo = np.searchsorted(running_max_end, seg_starts, side="right")
+    hi = np.searchsorted(t_starts, seg_ends, side="left")
+    counts = np.maximum(hi - lo, 0)
+    total_pairs = int(counts.sum())
+    if total_pairs == 0:
+        return assigned
+
+    # Expand to (segment, candidate turn) pairs
+    pair_seg = np.repeat(np.arange(num_segments), counts)
+    pair_offset = np.arange(total_pairs) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_turn = np.repeat(lo, counts) + pair_offset
+
+    overlap = np.minimum(seg_ends[pair_seg], t_ends[pair_turn]) - np.maximum(seg_starts[pair_seg], t_starts[pair_turn])
+    positive = overlap > 0
+    if not positive.any():
+        return assigned
+
+    # Total overlap per (segment, speaker), then the best speaker per segment
+    flat_index = pair_seg[positive] * num_speakers + t_speakers[pair_turn[positive]]
+    scores = np.bincount(flat_index, weights=overlap[positive], minlength=num_segments * num_speakers)
+    scores = scores.reshape(num_segments, num_speakers)
+    best = scores.argmax(axis=1)
+    has_overlap = scores[np.arange(num_segments), best] > 0
+    assigned[has_overlap] = best[has_overlap]
+    return assigned
+
+
+def assign_segment_speakers(transcript_segments, diarization_segments, label_map):
+    """
+    One speaker label per Whisper segment ({"start", "end", ...} dicts).
+    diarization_segments are {"speaker", "start", "end"} dicts; label_map maps their
+    speaker names to display labels.
+    """
+    if not transcript_segments:
+        return []
+    speakers = list(dict.fromkeys(turn["speaker"] for turn in diarization_segments))
+    speaker_index = {speaker: idx for idx, speaker in enumerate(speakers)}
+
+    assigned = assign_by_overlap(
+        [seg["start"] for seg in transcript_segments],
+        [seg["end"] for seg in transcript_segments],
+        [turn["start"] for turn in diarization_segments],
+        [turn["end"] for turn in diarization_segments],
+        [speaker_index[turn["speaker"]] for turn in diarization_segments],
+        len(speakers)
+    )
+    display = [label_map.get(speaker, speaker) for speaker in speakers]
+    return [display[idx] if idx >= 0 else UNKNOWN_SPEAKER for idx in assigned.tolist()]
+
+
+def segment_words(segment_info):
+    """A Whisper segment's word timings as {"word", "start", "end"}, empty words dropped."""
+    # Whisper puts the leading space inside each word (" Hello,"); keep just the word
+    return [
+        {"word": w["word"].strip(), "start": w["start"], "end": w["end"]}
+        for w in segment_info.get("words", []) if w["word"].strip()
+    ]
+
+
+def group_into_turns(transcript_segments, segment_speakers, with_words=False):
+    """
+    Merges consecutive segments from the same speaker into {"speaker", "text", "start", "end"}
+    dialogue turns. With with_words=True each turn also carries the Whisper word timings of
+    its segments as "words" (requires transcribing with word_timestamps=True).
+    """
+    turns = []
+    current = None
+    current_texts = []
+
+    def _close():
+        if current is not None and current_texts:
+            current["text"] = " ".join(current_texts)
+            turns.append(current)
+
+    for segment_info, speaker in zip(transcript_segments, segment_speakers):
+        text = segment_info["text"].strip()
+        if current is None or speaker != current["speaker"]:
+            _close()
+            current = {"speaker": speaker, "text": "", "start": segment_info["start"], "end": segment_info["end"]}
+            if with_words: current["words"] = []
+            current_texts = []
+        if text:
+            current_texts.append(text)
+            current["end"] = segment_info["end"]
+            if with_words: current["words"].extend(segment_words(segment_info))
+    _close() # Add last turn
+    return turns
+
+
+def without_words(turns):
+    """Dialogue turns as stored in the job row (word timings live in the words table)."""
+    return [{key: value for key, value in turn.items() if key != "words"} for turn in turns]
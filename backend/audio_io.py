@@ -0,0 +1,103 @@
+# ai-report-generator/backend/audio_io.py
+#
+# ffmpeg/ffprobe helpers shared by the pipeline, the worker queue and the web process.
+# Deliberately free of ML imports (torch, whisper, pyannote, spaCy) so anything that only
+# needs to decode or probe audio starts quickly.
+
+import os
+import subprocess
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Longest clip that fits in one Whisper window; such clips can be transcribed in a batched decode
+BATCH_CLIP_MAX_SECONDS = 30.0
+# In-memory decodes time out after a base allowance plus this much per MB of input
+DECODE_TIMEOUT_BASE_SECONDS = float(os.getenv("DECODE_TIMEOUT_BASE_SECONDS", "60"))
+DECODE_TIMEOUT_SECONDS_PER_MB = float(os.getenv("DECODE_TIMEOUT_SECONDS_PER_MB", "5"))
+
+
+def decode_audio_16k_mono(input_path):
+    """
+    Decodes any ffmpeg-readable file straight into memory as a float32 16kHz mono NumPy array.
+    ffmpeg writes raw PCM to stdout, so no temporary WAV is written to disk. The timeout grows
+    with the file size, so large inputs aren't cut off at a fixed limit.
+    Returns None if decoding fails.
+    """
+    print(f"Decoding '{input_path}' to 16kHz mono float32 in memory...")
+    if not os.path.exists(input_path):
+        print(f"Error: Input file '{input_path}' not found for decoding.")
+        return None
+    command = ['ffmpeg', '-nostdin', '-threads', '0', '-i', input_path,
+               '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-']
+    timeout = DECODE_TIMEOUT_BASE_SECONDS + DECODE_TIMEOUT_SECONDS_PER_MB * os.path.getsize(input_path) / (1024 * 1024)
+    try:
+        process = subprocess.run(command, check=True, capture_output=True, timeout=timeout)
+    except FileNotFoundError: print("ERROR: ffmpeg command not found. Ensure FFmpeg is installed and in system PATH."); return None
+    except subprocess.TimeoutExpired: print(f"ERROR: FFmpeg decoding timed out after {timeout:.0f}s."); return None
+    except subprocess.CalledProcessError as e: print(f"ERROR during FFmpeg decoding: {e.stderr.decode(errors='replace')}"); return None
+    except Exception as e: print(f"ERROR during audio decoding: {e}"); return None
+    audio = np.frombuffer(process.stdout, np.int16).astype(np.float32) / 32768.0
+    print(f"Decoding successful ({len(audio) / SAMPLE_RATE:.1f}s of audio).")
+    return audio
+
+def probe_duration(input_path):
+    """Duration in seconds according to ffprobe, or None if it can't be determined."""
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', input_path]
+    try:
+        process = subprocess.run(command, check=True, capture_output=True, text=True, timeout=30)
+        return float(process.stdout.strip())
+    except Exception as e:
+        print(f"Warning: could not probe duration of '{input_path}': {e}")
+        return None
+
+def load_pcm16(path):
+    """Reads raw 16kHz mono s16le PCM (as written by IncrementalDecoder) into a float32 array."""
+    return np.fromfile(path, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+class IncrementalDecoder:
+    """
+    Decodes a file while it is still arriving: bytes passed to feed() go to ffmpeg's stdin and
+    16kHz mono s16le PCM is written to pcm_path as ffmpeg produces it. Containers that need
+    to seek (e.g. MP4 with the index at the end) can't be decoded from a pipe; finish() then
+    returns None and the caller decodes the complete file as usual.
+    """
+
+    def __init__(self, pcm_path):
+        self.pcm_path = pcm_path
+        self.failed = False
+        command = ['ffmpeg', '-nostdin', '-y', '-loglevel', 'error', '-i', 'pipe:0',
+                   '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-ac', '1', pcm_path]
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            print("Warning: ffmpeg not found; uploads will be decoded after they complete.")
+            self._process, self.failed = None, True
+
+    def feed(self, chunk):
+        if self.failed: return
+        try:
+            self._process.stdin.write(chunk)
+        except (BrokenPipeError, OSError): # ffmpeg gave up on the stream
+            self.failed = True
+
+    def finish(self, timeout=120):
+        """Closes the input and waits for ffmpeg. Returns pcm_path, or None if decoding failed."""
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+                self.failed = self._process.wait(timeout=timeout) != 0 or self.failed
+            except Exception:
+                self._process.kill()
+                self.failed = True
+        if self.failed or not os.path.exists(self.pcm_path) or os.path.getsize(self.pcm_path) == 0:
+            self.abort()
+            return None
+        return self.pcm_path
+
+    def abort(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        if os.path.exists(self.pcm_path): os.remove(self.pcm_path)
+        self.failed = True
@@ -2,19 +2,21 @@
 
 import os
 import torch
-import torchaudio
-from pyannote.audio import Pipeline as DiarizationPipeline
-from huggingface_hub import login
 from dotenv import load_dotenv
 import time
 import warnings
-from itertools import groupby
 from operator import itemgetter
-import string
-import subprocess
+from contextlib import contextmanager
 import numpy as np
-import whisper # Use the openai-whisper library directly
-import spacy # <<< ADDED SPACY IMPORT >>>
+from concurrent.futures import ThreadPoolExecutor
+# pyannote.audio and whisper are imported inside the functions that need them: together they take
+# seconds to import, and code that only needs part of this module shouldn't pay for them.
+from text_preprocessing import load_lean_model as load_lean_spacy_model, preprocess_turns, tag_words
+from model_registry import ModelRegistry
+from alignment import speaker_labels, assign_segment_speakers, group_into_turns, without_words
+import vad
+import metrics
+import embeddings
 
 # --- Load Env Vars & Config ---
 # Load .env file from the project root (parent directory of 'backend')
@@ -30,207 +32,392 @@ HF_TOKEN = os.getenv("HUGGINGFACE_ACCESS_TOKEN_READ")
 DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
 DEFAULT_WHISPER_MODEL = "openai/whisper-small"
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Run diarization and transcription at the same time on the shared waveform (set to 0 to run them back-to-back)
+PARALLEL_STAGES = os.getenv("PARALLEL_STAGES", "1").lower() in ("1", "true", "yes")
+# torch intra-op threads shared by both stages while they run in parallel (0 = leave torch's default).
+# torch's thread count is process-wide, so this is one combined budget, not a split per stage.
+PARALLEL_STAGES_TORCH_THREADS = int(os.getenv("PARALLEL_STAGES_TORCH_THREADS", "0"))
+# Ask Whisper for per-word timings; needed to fill the utterances/words tables
+WORD_TIMESTAMPS = os.getenv("WORD_TIMESTAMPS", "1").lower() in ("1", "true", "yes")
+# Whisper inference mode: "fp32" (full precision) or "int8" (dynamic int8 quantization of the
+# Linear layers, CPU only). Can be overridden per request.
+INFERENCE_MODES = ("fp32", "int8")
+DEFAULT_INFERENCE_MODE = os.getenv("WHISPER_INFERENCE_MODE", "fp32").lower()
+# Process-wide torch thread pools (0 = leave torch's default). Interop threads can only be set
+# before torch runs any parallel work, so both are applied at import.
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+if TORCH_NUM_THREADS > 0: torch.set_num_threads(TORCH_NUM_THREADS)
+if TORCH_INTEROP_THREADS > 0:
+    try: torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+    except RuntimeError as e: print(f"Warning: could not set torch interop threads: {e}")
+# Recordings at least this long (seconds) are processed in overlapping windows (see streaming.py)
+STREAMING_MIN_SECONDS = float(os.getenv("STREAMING_MIN_SECONDS", "1200"))
 
 # --- Suppress warnings ---
 warnings.filterwarnings("ignore")
 
 
 # --- Pre-load models LAZILY ---
-diarization_pipeline_instance = None
-whisper_model_instance = None
-loaded_whisper_size = None
-nlp_spacy = None # <<< ADDED FOR SPACY MODEL >>>
+# All models live in one registry so several Whisper sizes can stay resident together.
+MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", "6144"))
+# Rough footprints for objects whose size can't be read from torch parameters
+DIARIZATION_SIZE_HINT = 100 * 1024 * 1024
+SPACY_SIZE_HINT = 50 * 1024 * 1024
+VALID_WHISPER_SIZES = ['tiny', 'base', 'small', 'medium', 'large']
+
+model_registry = ModelRegistry(MODEL_CACHE_MAX_MB * 1024 * 1024)
+
+def _build_diarization_pipeline():
+    print(f"Loading diarization pipeline ({DIARIZATION_MODEL}) on {DEVICE}...")
+    try:
+        from pyannote.audio import Pipeline as DiarizationPipeline
+        from huggingface_hub import login
+        if HF_TOKEN: login(token=HF_TOKEN)
+        return DiarizationPipeline.from_pretrained(
+            DIARIZATION_MODEL,
+            use_auth_token=HF_TOKEN if HF_TOKEN else True
+        ).to(DEVICE)
+    except Exception as e:
+        print(f"ERROR loading diarization pipeline: {e}")
+        raise RuntimeError(f"Failed to load diarization model: {e}")
 
 def _load_diarization_pipeline():
-    global diarization_pipeline_instance
-    if diarization_pipeline_instance is None:
-        print(f"Loading diarization pipeline ({DIARIZATION_MODEL}) on {DEVICE}...")
-        start_time = time.time()
-        try:
-            if HF_TOKEN: login(token=HF_TOKEN)
-            diarization_pipeline_instance = DiarizationPipeline.from_pretrained(
-                DIARIZATION_MODEL,
-                use_auth_token=HF_TOKEN if HF_TOKEN else True
-            ).to(DEVICE)
-            print(f"Diarization pipeline loaded in {time.time() - start_time:.2f}s")
-        except Exception as e:
-            print(f"ERROR loading diarization pipeline: {e}")
-            raise RuntimeError(f"Failed to load diarization model: {e}")
-    return diarization_pipeline_instance
-
-def _load_whisper_model(model_size="small"):
-    global whisper_model_instance, loaded_whisper_size
-    valid_sizes = ['tiny', 'base', 'small', 'medium', 'large']
-    if model_size not in valid_sizes:
+    return model_registry.get("diarization", _build_diarization_pipeline, size_hint=DIARIZATION_SIZE_HINT)
+
+def _build_whisper_model(model_size, inference_mode="fp32"):
+    print(f"Loading Whisper model ({model_size}, {inference_mode}) on {DEVICE}...")
+    try:
+        import whisper # Use the openai-whisper library directly
+        device_str = "cuda" if DEVICE.type == "cuda" else "cpu"
+        model = whisper.load_model(model_size, device=device_str)
+    except Exception as e:
+        print(f"ERROR loading Whisper model: {e}")
+        raise RuntimeError(f"Failed to load Whisper model: {e}")
+    if inference_mode == "int8":
+        model = _quantize_whisper_int8(model)
+    return model
+
+def _quantize_whisper_int8(model):
+    """Dynamic int8 quantization of every Linear layer (weights stored as int8, activations quantized on the fly)."""
+    # whisper.model.Linear subclasses nn.Linear only to cast weights to the input dtype, which is a
+    # no-op in fp32 on CPU. quantize_dynamic matches module types exactly, so turn them back into
+    # plain nn.Linear first or nothing gets quantized.
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    start_time = time.time()
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    print(f"Quantized Whisper Linear layers to int8 in {time.time() - start_time:.2f}s")
+    return quantized
+
+def resolve_inference_mode(inference_mode=None):
+    """Validated inference mode; int8 falls back to fp32 on GPU (dynamic quantization is CPU only)."""
+    mode = (inference_mode or DEFAULT_INFERENCE_MODE).lower()
+    if mode not in INFERENCE_MODES:
+        print(f"Warning: Invalid inference mode '{mode}'. Defaulting to 'fp32'.")
+        mode = "fp32"
+    if mode == "int8" and DEVICE.type == "cuda":
+        print("Warning: int8 inference is CPU only; using fp32 on CUDA.")
+        mode = "fp32"
+    return mode
+
+def _load_whisper_model(model_size="small", inference_mode="fp32"):
+    if model_size not in VALID_WHISPER_SIZES:
         print(f"Warning: Invalid whisper model size '{model_size}'. Defaulting to 'small'.")
         model_size = 'small'
-    if whisper_model_instance is None or loaded_whisper_size != model_size:
-        print(f"Loading Whisper model ({model_size}) on {DEVICE}...")
-        start_time = time.time()
-        try:
-            device_str = "cuda" if DEVICE.type == "cuda" else "cpu"
-            whisper_model_instance = whisper.load_model(model_size, device=device_str)
-            loaded_whisper_size = model_size
-            print(f"Whisper model loaded in {time.time() - start_time:.2f}s")
-        except Exception as e:
-            print(f"ERROR loading Whisper model: {e}")
-            raise RuntimeError(f"Failed to load Whisper model: {e}")
-    return whisper_model_instance
+    key = f"whisper:{model_size}" if inference_mode == "fp32" else f"whisper:{model_size}:{inference_mode}"
+    return model_registry.get(key, lambda: _build_whisper_model(model_size, inference_mode))
 
 # --- Load SpaCy Model (Lazy Loading) ---
+# Loaded without the parser/NER, see text_preprocessing.py
 def _load_spacy_model():
-    global nlp_spacy
-    if nlp_spacy is None:
-        print("Loading SpaCy model 'en_core_web_sm'...")
-        start_time = time.time()
-        try:
-            nlp_spacy = spacy.load("en_core_web_sm")
-            print(f"SpaCy model loaded in {time.time() - start_time:.2f}s")
-        except OSError: # Model not found
-            print("Downloading SpaCy 'en_core_web_sm' model as it was not found...")
-            try:
-                 spacy.cli.download("en_core_web_sm")
-                 nlp_spacy = spacy.load("en_core_web_sm")
-                 print("SpaCy model downloaded and loaded.")
-            except Exception as e_spacy_dl:
-                 print(f"ERROR downloading/loading SpaCy model: {e_spacy_dl}")
-                 raise RuntimeError("Failed to get SpaCy model") # Re-raise to signal failure
-        except Exception as e_spacy_load: # Other loading errors
-             print(f"ERROR loading SpaCy model: {e_spacy_load}")
-             raise RuntimeError("Failed to load SpaCy model") # Re-raise
-    return nlp_spacy
-
-
-# --- Conversion Helper ---
-def convert_to_wav_16k_mono(input_path, output_path):
-    print(f"Converting '{input_path}' to '{output_path}' (16kHz mono WAV)...")
-    try:
-        if not os.path.exists(input_path):
-            print(f"Error: Input file '{input_path}' not found for conversion.")
-            return False
-        command = ['ffmpeg','-i', input_path,'-ar', '16000','-ac', '1','-y', output_path]
-        process = subprocess.run(command, check=True, capture_output=True, text=True, timeout=60)
-        print("FFmpeg stderr (Conversion Log):", process.stderr)
-        print("Conversion successful.")
-        return True
-    except FileNotFoundError: print("ERROR: ffmpeg command not found. Ensure FFmpeg is installed and in system PATH."); return False
-    except subprocess.TimeoutExpired: print("ERROR: FFmpeg conversion timed out."); return False
-    except subprocess.CalledProcessError as e: print(f"ERROR during FFmpeg conversion: {e.stderr}"); return False
-    except Exception as e: print(f"ERROR during audio conversion: {e}"); return False
-
-# --- Speaker Label Helper ---
-def get_speaker_label(speaker_id, unique_speakers):
-    try: idx = unique_speakers.index(speaker_id); return string.ascii_uppercase[idx]
-    except: return speaker_id # Fallback to original label
-
-# --- Preprocessing Function ---
-def preprocess_text(raw_text: str) -> str:
+    return model_registry.get("spacy", load_lean_spacy_model, size_hint=SPACY_SIZE_HINT)
+
+def warm_up(whisper_sizes=("small",), diarization=True, spacy_model=True):
+    """Loads the given models into the registry ahead of the first request. Sizes may name a mode, e.g. "small:int8"."""
+    print(f"Warming up models (whisper sizes: {list(whisper_sizes)}, diarization: {diarization}, spacy: {spacy_model})...")
+    start_time = time.time()
+    if diarization: _load_diarization_pipeline()
+    for size in whisper_sizes:
+        size, _, mode = size.partition(":")
+        _load_whisper_model(size, resolve_inference_mode(mode or None))
+    if spacy_model: _load_spacy_model()
+    print(f"Warm-up finished in {time.time() - start_time:.2f}s. Resident models: {model_registry.loaded_keys()}")
+
+
+# --- Decoding Helper ---
+# ffmpeg/ffprobe helpers live in audio_io.py (no ML imports, so the web process can use them)
+from audio_io import SAMPLE_RATE, BATCH_CLIP_MAX_SECONDS, decode_audio_16k_mono, probe_duration
+
+# --- Voice Activity Detection Helpers ---
+def _trim_silence(audio, results):
+    """Runs VAD on the decoded audio. Returns (audio for the models, SpeechTimeline or None, seconds taken); stats go to results["vad"]."""
+    start_time_vad = time.time()
+    speech_audio, timeline, stats = vad.trim_silence(audio, SAMPLE_RATE)
+    elapsed = time.time() - start_time_vad
+    results["vad"] = stats
+    if speech_audio.size == 0:
+        # Rather transcribe everything than return nothing because the threshold was off
+        print("VAD found no speech; processing the full recording instead.")
+        stats.update(speech_seconds=stats["original_seconds"], skipped_seconds=0.0, skipped_ratio=0.0, estimated_speedup=1.0)
+        return audio, None, elapsed
+    print(f"VAD kept {stats['speech_seconds']:.1f}s of {stats['original_seconds']:.1f}s in {stats['spans']} spans "
+          f"(skipped {stats['skipped_seconds']:.1f}s, {stats['skipped_ratio']:.0%}) in {elapsed:.2f}s")
+    return speech_audio, timeline, elapsed
+
+def _report_vad_speedup(vad_stats, timings):
+    # Diarization and Whisper run in roughly linear time in the audio length, so the
+    # time saved is estimated from the share of audio they no longer see.
+    speech = vad_stats["speech_seconds"]
+    vad_stats["estimated_speedup"] = vad_stats["original_seconds"] / speech if speech else 1.0
+    stage_seconds = timings.get("diarization_and_transcription", 0.0)
+    vad_stats["estimated_seconds_saved"] = stage_seconds * (vad_stats["estimated_speedup"] - 1.0)
+    print(f"VAD: diarization+transcription took {stage_seconds:.2f}s on {speech:.1f}s of speech; "
+          f"estimated speedup {vad_stats['estimated_speedup']:.2f}x (~{vad_stats['estimated_seconds_saved']:.1f}s saved)")
+
+
+# --- Preprocessing Functions ---
+def preprocess_dialogue(dialogue):
     """
-    Cleans and preprocesses raw text using SpaCy.
+    Cleans and preprocesses each dialogue turn using SpaCy (batched through nlp.pipe).
     Steps: lowercasing, tokenization, stop word removal, punctuation removal, lemmatization.
+    Returns (processed_text, turn_lemmas) where turn_lemmas has one lemma list per turn.
     """
+    turn_texts = [turn.get("text") or "" for turn in dialogue] # keeps turn_lemmas index-aligned with dialogue
+    if not any(turn_texts):
+        print("Warning: preprocess_dialogue received no text.")
+        return "", []
+    try:
+        spacy_model = _load_spacy_model() # Ensure model is loaded
+        preprocessed = preprocess_turns(spacy_model, turn_texts)
+        return preprocessed["processed_text"], preprocessed["turn_lemmas"]
+    except Exception as e:
+         print(f"ERROR during SpaCy preprocessing: {e}")
+         # import traceback; traceback.print_exc() # For debugging
+         return f"[Preprocessing error: {e}]", []
+
+def tag_utterance_words(utterances):
+    """Adds "pos_tag" and "lemma" to every word in the utterances, in place."""
+    word_lists = [[w["word"] for w in utt.get("words", [])] for utt in utterances]
+    if not any(word_lists): return
+    try:
+        tags = tag_words(_load_spacy_model(), word_lists)
+        for utt, utt_tags in zip(utterances, tags):
+            for word, (pos_tag, lemma) in zip(utt.get("words", []), utt_tags):
+                word["pos_tag"], word["lemma"] = pos_tag, lemma
+    except Exception as e:
+        print(f"Warning: word tagging failed, words will be stored without POS/lemma: {e}")
+
+def embed_dialogue(utterances, dialogue, turn_lemmas):
+    """Adds "embedding" to every word of the utterances (in place) and returns the turn vectors, or None on failure."""
+    if not embeddings.EMBEDDINGS_ENABLED or not dialogue: return None
+    try:
+        return embeddings.embed_job(utterances, dialogue, turn_lemmas)
+    except Exception as e:
+        print(f"Warning: embedding failed, words and turns will be stored without embeddings: {e}")
+        return None
+
+def preprocess_text(raw_text: str) -> str:
+    """Preprocesses a single block of text; see preprocess_dialogue."""
     if not raw_text:
         print("Warning: preprocess_text received empty or None input.")
         return ""
-    try:
-        spacy_model = _load_spacy_model() # Ensure model is loaded
-        if spacy_model is None: # Should not happen if _load_spacy_model raises error
-            print("Error: SpaCy model not loaded, cannot preprocess.")
-            return "[Preprocessing failed: SpaCy model not loaded]"
+    processed_text, _ = preprocess_dialogue([{"text": raw_text}])
+    return processed_text
 
-        doc = spacy_model(raw_text.lower()) # Lowercase and process
 
-        processed_tokens = []
-        for token in doc:
-            if not token.is_stop and not token.is_punct and token.lemma_.strip():
-                processed_tokens.append(token.lemma_)
+# --- Pipeline Stage Helpers ---
+@contextmanager
+def parallel_stage_threads():
+    """
+    Applies PARALLEL_STAGES_TORCH_THREADS for the duration of a parallel diarization + transcription
+    run and restores the previous count afterwards. Set once by the caller before the stage threads
+    start: the setting is process-wide, so both stages share it.
+    """
+    if PARALLEL_STAGES_TORCH_THREADS <= 0:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(PARALLEL_STAGES_TORCH_THREADS)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+def _run_diarization(pipeline, audio_input, peaks=None):
+    start_time_diar = time.time()
+    with metrics.track_peak_rss(peaks if peaks is not None else {}, "diarization"):
+        diarization = pipeline(audio_input)
+    elapsed = time.time() - start_time_diar
+    print(f"Diarization finished in {elapsed:.2f}s")
+    diarization_segments = []
+    for turn, _, speaker in diarization.itertracks(yield_label=True):
+        diarization_segments.append({"speaker": speaker, "start": turn.start, "end": turn.end})
+    diarization_segments.sort(key=itemgetter('start'))
+    unique_speakers = sorted(list(diarization.labels()))
+    print(f"Diarization found {len(unique_speakers)} speakers: {unique_speakers}")
+    return diarization_segments, unique_speakers, elapsed
+
+def _run_transcription(model, audio_input, peaks=None):
+    start_time_trans = time.time()
+    with metrics.track_peak_rss(peaks if peaks is not None else {}, "transcription"):
+        transcription_result = model.transcribe(audio_input, fp16=False if DEVICE.type == 'cpu' else True, language='en',
+                                                word_timestamps=WORD_TIMESTAMPS)
+    elapsed = time.time() - start_time_trans
+    print(f"Transcription finished in {elapsed:.2f}s")
+    return transcription_result, elapsed
+
+
+# --- Batched Decoding of Short Clips ---
+# Clips up to one Whisper window (BATCH_CLIP_MAX_SECONDS) can be decoded together in one forward pass per step
+TIMESTAMP_PRECISION = 0.02 # seconds per Whisper timestamp token
+
+def _segments_from_tokens(tokenizer, tokens, clip_seconds):
+    """Turns a decoded token sequence with timestamp tokens into Whisper-style {"start", "end", "text"} segments."""
+    segments, text_tokens, start = [], [], None
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            t = (token - tokenizer.timestamp_begin) * TIMESTAMP_PRECISION
+            if start is None:
+                start = t
+            else:
+                if text_tokens: segments.append({"start": start, "end": t, "text": tokenizer.decode(text_tokens)})
+                start, text_tokens = None, []
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens: # text after the last timestamp
+        segments.append({"start": start or 0.0, "end": clip_seconds, "text": tokenizer.decode(text_tokens)})
+    return segments
+
+def transcribe_batch(model, audios):
+    """
+    Transcribes several clips of at most BATCH_CLIP_MAX_SECONDS in one batched whisper.decode call.
+    Returns one result per clip shaped like model.transcribe()'s ({"text", "segments", "language"}).
+    Single-pass greedy decoding: no temperature fallback and no word timestamps.
+    """
+    if not audios: return []
+    import whisper
+    start_time = time.time()
+    n_mels = getattr(model.dims, "n_mels", 80)
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.asarray(audio, dtype=np.float32))), n_mels)
+        for audio in audios
+    ]).to(model.device)
+    options = whisper.DecodingOptions(language="en", task="transcribe", without_timestamps=False, fp16=DEVICE.type == "cuda")
+    decoded = whisper.decode(model, mels, options)
+    tokenizer_kwargs = {"num_languages": model.num_languages} if hasattr(model, "num_languages") else {}
+    tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, language="en", task="transcribe", **tokenizer_kwargs)
+
+    results = []
+    for audio, result in zip(audios, decoded):
+        clip_seconds = len(audio) / SAMPLE_RATE
+        segments = _segments_from_tokens(tokenizer, result.tokens, clip_seconds)
+        if not segments and result.text.strip():
+            segments = [{"start": 0.0, "end": clip_seconds, "text": result.text}]
+        results.append({"text": result.text, "segments": segments, "language": "en"})
+    print(f"Batched transcription of {len(audios)} clips finished in {time.time() - start_time:.2f}s")
+    return results
 
-        processed_text_str = " ".join(processed_tokens)
-        print(f"Preprocessing finished. Original length: {len(raw_text)}, Processed length: {len(processed_text_str)}")
-        return processed_text_str
-    except Exception as e:
-         print(f"ERROR during SpaCy preprocessing: {e}")
-         # import traceback; traceback.print_exc() # For debugging
-         return f"[Preprocessing error: {e}]"
+
+# --- Progress Reporting Helper ---
+def _report_stage(progress_callback, stage):
+    if progress_callback is None: return
+    try: progress_callback(stage)
+    except Exception as e: print(f"Warning: progress callback failed for stage '{stage}': {e}")
 
 
 # --- THE CORE PROCESSING FUNCTION FOR THE BACKEND ---
-def process_audio_and_return_dialogue(input_audio_path: str, whisper_model_size: str = DEFAULT_WHISPER_MODEL) -> dict | None:
-    results = {"dialogue": [], "full_transcript": None, "processed_text": None, "error": None}
-    converted_path = None
-    needs_cleanup = False
+def process_audio_and_return_dialogue(input_audio_path: str, whisper_model_size: str = DEFAULT_WHISPER_MODEL, progress_callback=None,
+                                      partial_callback=None, streaming: bool | None = None, inference_mode: str | None = None,
+                                      decoded_audio=None, transcription: dict | None = None) -> dict | None:
+    # progress_callback(stage) is called as the job enters each stage:
+    # 'converting', 'diarizing', 'transcribing', 'preprocessing'
+    # partial_callback(turns) receives dialogue turns as soon as they are final.
+    # streaming=None picks windowed processing automatically for recordings >= STREAMING_MIN_SECONDS,
+    # and for recordings whose duration ffprobe can't tell (they may be arbitrarily long).
+    # inference_mode is "fp32" or "int8" (None = WHISPER_INFERENCE_MODE).
+    # decoded_audio / transcription let a caller that already decoded or transcribed the file
+    # (batched decoding, see batch.py) skip those stages; both must be on the original timeline.
+    inference_mode = resolve_inference_mode(inference_mode)
+    if decoded_audio is not None or transcription is not None:
+        streaming = False
+    if streaming is None:
+        duration = probe_duration(input_audio_path)
+        streaming = duration is None or duration >= STREAMING_MIN_SECONDS
+    if streaming:
+        from streaming import process_audio_streaming
+        return process_audio_streaming(input_audio_path, whisper_model_size, progress_callback, partial_callback, inference_mode=inference_mode)
+
+    results = {"dialogue": [], "full_transcript": None, "processed_text": None, "turn_lemmas": [], "turn_embeddings": None, "utterances": [], "error": None, "timings": {},
+               "inference_mode": inference_mode, "audio_seconds": None, "peak_rss_bytes": {}}
+    timings = results["timings"] # Per-stage wall time in seconds
+    peaks = results["peak_rss_bytes"] # Per-stage peak RSS of this process (see metrics.py)
     start_process_time = time.time()
     print(f"--- Starting Audio Processing for: {input_audio_path} ---")
 
     try:
-        # 1. Ensure correct audio format
-        # Create temp filename in the same directory as the input audio
-        input_dir = os.path.dirname(input_audio_path) if os.path.dirname(input_audio_path) else '.'
-        base_name = os.path.splitext(os.path.basename(input_audio_path))[0]
-        converted_path = os.path.join(input_dir, base_name + "_16k_mono_temp.wav")
-
-        if not convert_to_wav_16k_mono(input_audio_path, converted_path):
+        # 1. Decode once into memory; every stage shares this buffer by reference
+        _report_stage(progress_callback, "converting")
+        start_time_decode = time.time()
+        with metrics.track_peak_rss(peaks, "decode"):
+            audio = decoded_audio if decoded_audio is not None else decode_audio_16k_mono(input_audio_path)
+        if audio is None or audio.size == 0:
             raise ValueError("Audio conversion failed.")
-        needs_cleanup = True
-        audio_path_for_processing = converted_path
+        timings["decode"] = time.time() - start_time_decode
+        results["audio_seconds"] = len(audio) / SAMPLE_RATE
 
-        # 2. Diarization
-        pipeline = _load_diarization_pipeline()
-        print("Running diarization...")
-        start_time_diar = time.time()
-        diarization = pipeline(audio_path_for_processing)
-        print(f"Diarization finished in {time.time() - start_time_diar:.2f}s")
-        diarization_segments = []
-        for turn, _, speaker in diarization.itertracks(yield_label=True):
-            diarization_segments.append({"speaker": speaker, "start": turn.start, "end": turn.end})
-        diarization_segments.sort(key=itemgetter('start'))
-        unique_speakers = sorted(list(diarization.labels()))
-        print(f"Diarization found {len(unique_speakers)} speakers: {unique_speakers}")
-
-        # 3. Transcription
-        model = _load_whisper_model(whisper_model_size)
-        print(f"Running transcription with Whisper {whisper_model_size}...")
-        start_time_trans = time.time()
-        transcription_result = model.transcribe(audio_path_for_processing, fp16=False if DEVICE.type == 'cpu' else True, language='en')
-        print(f"Transcription finished in {time.time() - start_time_trans:.2f}s")
-        results["full_transcript"] = transcription_result["text"].strip()
+        # 1b. Optional VAD: both models only see the speech spans; timestamps are mapped back after
+        timeline = None
+        if vad.VAD_ENABLED and transcription is None: # a precomputed transcription is already on the full timeline
+            audio, timeline, timings["vad"] = _trim_silence(audio, results)
+        diarization_input = {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE} # (channel, time), no copy
+        whisper_input = audio
 
-        # 4. Preprocessing (New Step)
-        if results["full_transcript"]:
-            print("Preprocessing the full transcript...")
-            results["processed_text"] = preprocess_text(results["full_transcript"])
+        # Load both models up front so neither stage's timing includes a model load
+        pipeline = _load_diarization_pipeline()
+        model = _load_whisper_model(whisper_model_size, inference_mode) if transcription is None else None
+
+        # 2. Diarization + Transcription
+        _report_stage(progress_callback, "diarizing")
+        if transcription is not None:
+            print("Using precomputed transcription; running diarization only...")
+            diarization_segments, unique_speakers, timings["diarization"] = _run_diarization(pipeline, diarization_input, peaks=peaks)
+            transcription_result, timings["transcription"] = transcription, 0.0
+            timings["diarization_and_transcription"] = timings["diarization"]
+        elif PARALLEL_STAGES:
+            print(f"Running diarization and transcription (Whisper {whisper_model_size}, {inference_mode}) in parallel...")
+            start_time_stages = time.time()
+            with parallel_stage_threads(), ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio-stage") as stage_pool:
+                diar_future = stage_pool.submit(_run_diarization, pipeline, diarization_input, peaks=peaks)
+                trans_future = stage_pool.submit(_run_transcription, model, whisper_input, peaks=peaks)
+                diarization_segments, unique_speakers, timings["diarization"] = diar_future.result()
+                if not trans_future.done():
+                    _report_stage(progress_callback, "transcribing")
+                transcription_result, timings["transcription"] = trans_future.result()
+            timings["diarization_and_transcription"] = time.time() - start_time_stages
         else:
-            results["processed_text"] = "[Preprocessing skipped: No raw transcript]"
-
+            print("Running diarization...")
+            diarization_segments, unique_speakers, timings["diarization"] = _run_diarization(pipeline, diarization_input, peaks=peaks)
+            _report_stage(progress_callback, "transcribing")
+            print(f"Running transcription with Whisper {whisper_model_size} ({inference_mode})...")
+            transcription_result, timings["transcription"] = _run_transcription(model, whisper_input, peaks=peaks)
+            timings["diarization_and_transcription"] = timings["diarization"] + timings["transcription"]
+        results["full_transcript"] = transcription_result["text"].strip()
+        if timeline is not None:
+            diarization_segments = timeline.remap_segments(diarization_segments)
+            transcription_result["segments"] = timeline.remap_segments(transcription_result.get("segments", []))
+            _report_vad_speedup(results["vad"], timings)
 
-        # 5. Combine Results for Dialogue (Simplified Alignment)
+        # 3. Combine Results for Dialogue (max-overlap alignment, see alignment.py)
         print("Combining results for dialogue...")
-        processed_dialogue = []
         if diarization_segments and "segments" in transcription_result:
-            current_dialogue_text = ""
-            current_speaker_label = None
-            unique_speakers_list = unique_speakers
-
-            for segment_info in transcription_result["segments"]:
-                segment_start = segment_info["start"]
-                segment_end = segment_info["end"]
-                segment_text = segment_info["text"].strip()
-                segment_midpoint = segment_start + (segment_end - segment_start) / 2
-                assigned_speaker = "Unknown"
-                for turn in diarization_segments:
-                    if segment_midpoint >= turn["start"] and segment_midpoint < turn["end"]:
-                         assigned_speaker = get_speaker_label(turn["speaker"], unique_speakers_list)
-                         break
-                if assigned_speaker == current_speaker_label:
-                     current_dialogue_text += " " + segment_text
-                else:
-                     if current_speaker_label is not None and current_dialogue_text:
-                          processed_dialogue.append({"speaker": current_speaker_label, "text": current_dialogue_text})
-                     current_speaker_label = assigned_speaker
-                     current_dialogue_text = segment_text
-            if current_speaker_label is not None and current_dialogue_text: # Add last segment
-                 processed_dialogue.append({"speaker": current_speaker_label, "text": current_dialogue_text})
-            results["dialogue"] = processed_dialogue
+            start_time_align = time.time()
+            with metrics.track_peak_rss(peaks, "alignment"):
+                segment_speakers = assign_segment_speakers(transcription_result["segments"], diarization_segments, speaker_labels(unique_speakers))
+                results["utterances"] = group_into_turns(transcription_result["segments"], segment_speakers, with_words=True)
+                results["dialogue"] = without_words(results["utterances"])
+            timings["alignment"] = time.time() - start_time_align
             print("Combined diarization and transcription.")
         elif results["full_transcript"]: # Fallback if diarization had issues or no segments
             print("Diarization segments missing or transcription segments missing, using raw transcript for dialogue.")
@@ -238,6 +425,32 @@ def process_audio_and_return_dialogue(input_audio_path: str, whisper_model_size:
         else:
             print("Warning: Transcription failed to produce text, dialogue will be empty.")
             # results["dialogue"] remains empty
+        if partial_callback and results["dialogue"]:
+            try: partial_callback(results["dialogue"])
+            except Exception as e: print(f"Warning: partial callback failed: {e}")
+
+        # 4. Preprocessing, one spaCy doc per dialogue turn
+        _report_stage(progress_callback, "preprocessing")
+        if results["dialogue"]:
+            print(f"Preprocessing {len(results['dialogue'])} dialogue turns...")
+            start_time_prep = time.time()
+            with metrics.track_peak_rss(peaks, "preprocessing"):
+                results["processed_text"], results["turn_lemmas"] = preprocess_dialogue(results["dialogue"])
+            timings["preprocessing"] = time.time() - start_time_prep
+        else:
+            results["processed_text"] = "[Preprocessing skipped: No raw transcript]"
+        if results["utterances"]:
+            start_time_tag = time.time()
+            with metrics.track_peak_rss(peaks, "word_tagging"):
+                tag_utterance_words(results["utterances"])
+            timings["word_tagging"] = time.time() - start_time_tag
+
+        # 5. Embeddings for words and turns, one batched pass over the job's lemmas
+        if results["dialogue"]:
+            start_time_embed = time.time()
+            with metrics.track_peak_rss(peaks, "embedding"):
+                results["turn_embeddings"] = embed_dialogue(results["utterances"], results["dialogue"], results["turn_lemmas"])
+            timings["embedding"] = time.time() - start_time_embed
 
     except RuntimeError as e: # Catch model loading errors specifically
         print(f"RUNTIME ERROR during audio processing (likely model loading): {e}")
@@ -250,12 +463,9 @@ def process_audio_and_return_dialogue(input_audio_path: str, whisper_model_size:
         results["error"] = str(e)
         import traceback; traceback.print_exc() # For detailed debug during development
 
-    finally:
-        if needs_cleanup and converted_path and os.path.exists(converted_path):
-            try: os.remove(converted_path); print(f"Removed temporary file: {converted_path}")
-            except Exception as e_del: print(f"Warning: Failed remove {converted_path}: {e_del}")
-
-    print(f"--- Finished Audio Processing (Total Time: {time.time() - start_process_time:.2f}s) ---")
+    timings["overall"] = time.time() - start_process_time
+    print(f"Stage timings: " + ", ".join(f"{stage}={secs:.2f}s" for stage, secs in timings.items()))
+    print(f"--- Finished Audio Processing (Total Time: {timings['overall']:.2f}s) ---")
     # Return results even if there was an error (error field will be populated)
     return results
 
@@ -2,14 +2,17 @@
 
 import os
 import sys
-from flask import Flask, request, jsonify, abort, render_template, url_for, redirect
+from flask import Flask, request, jsonify, abort, render_template, url_for, Response, stream_with_context
 from flask_cors import CORS
 import random # Keep if used for anything else, or remove
 import time
+import math
 import werkzeug.utils
 import secrets
-import numpy as np # Keep if audio_processor or its deps still use it globally
-from supabase import create_client, Client # <<< Import Supabase >>>
+import importlib.util
+import multiprocessing
+
+SERVER_START_TIME = time.time()
 
 # --- Path Adjustments (Keep as is) ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,19 +22,6 @@ if project_root_from_backend not in sys.path: sys.path.insert(0, project_root_fr
 if current_dir not in sys.path: sys.path.insert(0, current_dir)
 
 
-# --- ML Function Import (Keep as is) ---
-try:
-    from audio_processor import process_audio_and_return_dialogue # This now returns processed_text too
-    ML_FUNCTION_LOADED = True
-    print("Successfully imported ML function from audio_processor.py")
-except ImportError as e:
-    # ... (dummy function for error handling - keep as is) ...
-    print(f"### ERROR importing ML: {e} ###"); ML_FUNCTION_LOADED = False
-    def process_audio_and_return_dialogue(a,w): return {"error": "Import failed - DUMMY"}
-except Exception as e_gen:
-     print(f"!!! General Error during ML import: {e_gen}"); ML_FUNCTION_LOADED = False
-     def process_audio_and_return_dialogue(a,w): return {"error": "General import error - DUMMY"}
-
 # --- Load .env ---
 from dotenv import load_dotenv
 dotenv_path = os.path.join(project_root_from_backend, '.env')
@@ -40,28 +30,48 @@ if os.path.exists(dotenv_path):
 else:
      print(f"Flask App Warning: .env file not found at {dotenv_path}")
 
-# --- Initialize Supabase Client ---
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY") # This should be your Service Role Key for backend
-
-supabase: Client = None # type: ignore # Initialize to None
-SUPABASE_INITIALIZED = False
+# --- ML Availability Check ---
+# The ML pipeline (audio_processor: torch, pyannote, whisper, spaCy) only runs in the worker
+# processes, so the web process never imports it; it only checks the packages are installed.
+# This keeps server startup at Flask-import speed (see benchmarks/importtime_report.py).
+ML_REQUIRED_PACKAGES = ("torch", "whisper", "pyannote.audio", "spacy")
+try:
+    _missing_ml_packages = [name for name in ML_REQUIRED_PACKAGES if importlib.util.find_spec(name) is None]
+except Exception as e_spec: # e.g. a broken parent package
+    _missing_ml_packages = [f"unknown ({e_spec})"]
+ML_FUNCTION_LOADED = not _missing_ml_packages
+if ML_FUNCTION_LOADED:
+    print("ML packages available; models are loaded by the job workers.")
+else:
+    print(f"### ERROR: ML packages missing: {_missing_ml_packages} ###")
+
+# --- Background Job Queue (worker processes run the ML pipeline) ---
+import job_queue
+import job_events
+import result_cache
+import storage
+import batch
+import metrics
+import uploads
+import search_index
+import embeddings
+import report_generator
+from compact_dialogue import CompactDialogue, stored_turns
+
+# --- Initialize Storage (Supabase or local SQL, see storage.py) ---
+report_store = None
+STORAGE_INITIALIZED = False
 
-if not supabase_url or not supabase_key:
+try:
+    # Completed reports never change, so the web process reads them through an in-memory cache
+    report_store = storage.CachedReportStore(storage.create_store())
+    print("Storage backend initialized successfully.")
+    STORAGE_INITIALIZED = True
+except Exception as e_store:
     print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-    print("ERROR: SUPABASE_URL or SUPABASE_KEY not found in .env.")
-    print("Supabase integration will NOT work.")
+    print(f"ERROR: Failed to initialize storage backend '{storage.STORAGE_BACKEND}': {e_store}")
+    print("Database integration will NOT work.")
     print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-else:
-    try:
-        print(f"Initializing Supabase client with URL: {supabase_url[:20]}...")
-        supabase = create_client(supabase_url, supabase_key)
-        print("Supabase client initialized successfully.")
-        SUPABASE_INITIALIZED = True
-    except Exception as e_sb:
-        print(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-        print(f"ERROR: Failed to initialize Supabase client: {e_sb}")
-        print(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
 
 app = Flask(__name__,
             template_folder=os.path.join(project_root_from_backend, 'frontend', 'templates'),
@@ -73,6 +83,13 @@ CORS(app)
 UPLOAD_FOLDER = os.path.join(current_dir, 'temp_audio_uploads')
 if not os.path.exists(UPLOAD_FOLDER): os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Werkzeug rejects bodies over the limit (413) before reading them; the slack covers multipart framing and form fields
+app.config['MAX_CONTENT_LENGTH'] = uploads.MAX_UPLOAD_BYTES + 1024 * 1024
+resumable_uploads = uploads.ResumableUploads(os.path.join(UPLOAD_FOLDER, 'resumable'))
+# /process_batch may read a server-side directory only if it lies under this root (unset = uploads only)
+BATCH_INPUT_ROOT = os.getenv("BATCH_INPUT_ROOT", "")
+# Debug mode (and its auto-reloader) for `python backend.py`
+FLASK_DEBUG = os.getenv("FLASK_DEBUG", "1").lower() in ("1", "true", "yes")
 
 # --- REMOVE In-Memory Storage Dictionaries ---
 # analysis_results = {} # No longer used
@@ -90,6 +107,59 @@ def show_report_page(job_id):
     print(f"Serving report page for job_id: {job_id}")
     return render_template('report.html', job_id=job_id)
 
+# --- Job Creation Helper ---
+def _queue_audio_job(audio_path, filename, audio_hash, report_type_requested, whisper_model_size, inference_mode, pcm_path=None):
+    """
+    Creates the job for a saved upload: a completed job straight from the result cache, or a queued
+    job for the worker pool. Returns (response payload, HTTP status, queued). When queued, the worker
+    owns (and deletes) audio_path and pcm_path; otherwise they are still the caller's.
+    """
+    # Same audio + same model already processed: store a completed job from the cache, skip the pipeline
+    cached = result_cache.lookup(audio_hash, result_cache.model_variant(whisper_model_size, inference_mode))
+    if cached is not None:
+        print(f"Result cache hit for {audio_hash[:12]}... ({whisper_model_size}); skipping processing.")
+        job_id_from_db = job_queue.create_cached_job(report_store, {
+            'audio_filename': filename,
+            'audio_hash': audio_hash,
+            'whisper_model_size': whisper_model_size,
+            'inference_mode': inference_mode,
+            'report_type_requested': report_type_requested
+        }, cached)
+        return {
+            "job_id": job_id_from_db,
+            "status": job_queue.STATUS_COMPLETED,
+            "cached": True,
+            "status_url": url_for('get_job_status', job_id=job_id_from_db),
+            "report_url": url_for('show_report_page', job_id=job_id_from_db)
+        }, 200, False
+
+    # Create the job row first so the client gets a job_id straight away;
+    # the worker fills in transcript/dialogue/processed_text as it finishes.
+    print("Creating queued job in table 'transcripts_log'...")
+    data_to_insert = {
+        'audio_filename': filename,
+        'audio_hash': audio_hash,
+        'status': job_queue.STATUS_QUEUED,
+        'whisper_model_size': whisper_model_size,
+        'inference_mode': inference_mode,
+        'report_type_requested': report_type_requested
+    }
+    job_id_from_db = report_store.create_job(data_to_insert)
+    print(f"Created job {job_id_from_db}")
+    try:
+        job_queue.submit_job(job_id_from_db, audio_path, whisper_model_size, audio_hash=audio_hash,
+                             inference_mode=inference_mode, pcm_path=pcm_path)
+    except Exception as e:
+        try: report_store.update_job(job_id_from_db, {'status': job_queue.STATUS_FAILED, 'error_message': str(e)})
+        except Exception as e_upd: print(f"Warning: Failed to mark job {job_id_from_db} as failed: {e_upd}")
+        raise
+    return {
+        "job_id": job_id_from_db,
+        "status": job_queue.STATUS_QUEUED,
+        "status_url": url_for('get_job_status', job_id=job_id_from_db),
+        "report_url": url_for('show_report_page', job_id=job_id_from_db)
+    }, 202, True
+
 # --- API Endpoints ---
 # backend/app.py
 # ... (Keep ALL your existing imports at the top: os, sys, Flask, CORS, random, time, werkzeug, secrets, numpy, supabase, load_dotenv)
@@ -108,7 +178,7 @@ def process_audio_endpoint():
     
     # <<< --- START OF ADDED DEBUG STATEMENTS --- >>>
     print(f"DEBUG Endpoint: Value of ML_FUNCTION_LOADED at entry: {ML_FUNCTION_LOADED}")
-    print(f"DEBUG Endpoint: Value of SUPABASE_INITIALIZED at entry: {SUPABASE_INITIALIZED}")
+    print(f"DEBUG Endpoint: Value of STORAGE_INITIALIZED at entry: {STORAGE_INITIALIZED}")
     # You can also print sys.path again here if you suspect it changes during reloads
     # print(f"DEBUG Endpoint: Current sys.path at endpoint entry: {sys.path}")
     # <<< --- END OF ADDED DEBUG STATEMENTS --- >>>
@@ -116,151 +186,522 @@ def process_audio_endpoint():
     if not ML_FUNCTION_LOADED:
         print("DEBUG Endpoint: ML_FUNCTION_LOADED is False, returning error.") # Added for clarity
         return jsonify({"error": "ML processing module not loaded on server."}), 500
-    if not SUPABASE_INITIALIZED: # Assuming you added this check from previous suggestions
-        print("DEBUG Endpoint: SUPABASE_INITIALIZED is False, returning error.") # Added for clarity
-        return jsonify({"error": "Supabase client not initialized on server."}), 500
-
-    if 'audioFile' not in request.files:
-        print("Error: No 'audioFile' part in request.")
-        return jsonify({"error": "Missing 'audioFile' in request form data"}), 400
-
-    file = request.files['audioFile']
-    if file.filename == '':
-        print("Error: No file selected.")
-        return jsonify({"error": "No file selected"}), 400
-    
-    report_type_requested = request.form.get('reportType', 'brief')
-    whisper_model_size = request.form.get('whisperModelSize', 'small')
-    print(f"Received file: {file.filename}, Report Type: {report_type_requested}, Whisper Model: {whisper_model_size}")
-    
-    temp_audio_path = None 
-    job_id_from_supabase = None 
-
-    if file:
-        filename = werkzeug.utils.secure_filename(file.filename)
-        if not filename:
-            return jsonify({"error": "Invalid filename"}), 400
-        
-        temp_filename = f"{secrets.token_hex(8)}_{filename}"
-        temp_audio_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-
+    if not STORAGE_INITIALIZED:
+        print("DEBUG Endpoint: STORAGE_INITIALIZED is False, returning error.") # Added for clarity
+        return jsonify({"error": "Storage backend not initialized on server."}), 500
+
+    # Parse the multipart body straight off the socket: the file is written, hashed and fed to
+    # ffmpeg while it arrives, instead of Werkzeug spooling the whole body to a temp file first.
+    # request.files / request.form must not be touched here, they would consume the stream.
+    temp_audio_path = pcm_path = None
+    try:
+        start_time_save = time.time()
         try:
-            file.save(temp_audio_path)
-            print(f"Audio file saved temporarily to: {temp_audio_path}")
-
-            print(f"Calling ML function for audio '{filename}' with model size {whisper_model_size}...")
-            result_data = process_audio_and_return_dialogue(temp_audio_path, whisper_model_size=whisper_model_size)
-            print(f"ML function finished.")
-
-            if result_data is None or result_data.get("error"):
-                error_msg = result_data.get("error") if result_data else "Unknown ML Error"
-                print(f"ML processing failed: {error_msg}")
-                # For now, let's not try to save to DB if ML fails, just return error to user
-                # This simplifies debugging. We can add DB logging of errors later.
-                return jsonify({"error": f"Audio processing failed: {error_msg}"}), 500 # Return 500 for ML error
-
-            raw_transcript = result_data.get("full_transcript", "")
-            dialogue_data = result_data.get("dialogue", [])
-            processed_text = result_data.get("processed_text", "")
-
-            print("Storing initial data in Supabase table 'transcripts_log'...")
-            data_to_insert = {
-                'audio_filename': filename,
-                'raw_transcript': raw_transcript,
-                'dialogue_json': dialogue_data,
-                'processed_text': processed_text,
-                'status': 'completed_preprocessing',
-                'whisper_model_size': whisper_model_size,
-                'report_type_requested': report_type_requested
-            }
-            
-            # Ensure supabase client is used only if initialized
-            if not supabase: # supabase is the global client instance
-                 print("ERROR: Supabase client is None inside endpoint. Cannot proceed.")
-                 # This should ideally be caught by SUPABASE_INITIALIZED at the top,
-                 # but as a safeguard within the try block:
-                 raise ConnectionError("Supabase client not available for database operation.")
-
-            response = supabase.table('transcripts_log').insert(data_to_insert).execute()
-            print(f"Supabase insert response: {response}")
-
-            if response.data and len(response.data) > 0:
-                job_id_from_supabase = response.data[0]['id'] 
-                print(f"Data stored in Supabase with ID (job_id): {job_id_from_supabase}")
-                return redirect(url_for('show_report_page', job_id=str(job_id_from_supabase))) # Ensure job_id is string for URL
-            else:
-                error_detail = response.error.message if response.error else "No data returned after insert"
-                print(f"Error storing data in Supabase: {error_detail}")
-                return render_template('upload.html', error=f"Failed to store transcript: {error_detail}")
-
-        except Exception as e:
-             print(f"General error during processing or Supabase interaction: {e}")
-             import traceback
-             traceback.print_exc() # Print full traceback for detailed debugging
-             return render_template('upload.html', error=f"Server error: {str(e)}")
-        finally:
-            if temp_audio_path and os.path.exists(temp_audio_path):
+            form, received = uploads.receive_multipart(request.stream, request.content_type, app.config['UPLOAD_FOLDER'],
+                                                       ['audioFile'], decode_while_receiving=uploads.UPLOAD_DECODE_WHILE_RECEIVING)
+        except uploads.UploadTooLarge:
+            raise
+        except ValueError as e: # not a multipart/form-data body
+            print(f"Error: {e}")
+            return jsonify({"error": str(e)}), 400
+        metrics.observe_stage("upload_save", time.time() - start_time_save)
+        if not received:
+            print("Error: No 'audioFile' part in request (or no file selected).")
+            return jsonify({"error": "Missing 'audioFile' in request form data"}), 400
+        # Only the first file counts; any extra 'audioFile' parts are discarded
+        for extra in received[1:]:
+            for path in (extra["path"], extra["pcm_path"]):
+                if path and os.path.exists(path): os.remove(path)
+        upload = received[0]
+        temp_audio_path, pcm_path, filename = upload["path"], upload["pcm_path"], upload["filename"]
+
+        report_type_requested = form.get('reportType', 'brief')
+        whisper_model_size = form.get('whisperModelSize', 'small')
+        # 'fp32' or 'int8' (quantized, faster on CPU); the worker validates it and records what actually ran
+        inference_mode = (form.get('inferenceMode') or os.getenv("WHISPER_INFERENCE_MODE", "fp32")).lower()
+        print(f"Received file: {filename}, Report Type: {report_type_requested}, Whisper Model: {whisper_model_size}, Inference: {inference_mode}")
+        print(f"Audio file saved temporarily to: {temp_audio_path} ({upload['bytes']} bytes, sha256 {upload['sha256'][:12]}..., "
+              f"{'decoded during upload' if pcm_path else 'decode pending'})")
+
+        payload, status_code, queued = _queue_audio_job(temp_audio_path, filename, upload['sha256'], report_type_requested,
+                                                        whisper_model_size, inference_mode, pcm_path=pcm_path)
+        if queued: temp_audio_path = pcm_path = None # The worker owns (and deletes) the files now
+        return jsonify(payload), status_code
+
+    except uploads.UploadTooLarge as e:
+        print(f"Rejected upload: {e}")
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+         print(f"General error while queueing job or during database interaction: {e}")
+         import traceback
+         traceback.print_exc() # Print full traceback for detailed debugging
+         # A job row that was created but couldn't be queued is marked failed by _queue_audio_job
+         return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        for path in (temp_audio_path, pcm_path):
+            if path and os.path.exists(path):
                  try:
-                     os.remove(temp_audio_path)
-                     print(f"Removed temporary audio file: {temp_audio_path}")
+                     os.remove(path)
+                     print(f"Removed temporary file: {path}")
                  except Exception as e_del:
-                     print(f"Warning: Failed to delete temp audio {temp_audio_path}: {e_del}")
+                     print(f"Warning: Failed to delete temp file {path}: {e_del}")
+
+
+
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch_endpoint():
+    """
+    Queues many recordings at once: either uploaded as repeated 'audioFiles' form fields, or read from
+    a server-side 'directory' under BATCH_INPUT_ROOT. Returns the batch id, the job id per file and
+    the URL of the batch manifest (per-file status, timings and errors).
+    """
+    print("--------------------------------------")
+    print("Received request at /process_batch")
+    if not ML_FUNCTION_LOADED: return jsonify({"error": "ML processing module not loaded on server."}), 500
+    if not STORAGE_INITIALIZED: return jsonify({"error": "Storage backend not initialized on server."}), 500
+
+    # Uploaded files are streamed to disk (and hashed) while the multipart body is parsed
+    start_time_save = time.time()
+    try:
+        form, received = uploads.receive_multipart(request.stream, request.content_type, app.config['UPLOAD_FOLDER'], ['audioFiles'])
+    except uploads.UploadTooLarge as e:
+        print(f"Rejected batch upload: {e}")
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error saving batch uploads: {e}")
+        return jsonify({"error": f"Server error while saving uploads: {str(e)}"}), 500
+    if received: metrics.observe_stage("upload_save", time.time() - start_time_save)
+    directory = form.get('directory', '').strip()
+    if received and directory:
+        for f in received:
+            if os.path.exists(f["path"]): os.remove(f["path"])
+        return jsonify({"error": "Send either 'audioFiles' or 'directory', not both"}), 400
+    report_type_requested = form.get('reportType', 'brief')
+    whisper_model_size = form.get('whisperModelSize', 'small')
+    inference_mode = (form.get('inferenceMode') or os.getenv("WHISPER_INFERENCE_MODE", "fp32")).lower()
+
+    files = []
+    if directory:
+        if not BATCH_INPUT_ROOT:
+            return jsonify({"error": "Server-side directories are not enabled (BATCH_INPUT_ROOT unset)"}), 403
+        root = os.path.realpath(BATCH_INPUT_ROOT)
+        directory = os.path.realpath(os.path.join(root, directory))
+        if os.path.commonpath([root, directory]) != root or not os.path.isdir(directory):
+            return jsonify({"error": "Directory not found under BATCH_INPUT_ROOT"}), 400
+        files = [{"path": p, "name": os.path.relpath(p, root), "report_type": report_type_requested}
+                 for p in batch.collect_audio_files([directory])]
     else:
-        return jsonify({"error": "Invalid file provided"}), 400
+        files = [{"path": f["path"], "name": f["filename"], "audio_hash": f["sha256"], "report_type": report_type_requested}
+                 for f in received]
+    if not files:
+        return jsonify({"error": "No audio files in request"}), 400
 
+    try:
+        batch_id = secrets.token_hex(8)
+        manifest, _ = batch.run_batch(report_store, files, whisper_model_size, inference_mode,
+                                      delete_audio=not directory, # uploads are ours to delete, the directory isn't
+                                      manifest_path=batch.manifest_path_for(batch_id), batch_id=batch_id)
+    except Exception as e:
+        print(f"General error while queueing batch: {e}")
+        import traceback; traceback.print_exc()
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+    jobs = [dict(entry, report_url=url_for('show_report_page', job_id=entry["job_id"]) if entry["job_id"] else None)
+            for entry in manifest.to_dict()["files"]]
+    return jsonify({
+        "batch_id": batch_id,
+        "manifest_url": url_for('get_batch_manifest', batch_id=batch_id),
+        "summary": manifest.summary(),
+        "jobs": jobs
+    }), 202
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"Request body exceeds the {uploads.MAX_UPLOAD_MB} MB upload limit"}), 413
+
+
+# --- Resumable Uploads (see uploads.py) ---
+# POST   /api/uploads         {"filename", "size", "sha256"?, "reportType"?, "whisperModelSize"?, "inferenceMode"?}
+# PUT    /api/uploads/<id>    raw bytes, "Upload-Offset: <n>" header; the last chunk queues the job
+# HEAD   /api/uploads/<id>    "Upload-Offset" to resume from after a dropped connection
+# GET    /api/uploads/<id>    the same as JSON; DELETE cancels
+def _upload_status(meta):
+    return {"upload_id": meta["upload_id"], "filename": meta["filename"], "size": meta["size"], "offset": meta["offset"],
+            "complete": meta["offset"] >= meta["size"], "upload_url": url_for('upload_chunk', upload_id=meta["upload_id"]),
+            "job": meta.get("job")}
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    if not ML_FUNCTION_LOADED: return jsonify({"error": "ML processing module not loaded on server."}), 500
+    if not STORAGE_INITIALIZED: return jsonify({"error": "Storage backend not initialized on server."}), 500
+    data = request.get_json(silent=True) or request.form
+    filename = werkzeug.utils.secure_filename(str(data.get('filename', '')))
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    if not filename or size <= 0:
+        return jsonify({"error": "'filename' and a positive 'size' (bytes) are required"}), 400
+    params = {
+        'reportType': data.get('reportType', 'brief'),
+        'whisperModelSize': data.get('whisperModelSize', 'small'),
+        'inferenceMode': (data.get('inferenceMode') or os.getenv("WHISPER_INFERENCE_MODE", "fp32")).lower(),
+    }
+    try:
+        meta = resumable_uploads.create(filename, size, data.get('sha256'), params)
+    except uploads.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    print(f"Resumable upload {meta['upload_id']} created for {filename} ({size} bytes)")
+    response = jsonify(_upload_status(meta))
+    response.headers['Location'] = url_for('upload_chunk', upload_id=meta['upload_id'])
+    response.headers['Upload-Offset'] = '0'
+    return response, 201
+
+@app.route('/api/uploads/<string:upload_id>', methods=['HEAD', 'GET'])
+def get_upload(upload_id):
+    meta = resumable_uploads.get(upload_id)
+    if meta is None: return jsonify({"error": "Upload not found"}), 404
+    response = jsonify(_upload_status(meta))
+    response.headers['Upload-Offset'] = str(meta['offset'])
+    response.headers['Upload-Length'] = str(meta['size'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/uploads/<string:upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    meta = resumable_uploads.get(upload_id)
+    if meta is None: return jsonify({"error": "Upload not found"}), 404
+    resumable_uploads.discard(upload_id)
+    return '', 204
+
+@app.route('/api/uploads/<string:upload_id>', methods=['PUT', 'PATCH'])
+def upload_chunk(upload_id):
+    meta = resumable_uploads.get(upload_id)
+    if meta is None: return jsonify({"error": "Upload not found"}), 404
+    if meta.get("job"):
+        # Already finished (the client probably missed the response to its last chunk)
+        return jsonify(_upload_status(meta)), 200
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Missing or invalid 'Upload-Offset' header"}), 400
 
+    start_time_save = time.time()
+    try:
+        meta = resumable_uploads.append(upload_id, offset, request.stream)
+    except uploads.UploadOffsetMismatch as e:
+        response = jsonify({"error": str(e), "offset": e.expected})
+        response.headers['Upload-Offset'] = str(e.expected)
+        return response, 409
+    except uploads.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    metrics.observe_stage("upload_save", time.time() - start_time_save)
+    if meta["offset"] < meta["size"]:
+        response = jsonify(_upload_status(meta))
+        response.headers['Upload-Offset'] = str(meta['offset'])
+        return response, 200
+
+    # Last chunk: hand the file (and the PCM decoded while it arrived, if any) to the worker pool
+    temp_audio_path = pcm_path = None
+    try:
+        part_path, audio_hash, pcm_path = resumable_uploads.complete(upload_id)
+        temp_audio_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{secrets.token_hex(8)}_{meta['filename']}")
+        os.replace(part_path, temp_audio_path)
+        if pcm_path:
+            os.replace(pcm_path, temp_audio_path + ".pcm")
+            pcm_path = temp_audio_path + ".pcm"
+        print(f"Resumable upload {upload_id} complete ({meta['size']} bytes, sha256 {audio_hash[:12]}..., "
+              f"{'decoded during upload' if pcm_path else 'decode pending'})")
+        params = meta["params"]
+        payload, status_code, queued = _queue_audio_job(temp_audio_path, meta['filename'], audio_hash, params['reportType'],
+                                                        params['whisperModelSize'], params['inferenceMode'], pcm_path=pcm_path)
+        if queued: temp_audio_path = pcm_path = None
+        resumable_uploads.record_job(upload_id, payload)
+        meta = resumable_uploads.get(upload_id)
+        return jsonify(dict(_upload_status(meta), **payload)), status_code
+    except uploads.UploadChecksumMismatch as e:
+        return jsonify({"error": str(e)}), 422
+    except Exception as e:
+        print(f"Error while queueing job for upload {upload_id}: {e}")
+        import traceback; traceback.print_exc()
+        resumable_uploads.discard(upload_id) # the received file is gone; the client has to start over
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        for path in (temp_audio_path, pcm_path):
+            if path and os.path.exists(path): os.remove(path)
+
+
+@app.route('/api/batch/<string:batch_id>', methods=['GET'])
+def get_batch_manifest(batch_id):
+    if not all(c in "0123456789abcdef" for c in batch_id):
+        abort(404, description="Unknown batch id.")
+    manifest_path = batch.manifest_path_for(batch_id)
+    if not os.path.exists(manifest_path):
+        abort(404, description=f"Batch {batch_id} not found.")
+    with open(manifest_path, encoding='utf-8') as f:
+        return Response(f.read(), mimetype='application/json')
+
+
+def _dialogue_page(job_id, from_seconds, to_seconds):
+    """The job's dialogue turns starting in [from_seconds, to_seconds), read from the compact column."""
+    record = report_store.get_job(job_id, columns=("status", "dialogue_compact"))
+    if record is None: return None
+    if record.get("dialogue_compact"):
+        dialogue = CompactDialogue.from_text(record["dialogue_compact"])
+    else: # rows written before dialogue_compact existed
+        record = report_store.get_job(job_id, columns=("status", "dialogue_json"))
+        dialogue = CompactDialogue.from_turns(record.get("dialogue_json") or [])
+    lo, hi = dialogue.index_range(from_seconds, to_seconds)
+    return {"status": record.get("status"), "dialogue_json": dialogue.to_turns(lo, hi),
+            "dialogue_range": {"from": from_seconds, "to": to_seconds, "first_turn": lo, "turns": hi - lo,
+                               "total_turns": len(dialogue), "duration": round(dialogue.duration(), 3)}}
 
 
 @app.route('/api/get_report_data/<string:job_id>', methods=['GET'])
 def get_report_data_api(job_id):
+    """
+    The stored report row, with the dialogue decoded into dialogue_json. With ?from=&to= (seconds, either
+    optional) only the dialogue turns starting in that time range are returned, so long calls can be
+    paged instead of downloaded whole; ?dialogue=0 returns the row without any dialogue (the report
+    page fetches the row that way and then pages the turns).
+    """
     print(f"--- API /api/get_report_data/{job_id} hit ---")
-    if not SUPABASE_INITIALIZED: return jsonify({"error": "Supabase client not initialized."}), 500
+    if not STORAGE_INITIALIZED: return jsonify({"error": "Storage backend not initialized."}), 500
+    paged = 'from' in request.args or 'to' in request.args
     try:
-        # Fetch data from 'transcripts_log' table where 'id' matches job_id
-        # Supabase primary keys are often UUIDs if auto-generated, or integers if you set it
-        # If your 'id' column in Supabase is integer, convert job_id: int(job_id)
-        # If it's UUID text, just use job_id as string.
-        # For now, assuming job_id (Firebase push key like) matches text or you use a text PK
-        
-        # Let's assume the primary key 'id' for transcripts_log is what we are using as job_id
-        # If it's an integer from a sequence, you might need to cast job_id
-        # For now, assuming it's a text/uuid type that matches the generated job_id string
-        response = supabase.table('transcripts_log').select("*").eq('id', job_id).maybe_single().execute()
-
-        print(f"Supabase get_report_data response: {response}")
-        if response.data:
-            # The data needed by frontend is directly what's stored.
-            # We add a "status" field for consistency with frontend polling logic,
-            # even though the record itself has it.
-            return_data = response.data
-            return_data_with_status = {
-                "status": response.data.get("status", "unknown"), # Get status from the record
-                "data": return_data # Pass the whole Supabase record as 'data'
-            }
-            return jsonify(return_data_with_status), 200
+        from_seconds = float(request.args['from']) if request.args.get('from') else None
+        to_seconds = float(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "'from' and 'to' must be numbers of seconds"}), 400
+    if any(bound is not None and not math.isfinite(bound) for bound in (from_seconds, to_seconds)):
+        return jsonify({"error": "'from' and 'to' must be finite numbers of seconds"}), 400
+    try:
+        if paged:
+            record = _dialogue_page(job_id, from_seconds, to_seconds)
         else:
-            print(f"Job ID {job_id} not found in Supabase for get_report_data.")
-            abort(404, description=f"Analysis result for job ID {job_id} not found.")
+            # Full row; served from memory once the job has reached a final status
+            record = report_store.get_job(job_id)
+            if record:
+                dialogue = stored_turns(record) if request.args.get('dialogue', '1') != '0' else None
+                record = {k: v for k, v in record.items() if k not in ('dialogue_json', 'dialogue_compact')}
+                if dialogue is not None: record['dialogue_json'] = dialogue
     except Exception as e:
-         print(f"Error fetching result from Supabase for job {job_id}: {e}")
+         print(f"Error fetching result from database for job {job_id}: {e}")
          abort(500, description="Error fetching result from database.")
+    if record:
+        # The data needed by frontend is directly what's stored.
+        # We add a "status" field for consistency with frontend polling logic,
+        # even though the record itself has it.
+        return jsonify({
+            "status": record.get("status", "unknown"), # Get status from the record
+            "data": record # Pass the whole record as 'data'
+        }), 200
+    print(f"Job ID {job_id} not found in database for get_report_data.")
+    abort(404, description=f"Analysis result for job ID {job_id} not found.")
+
+
+@app.route('/api/report/<string:job_id>', methods=['GET', 'POST'])
+def generate_report_api(job_id):
+    """
+    The report for a completed job, rendered from its stored transcript (no audio or models involved).
+    GET ?type=brief|detailed&prompt=..., or POST {"report_type", "prompt"} for the regenerate flow.
+    The type defaults to the one chosen at upload. Repeat requests for the same variant are served from memory.
+    """
+    if not STORAGE_INITIALIZED: return jsonify({"error": "Storage backend not initialized."}), 500
+    body = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    report_type = body.get('report_type') or request.args.get('type')
+    prompt = str(body.get('prompt') or '') if 'prompt' in body else request.args.get('prompt', '')
+    found = {}
+
+    def _load_record():
+        record = report_store.get_job(job_id)
+        found["status"] = record.get("status") if record else None
+        return record if found["status"] == job_queue.STATUS_COMPLETED else None
+
+    try:
+        if not report_type:
+            record = report_store.get_job(job_id, columns=("report_type_requested",))
+            report_type = (record or {}).get("report_type_requested") or "brief"
+        report, cached = report_generator.get_report(job_id, _load_record, report_type, prompt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error generating report for job {job_id}: {e}")
+        return jsonify({"error": "Report generation failed."}), 500
+    if report is None:
+        if found.get("status") is None: abort(404, description=f"Analysis result for job ID {job_id} not found.")
+        return jsonify({"error": f"Job {job_id} is {found['status']}; a report needs a completed transcript.", "status": found["status"]}), 409
+    return jsonify(dict(report, cached=cached))
 
 
 @app.route('/get_status/<string:job_id>', methods=['GET'])
 def get_job_status(job_id):
     print(f"--- API /get_status/{job_id} hit ---")
-    if not SUPABASE_INITIALIZED: return jsonify({"job_id": job_id, "status": "error_db_conn"}), 500
+    if not STORAGE_INITIALIZED: return jsonify({"job_id": job_id, "status": "error_db_conn"}), 500
     try:
-        response = supabase.table('transcripts_log').select("status").eq('id', job_id).maybe_single().execute()
-        if response.data and 'status' in response.data:
-            return jsonify({"job_id": job_id, "status": response.data['status']})
+        # Only the status column, so polling never pulls the transcript
+        record = report_store.get_job(job_id, columns=("status",))
+        if record and record.get('status'):
+            return jsonify({"job_id": job_id, "status": record['status']})
         else:
             return jsonify({"job_id": job_id, "status": "not_found"}) # Or "unknown" if record exists but no status
     except Exception as e:
-         print(f"Error fetching status from Supabase for job {job_id}: {e}")
+         print(f"Error fetching status from database for job {job_id}: {e}")
          return jsonify({"job_id": job_id, "status": "error_fetching"}), 500
 
+@app.route('/api/cache_stats', methods=['GET'])
+def get_cache_stats():
+    try:
+        stats = result_cache.stats()
+        if STORAGE_INITIALIZED: stats["report_cache"] = report_store.stats()
+        if search_index.SEARCH_INDEX_ENABLED: stats["search_index"] = search_index.stats()
+        if embeddings.EMBEDDINGS_ENABLED: stats["similarity_index"] = embeddings.stats()
+        stats["generated_reports"] = report_generator.stats()
+        return jsonify(stats)
+    except Exception as e:
+        print(f"Error reading result cache stats: {e}")
+        return jsonify({"error": "Result cache unavailable."}), 500
+
+
+@app.route('/api/search', methods=['GET'])
+def search_transcripts():
+    """
+    Full-text search over completed transcripts: ?q=words[&limit=20&speaker=A&job_id=...].
+    Returns BM25-ranked dialogue turns with job id, speaker, start/end seconds and a snippet.
+    """
+    query = request.args.get('q', '').strip()
+    if not query: return jsonify({"error": "Missing 'q' parameter"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    try:
+        results = search_index.search(query, limit=limit, speaker=request.args.get('speaker') or None,
+                                      job_id=request.args.get('job_id') or None)
+    except Exception as e:
+        print(f"Error searching transcripts for '{query}': {e}")
+        return jsonify({"error": "Search index unavailable."}), 500
+    for hit in results["hits"]:
+        hit["report_url"] = url_for('show_report_page', job_id=hit["job_id"])
+    return jsonify(results)
+
+
+@app.route('/api/similar', methods=['GET'])
+def similar_utterances():
+    """
+    Dialogue turns similar to a stored turn (?job_id=...&turn=3) or to free text (?q=...),
+    ranked by embedding cosine similarity. Optional: limit (default 10), in_job (restrict to one job).
+    The similarity is orthographic, not semantic: embeddings are hashed character n-grams of the
+    words, so turns sharing words or word forms ("invoice" / "invoicing") rank high, but synonyms
+    and paraphrases with different words do not.
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        turn = request.args.get('turn', type=int)
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    job_id, query = request.args.get('job_id'), request.args.get('q', '').strip()
+    try:
+        if job_id and turn is not None:
+            query_vector = embeddings.turn_vector(job_id, turn)
+            if query_vector is None: return jsonify({"error": f"Turn {turn} of job {job_id} is not indexed"}), 404
+            results = embeddings.similar(query_vector, limit=limit, job_id=request.args.get('in_job') or None, exclude=(job_id, turn))
+        elif query:
+            results = embeddings.similar(embeddings.embed_text(query), limit=limit, job_id=request.args.get('in_job') or None)
+        else:
+            return jsonify({"error": "Pass 'job_id' and 'turn', or 'q'"}), 400
+    except Exception as e:
+        print(f"Error finding similar utterances: {e}")
+        return jsonify({"error": "Similarity index unavailable."}), 500
+    for hit in results["hits"]:
+        hit["report_url"] = url_for('show_report_page', job_id=hit["job_id"])
+    return jsonify(results)
+
+
+@app.route('/api/stream/<string:job_id>', methods=['GET'])
+def stream_job_events(job_id):
+    """Server-Sent Events: stage transitions ('status'), newly finalized dialogue turns ('turns') and a final 'done'."""
+    print(f"--- API /api/stream/{job_id} hit ---")
+    # EventSource sends the last id it saw when it reconnects; resume right after it
+    last_event_id = request.headers.get('Last-Event-ID')
+    start_index = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    if not job_events.bus.knows(job_id):
+        # Not running in this server (finished a while ago, or queued before a restart): answer from the DB once
+        if not STORAGE_INITIALIZED: return jsonify({"error": "Storage backend not initialized."}), 500
+        try:
+            record = report_store.get_job(job_id, columns=("status", "error_message"))
+        except Exception as e:
+            print(f"Error fetching status from database for job {job_id}: {e}")
+            return jsonify({"error": "Error fetching status from database."}), 500
+        if not record:
+            return jsonify({"error": f"Job ID {job_id} not found."}), 404
+        status = record.get('status', 'unknown')
+        def _single_status():
+            yield job_events.format_sse(job_events.EVENT_STATUS, {"status": status})
+            yield job_events.format_sse(job_events.EVENT_DONE, {"status": status, "error": record.get('error_message')})
+        return Response(_single_status(), mimetype='text/event-stream')
+
+    def _event_stream():
+        for item in job_events.bus.follow(job_id, start_index):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            index, event, data = item
+            yield job_events.format_sse(event, data, event_id=index)
+
+    return Response(stream_with_context(_event_stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- Health Endpoints ---
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok", "uptime_seconds": round(time.time() - SERVER_START_TIME, 3)}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: storage is reachable from this process and, when workers preload their models
+    (WARMUP_ON_START), at least one worker has finished loading them. 503 until then.
+    """
+    workers = job_events.workers.snapshot()
+    models_ready = not job_queue.WARMUP_ON_START or len(workers) > 0
+    ready = ML_FUNCTION_LOADED and STORAGE_INITIALIZED and models_ready
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "ml_packages": ML_FUNCTION_LOADED,
+        "storage": STORAGE_INITIALIZED,
+        "models_preloaded": job_queue.WARMUP_ON_START,
+        "workers_ready": len(workers),
+        "workers_expected": job_queue.JOB_WORKERS,
+        "workers": workers,
+        "uptime_seconds": round(time.time() - SERVER_START_TIME, 3)
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: per-stage duration, real-time factor, peak RSS and audio seconds
+    (see metrics.py). Worker stages arrive with each job's 'done' event, so this covers the whole pool.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# --- Worker Warm-up ---
+# Started at import, so the pool comes up under any WSGI host (gunicorn imports this module and
+# never calls app.run) and /readyz can pass before the first upload. Skipped in the debug
+# reloader's watcher process (its serving child, WERKZEUG_RUN_MAIN=true, starts them) and in
+# the worker processes themselves, which re-import this module under the 'spawn' start method.
+_reloader_watcher = __name__ == '__main__' and FLASK_DEBUG and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+if job_queue.WARMUP_ON_START and ML_FUNCTION_LOADED and not _reloader_watcher and multiprocessing.parent_process() is None:
+    job_queue.start_workers()
+
 # --- Run the App ---
 if __name__ == '__main__':
     print("Starting Flask server...")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=FLASK_DEBUG, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,239 @@
+# ai-report-generator/backend/batch.py
+#
+# Batch ingest: many recordings in one run (e.g. a nightly dump of call recordings).
+# Files are probed and scheduled longest-first on the shared worker pool (whose workers keep
+# their models resident), short clips are grouped so Whisper decodes them in one batch, and a
+# JSON manifest records every file's job id, status, timings and error. A file that fails only
+# fails its own entry.
+#
+# Used by the /process_batch endpoint and as a CLI:
+#   python batch.py /data/calls/2025-06-01 extra_call.mp3 --size small --manifest manifest.json
+
+import os
+import sys
+import json
+import time
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import job_queue
+import result_cache
+from audio_io import BATCH_CLIP_MAX_SECONDS, probe_duration
+
+# --- Configuration ---
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".webm", ".mp4", ".aac", ".wma")
+# Short clips per batched Whisper decode
+BATCH_DECODE_SIZE = int(os.getenv("BATCH_DECODE_SIZE", "8"))
+# Parallel ffprobe calls while scheduling
+BATCH_PROBE_THREADS = int(os.getenv("BATCH_PROBE_THREADS", "8"))
+BATCH_MANIFEST_DIR = os.getenv("BATCH_MANIFEST_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batches'))
+
+
+def collect_audio_files(paths):
+    """Expands directories (recursively) into their audio files; files are kept as given. Sorted, no duplicates."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found.extend(os.path.join(root, name) for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            found.append(path)
+    return sorted(set(os.path.abspath(p) for p in found))
+
+
+def hash_file(path, chunk_size=result_cache.HASH_CHUNK_BYTES):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def probe_durations(paths):
+    """{path: seconds or None}, probed in parallel."""
+    with ThreadPoolExecutor(max_workers=BATCH_PROBE_THREADS, thread_name_prefix="batch-probe") as pool:
+        return dict(zip(paths, pool.map(probe_duration, paths)))
+
+
+# --- Manifest ---
+class BatchManifest:
+    """Per-file record of a batch run, rewritten to disk (atomically) every time an entry changes."""
+
+    def __init__(self, batch_id, path, whisper_model_size, inference_mode):
+        self.batch_id = batch_id
+        self.path = path
+        self.data = {"batch_id": batch_id, "whisper_model_size": whisper_model_size, "inference_mode": inference_mode,
+                     "created_at": time.time(), "finished_at": None, "files": []}
+        self._by_job = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def add(self, file_name, duration, job_id=None, status=job_queue.STATUS_QUEUED, error=None, cached=False):
+        entry = {"file": file_name, "duration_seconds": duration, "job_id": job_id, "status": status,
+                 "error": error, "cached": cached, "batched": False, "timings": {}}
+        with self._lock:
+            self.data["files"].append(entry)
+            if job_id is not None: self._by_job[job_id] = entry
+        return entry
+
+    def record(self, outcome):
+        """Applies a worker's job outcome ({"job_id", "status", "error", "timings"[, "batched"]})."""
+        with self._lock:
+            entry = self._by_job.get(outcome["job_id"])
+            if entry is None: return
+            entry.update(status=outcome["status"], error=outcome.get("error"), timings=outcome.get("timings") or {},
+                         batched=outcome.get("batched", False))
+            if all(e["status"] in job_queue.FINAL_STATUSES for e in self.data["files"]):
+                self.data["finished_at"] = time.time()
+        self.write()
+
+    def fail_jobs(self, job_ids, error):
+        for job_id in job_ids:
+            self.record({"job_id": job_id, "status": job_queue.STATUS_FAILED, "error": error})
+
+    def summary(self):
+        with self._lock:
+            files = self.data["files"]
+            counts = {}
+            for e in files: counts[e["status"]] = counts.get(e["status"], 0) + 1
+            return {"files": len(files), "by_status": counts, "cached": sum(e["cached"] for e in files)}
+
+    def to_dict(self):
+        with self._lock:
+            return json.loads(json.dumps(self.data)) # deep copy, safe to serialize outside the lock
+
+    def write(self):
+        if not self.path: return
+        data = self.to_dict()
+        data["summary"] = self.summary()
+        with self._write_lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def manifest_path_for(batch_id):
+    return os.path.join(BATCH_MANIFEST_DIR, f"{batch_id}.json")
+
+
+# --- Scheduling ---
+def _apply_future(manifest, future, job_ids):
+    exc = future.exception()
+    if exc is not None:
+        manifest.fail_jobs(job_ids, str(exc))
+        return
+    result = future.result()
+    for outcome in (result if isinstance(result, list) else [result]):
+        manifest.record(outcome)
+
+def _track(manifest, future, job_ids):
+    future.add_done_callback(lambda f: _apply_future(manifest, f, job_ids))
+    return future, job_ids
+
+def wait_for_batch(manifest, tracked):
+    """Blocks until every job of the batch has finished and the manifest reflects all of them."""
+    wait([future for future, _ in tracked])
+    # Done callbacks can still be running when wait() returns; apply every outcome here too (idempotent)
+    for future, job_ids in tracked:
+        _apply_future(manifest, future, job_ids)
+
+
+def run_batch(store, files, whisper_model_size, inference_mode=None, delete_audio=True, manifest_path=None, batch_id=None):
+    """
+    Schedules every file on the worker pool and returns (manifest, tracked) without waiting;
+    tracked is [(future, job_ids)] for wait_for_batch.
+
+    files: [{"path", "name", "audio_hash" (optional)}]. Files are submitted longest-first, so the
+    longest recordings start first and the short ones fill in at the end; clips no longer than
+    BATCH_CLIP_MAX_SECONDS go out in groups of BATCH_DECODE_SIZE for batched decoding.
+    """
+    batch_id = batch_id or secrets.token_hex(8)
+    inference_mode = (inference_mode or os.getenv("WHISPER_INFERENCE_MODE", "fp32")).lower()
+    manifest = BatchManifest(batch_id, manifest_path, whisper_model_size, inference_mode)
+    cache_variant = result_cache.model_variant(whisper_model_size, inference_mode)
+
+    durations = probe_durations([f["path"] for f in files])
+    # Unknown durations first: they might be the longest, and they fail fast if unreadable
+    ordered = sorted(files, key=lambda f: -(durations[f["path"]] if durations[f["path"]] is not None else float("inf")))
+    print(f"Batch {batch_id}: {len(ordered)} files, {sum(d or 0 for d in durations.values()) / 3600:.2f}h of audio")
+
+    long_jobs, short_jobs = [], []
+    for f in ordered:
+        duration = durations[f["path"]]
+        try:
+            audio_hash = f.get("audio_hash") or hash_file(f["path"])
+            fields = {'audio_filename': f["name"], 'audio_hash': audio_hash, 'whisper_model_size': whisper_model_size,
+                      'inference_mode': inference_mode, 'report_type_requested': f.get("report_type", "brief")}
+            cached = result_cache.lookup(audio_hash, cache_variant)
+            if cached is not None:
+                job_id = job_queue.create_cached_job(store, fields, cached)
+                manifest.add(f["name"], duration, job_id, job_queue.STATUS_COMPLETED, cached=True)
+                if delete_audio and os.path.exists(f["path"]): os.remove(f["path"])
+                continue
+            job_id = store.create_job(dict(fields, status=job_queue.STATUS_QUEUED))
+        except Exception as e:
+            print(f"Batch {batch_id}: could not queue {f['name']}: {e}")
+            manifest.add(f["name"], duration, status=job_queue.STATUS_FAILED, error=str(e))
+            continue
+        manifest.add(f["name"], duration, job_id)
+        is_short = duration is not None and duration <= BATCH_CLIP_MAX_SECONDS
+        (short_jobs if is_short else long_jobs).append((job_id, f["path"], audio_hash))
+
+    tracked = []
+    for job_id, path, audio_hash in long_jobs:
+        future = job_queue.submit_job(job_id, path, whisper_model_size, audio_hash=audio_hash,
+                                      inference_mode=inference_mode, delete_audio=delete_audio)
+        tracked.append(_track(manifest, future, [job_id]))
+    for start in range(0, len(short_jobs), BATCH_DECODE_SIZE):
+        group = short_jobs[start:start + BATCH_DECODE_SIZE]
+        future = job_queue.submit_short_batch(group, whisper_model_size, inference_mode, delete_audio)
+        tracked.append(_track(manifest, future, [job_id for job_id, _, _ in group]))
+    print(f"Batch {batch_id}: {len(long_jobs)} files queued individually, {len(short_jobs)} short clips in "
+          f"{(len(short_jobs) + BATCH_DECODE_SIZE - 1) // BATCH_DECODE_SIZE} batched decodes")
+    manifest.write()
+    return manifest, tracked
+
+
+# --- CLI ---
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Process many recordings with shared worker models")
+    parser.add_argument("paths", nargs="+", help="Audio files and/or directories (searched recursively)")
+    parser.add_argument("--size", default="small", help="Whisper model size")
+    parser.add_argument("--mode", default=None, choices=["fp32", "int8"], help="Whisper inference mode (default: WHISPER_INFERENCE_MODE)")
+    parser.add_argument("--report-type", default="brief")
+    parser.add_argument("--manifest", default=None, help="Manifest path (default: batches/<batch_id>.json)")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    if os.path.exists(dotenv_path): load_dotenv(dotenv_path=dotenv_path)
+    import storage
+
+    paths = collect_audio_files(args.paths)
+    if not paths:
+        print("No audio files found.")
+        return 1
+    batch_id = secrets.token_hex(8)
+    manifest_path = os.path.abspath(args.manifest) if args.manifest else manifest_path_for(batch_id)
+    files = [{"path": p, "name": os.path.basename(p), "report_type": args.report_type} for p in paths]
+
+    start_time = time.time()
+    try:
+        # The caller's files are left where they are
+        manifest, tracked = run_batch(storage.create_store(), files, args.size, args.mode, delete_audio=False,
+                                      manifest_path=manifest_path, batch_id=batch_id)
+        wait_for_batch(manifest, tracked)
+    finally:
+        job_queue.shutdown()
+    summary = manifest.summary()
+    print(f"Batch {batch_id} finished in {time.time() - start_time:.1f}s: {summary}. Manifest: {manifest_path}")
+    return 0 if summary["by_status"].get(job_queue.STATUS_FAILED, 0) == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# ai-report-generator/backend/benchmarks/bench_preprocessing.py
+#
+# Compares the original preprocessing (full en_core_web_sm pipeline over the whole
+# lowercased transcript as one doc) with text_preprocessing.preprocess_turns (parser/NER
+# excluded, one doc per turn through nlp.pipe). Each variant runs in its own subprocess
+# so peak RSS is measured independently.
+# Run from the backend directory: python benchmarks/bench_preprocessing.py [--turns 2000]
+
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+WORDS = ("the customer called about their invoice and we discussed the delivery schedule for next week "
+         "I think we should escalate this to the billing team because the payment was processed twice "
+         "could you confirm the account number please yes of course it is on the order form").split()
+
+
+def make_turns(num_turns, seed=0):
+    rng = random.Random(seed)
+    turns = []
+    for _ in range(num_turns):
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "." for _ in range(rng.randint(1, 4))]
+        turns.append(" ".join(sentences))
+    return turns
+
+
+def run_variant(variant, num_turns, n_process):
+    import spacy
+    from text_preprocessing import load_lean_model, preprocess_turns
+    turns = make_turns(num_turns)
+    if variant == "legacy":
+        nlp = spacy.load("en_core_web_sm")
+        text = " ".join(turns)
+        start = time.perf_counter()
+        doc = nlp(text.lower()) # raises once the transcript exceeds nlp.max_length
+        processed = " ".join(t.lemma_ for t in doc if not t.is_stop and not t.is_punct and t.lemma_.strip())
+    else:
+        nlp = load_lean_model()
+        start = time.perf_counter()
+        processed = preprocess_turns(nlp, turns, n_process=n_process)["processed_text"]
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Linux reports KB
+    return {"variant": variant, "seconds": elapsed, "peak_rss_mb": peak_rss_mb,
+            "chars": sum(len(t) for t in turns), "processed_chars": len(processed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark spaCy preprocessing")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--n-process", type=int, default=1)
+    parser.add_argument("--variant", choices=["legacy", "lean"], help=argparse.SUPPRESS) # internal: run one variant
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.turns, args.n_process)))
+        return
+
+    results = {}
+    for variant in ("legacy", "lean"):
+        proc = subprocess.run([sys.executable, __file__, "--variant", variant, "--turns", str(args.turns), "--n-process", str(args.n_process)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{variant}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''}")
+            continue
+        results[variant] = json.loads(proc.stdout.strip().splitlines()[-1])
+        r = results[variant]
+        print(f"{variant:7s} {r['seconds']:8.2f}s  peak RSS {r['peak_rss_mb']:7.1f} MB  ({r['chars']} chars -> {r['processed_chars']})")
+
+    if len(results) == 2:
+        legacy, lean = results["legacy"], results["lean"]
+        print(f"Speedup: {legacy['seconds'] / lean['seconds']:.2f}x, peak RSS change: {lean['peak_rss_mb'] - legacy['peak_rss_mb']:+.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
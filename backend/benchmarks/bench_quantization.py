@@ -0,0 +1,99 @@
+# ai-report-generator/backend/benchmarks/bench_quantization.py
+#
+# Compares Whisper inference modes (fp32 vs dynamic int8) on a fixed local clip: real-time
+# factor (transcription seconds / audio seconds), peak RSS and WER. WER is measured against
+# --reference (a text file with the correct transcript) when given, and int8 is always also
+# scored against the fp32 output to show the drift quantization introduces.
+# Each mode runs in its own subprocess so peak RSS is measured independently.
+# Run from the backend directory: python benchmarks/bench_quantization.py --clip ../stt_audio.mp3 [--size small --threads 4]
+
+import os
+import sys
+import json
+import time
+import string
+import resource
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MODES = ("fp32", "int8")
+
+
+def normalize_words(text):
+    return text.lower().translate(str.maketrans("", "", string.punctuation)).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """(substitutions + deletions + insertions) / reference words, by word-level edit distance."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref: return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def run_mode(mode, clip, size, threads):
+    import torch
+    if threads > 0: torch.set_num_threads(threads)
+    import audio_processor
+    audio = audio_processor.decode_audio_16k_mono(clip)
+    if audio is None: raise SystemExit(f"Could not decode {clip}")
+    audio_seconds = len(audio) / audio_processor.SAMPLE_RATE
+
+    start = time.perf_counter()
+    model = audio_processor._build_whisper_model(size, mode)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = model.transcribe(audio, fp16=False, language='en', word_timestamps=audio_processor.WORD_TIMESTAMPS)
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Linux reports KB
+    return {"mode": mode, "audio_seconds": audio_seconds, "load_seconds": load_seconds, "seconds": elapsed,
+            "rtf": elapsed / audio_seconds if audio_seconds else 0.0, "peak_rss_mb": peak_rss_mb,
+            "text": result["text"].strip()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper fp32 vs int8 inference")
+    parser.add_argument("--clip", required=True, help="Local audio file (keep it fixed between runs)")
+    parser.add_argument("--reference", default=None, help="Text file with the reference transcript of the clip")
+    parser.add_argument("--size", default="small")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS) # internal: run one mode
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.clip, args.size, args.threads)))
+        return
+
+    reference = None
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f: reference = f.read()
+
+    results = {}
+    for mode in MODES:
+        proc = subprocess.run([sys.executable, __file__, "--mode", mode, "--clip", args.clip, "--size", args.size, "--threads", str(args.threads)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{mode}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''}")
+            continue
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        r = results[mode]
+        wer = f"  WER {word_error_rate(reference, r['text']):6.2%}" if reference is not None else ""
+        print(f"{mode:5s} RTF {r['rtf']:6.3f} ({r['seconds']:7.2f}s for {r['audio_seconds']:.1f}s audio, load {r['load_seconds']:.1f}s)  "
+              f"peak RSS {r['peak_rss_mb']:7.1f} MB{wer}")
+
+    if len(results) == 2:
+        fp32, int8 = results["fp32"], results["int8"]
+        print(f"int8 vs fp32: speedup {fp32['seconds'] / int8['seconds']:.2f}x, peak RSS change {int8['peak_rss_mb'] - fp32['peak_rss_mb']:+.1f} MB, "
+              f"WER drift vs fp32 output {word_error_rate(fp32['text'], int8['text']):.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# ai-report-generator/backend/benchmarks/bench_word_store.py
+#
+# Offline load test for word-level persistence. Writes synthetic jobs into a local SQLite
+# (default) or Postgres database given by --db-url, comparing word_store's batched
+# multi-row inserts with one INSERT per row.
+# Run from the backend directory: python benchmarks/bench_word_store.py [--jobs 20 --words-per-job 10000]
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import word_store
+
+
+def make_utterances(num_words, words_per_utterance=25, num_speakers=3, seed=0):
+    rng = random.Random(seed)
+    utterances, t = [], 0.0
+    for u in range(0, num_words, words_per_utterance):
+        words = []
+        for i in range(min(words_per_utterance, num_words - u)):
+            duration = rng.uniform(0.1, 0.6)
+            words.append({"word": f"word{rng.randrange(5000)}", "start": t, "end": t + duration, "pos_tag": "NOUN", "lemma": f"word{i}"})
+            t += duration
+        utterances.append({"speaker": "ABC"[rng.randrange(num_speakers)], "start": words[0]["start"], "end": words[-1]["end"],
+                           "text": " ".join(w["word"] for w in words), "words": words})
+    return utterances
+
+
+def persist_row_by_row(writer, job_id, utterances):
+    """Baseline: the same rows, one INSERT statement each."""
+    speaker_rows, utterance_rows, word_rows = word_store.build_rows(job_id, utterances)
+    for table, columns, rows, ignore in (("speakers", word_store.SPEAKER_COLUMNS, speaker_rows, True),
+                                         ("utterances", word_store.UTTERANCE_COLUMNS, utterance_rows, False),
+                                         ("words", word_store.WORD_COLUMNS, word_rows, False)):
+        for row in rows:
+            writer.insert_rows(table, columns, [row], ignore_conflicts=ignore)
+    writer.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test word-level persistence")
+    parser.add_argument("--db-url", default=None, help="sqlite:///path or postgresql://... (default: temporary SQLite file)")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--words-per-job", type=int, default=10000)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_url = args.db_url
+    if db_url is None:
+        tmp_dir = tempfile.mkdtemp()
+        db_url = f"sqlite:///{os.path.join(tmp_dir, 'words.sqlite3')}"
+    writer = word_store.open_writer(db_url=db_url)
+    utterances = make_utterances(args.words_per_job)
+    print(f"Target: {db_url}; {args.jobs} jobs x {args.words_per_job} words ({len(utterances)} utterances each)")
+
+    for label, persist in (("row-by-row", persist_row_by_row), ("batched", word_store.persist_utterances)):
+        start = time.perf_counter()
+        for job in range(args.jobs):
+            persist(writer, f"bench-{label}-{job}", utterances)
+        elapsed = time.perf_counter() - start
+        total_words = args.jobs * args.words_per_job
+        print(f"{label:11s} {elapsed:8.2f}s  {total_words / elapsed:10.0f} words/s  {1000 * elapsed / args.jobs:8.1f} ms/job")
+    writer.close()
+
+
+if __name__ == '__main__':
+    main()
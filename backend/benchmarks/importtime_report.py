@@ -0,0 +1,74 @@
+# ai-report-generator/backend/benchmarks/importtime_report.py
+#
+# Cold-start report: imports a module in a fresh interpreter under `python -X importtime`
+# and breaks the import time down by top-level package (sum of the self time of each of its
+# modules; interpreter startup imports are left out), plus the wall time of the whole import.
+# Run it against `backend` to track how long the web server takes before it can serve
+# requests, or against `audio_processor` for a worker.
+# Run from the backend directory: python benchmarks/importtime_report.py [--module backend --top 15 --json out.json]
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def measure(module=None):
+    """Runs `import module` in a new interpreter. Returns (wall seconds, [(self_us, cumulative_us, depth, name)])."""
+    code = ("import time, sys; t = time.perf_counter(); " + (f"import {module}; " if module else "") +
+            "sys.stdout.write(repr(time.perf_counter() - t))")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                          capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+    if proc.returncode != 0:
+        tail = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")][-5:]
+        raise SystemExit(f"Importing {module} failed:\n" + "\n".join(tail))
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        # "import time:       123 |       4567 |   package.module" (indentation of the name = nesting depth)
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    wall_seconds = float(proc.stdout.strip().splitlines()[-1])
+    return wall_seconds, entries
+
+
+def by_top_level_package(entries, exclude=()):
+    """Self-time microseconds summed per top-level package, skipping modules named in exclude."""
+    totals = {}
+    for self_us, _, _, name in entries:
+        if name in exclude: continue
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown for cold-start tracking")
+    parser.add_argument("--module", default="backend", help="Module to import from the backend directory (default: backend)")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    _, startup_entries = measure() # what a bare interpreter imports anyway
+    wall_seconds, entries = measure(args.module)
+    packages = by_top_level_package(entries, exclude={name for *_, name in startup_entries})
+    total_us = sum(us for _, us in packages)
+    print(f"import {args.module}: {wall_seconds * 1000:.0f} ms wall, {len(entries)} modules imported")
+    print(f"{'package':30s} {'self ms':>14s} {'share':>7s}")
+    for package, us in packages[:args.top]:
+        print(f"{package:30s} {us / 1000:14.1f} {us / total_us if total_us else 0:7.1%}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"module": args.module, "wall_ms": wall_seconds * 1000, "modules_imported": len(entries),
+                       "packages_ms": {package: us / 1000 for package, us in packages}}, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
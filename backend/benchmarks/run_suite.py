@@ -0,0 +1,357 @@
+# ai-report-generator/backend/benchmarks/run_suite.py
+#
+# Offline benchmark suite for the audio pipeline. Runs every stage in isolation (decode, vad,
+# diarization, transcription, alignment, preprocessing, word_tagging, embedding, storage) and the whole
+# process_audio_and_return_dialogue end to end, over a fixed corpus of clips at several
+# lengths and speaker counts, once per Whisper size. Writes latency percentiles, real-time
+# factor and peak RSS as JSON so two commits can be compared with --compare.
+#
+# The corpus is generated deterministically (synthetic voiced speech per speaker, with pauses)
+# into benchmarks/corpus/, or --corpus points at a directory of real recordings.
+# --models stub swaps stub diarization/Whisper models into the model registry, which measures
+# decode, alignment, preprocessing and storage overhead without downloading any weights.
+# Each Whisper size runs in its own subprocess so peak RSS is measured independently.
+#
+# Run from the backend directory:
+#   python benchmarks/run_suite.py --models stub --out before.json
+#   python benchmarks/run_suite.py --models stub --out after.json
+#   python benchmarks/run_suite.py --compare before.json after.json
+
+import os
+import sys
+import json
+import time
+import wave
+import random
+import hashlib
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+SAMPLE_RATE = 16000
+STAGES = ("decode", "vad", "diarization", "transcription", "alignment", "preprocessing", "word_tagging", "embedding", "storage", "end_to_end")
+PERCENTILES = (50, 90, 99)
+WORDS = ("the customer called about their invoice and we discussed the delivery schedule for next week "
+         "I think we should escalate this to the billing team because the payment was processed twice "
+         "could you confirm the account number please yes of course it is on the order form").split()
+
+
+# --- Corpus ---
+def synthesize_clip(path, seconds, num_speakers, seed):
+    """Writes a 16kHz mono WAV of alternating 'speakers' (harmonic voices at different pitches, syllable-rate
+    amplitude modulation, pauses between turns) over a low noise floor. Returns the speaker turns."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0.0, 0.003, total).astype(np.float32)
+    pitches = [110.0 + 140.0 * i / max(1, num_speakers - 1) for i in range(num_speakers)]
+    turns, t, speaker = [], 0.0, 0
+    while t < seconds:
+        t += rng.uniform(0.2, 1.5) # pause
+        duration = min(rng.uniform(2.0, 10.0), seconds - t)
+        if duration <= 0.5: break
+        start, end = int(t * SAMPLE_RATE), int((t + duration) * SAMPLE_RATE)
+        n = np.arange(end - start) / SAMPLE_RATE
+        f0 = pitches[speaker] * (1.0 + 0.05 * np.sin(2 * np.pi * 0.7 * n)) # slight intonation
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        syllables = 0.5 * (1.0 + np.sin(2 * np.pi * rng.uniform(3.5, 5.0) * n)) # ~4 syllables per second
+        audio[start:end] += (0.15 * voice * syllables).astype(np.float32)
+        turns.append({"speaker": f"SPEAKER_{speaker:02d}", "start": t, "end": t + duration})
+        t += duration
+        if num_speakers > 1:
+            speaker = (speaker + int(rng.integers(1, num_speakers))) % num_speakers
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1); f.setsampwidth(2); f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+    return turns
+
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def build_corpus(corpus_dir, lengths, speaker_counts, seed=0):
+    """Generates the synthetic corpus (skipping clips that already exist) and returns its manifest."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    clips = []
+    for seconds in lengths:
+        for num_speakers in speaker_counts:
+            name = f"synthetic_{int(seconds)}s_{num_speakers}spk.wav"
+            path = os.path.join(corpus_dir, name)
+            if not os.path.exists(path):
+                print(f"Generating {name}...")
+                synthesize_clip(path, seconds, num_speakers, seed=seed * 100003 + int(seconds) * 10 + num_speakers)
+            clips.append({"name": name, "path": path, "seconds": float(seconds), "speakers": num_speakers, "sha256": _sha256(path)})
+    return clips
+
+
+def load_corpus(corpus_dir):
+    """Every audio file in a directory of real recordings (durations are read when the clip is decoded)."""
+    from batch import collect_audio_files
+    return [{"name": os.path.relpath(p, corpus_dir), "path": p, "seconds": None, "speakers": None, "sha256": _sha256(p)}
+            for p in collect_audio_files([corpus_dir])]
+
+
+# --- Stub Models ---
+class _StubTurn:
+    __slots__ = ("start", "end")
+    def __init__(self, start, end): self.start, self.end = start, end
+
+
+class _StubAnnotation:
+    def __init__(self, tracks): self._tracks = tracks
+    def itertracks(self, yield_label=False):
+        for i, (start, end, speaker) in enumerate(self._tracks):
+            yield (_StubTurn(start, end), i, speaker) if yield_label else (_StubTurn(start, end), i)
+    def labels(self): return sorted({speaker for _, _, speaker in self._tracks})
+
+
+class StubDiarizationPipeline:
+    """Stands in for the pyannote pipeline: fixed-length turns rotating over num_speakers, in next to no time."""
+
+    def __init__(self, num_speakers=2, turn_seconds=6.0):
+        self.num_speakers, self.turn_seconds = num_speakers, turn_seconds
+
+    def __call__(self, audio_input):
+        seconds = audio_input["waveform"].shape[-1] / audio_input["sample_rate"]
+        tracks, t, i = [], 0.0, 0
+        while t < seconds:
+            tracks.append((t, min(t + self.turn_seconds, seconds), f"SPEAKER_{i % self.num_speakers:02d}"))
+            t += self.turn_seconds; i += 1
+        return _StubAnnotation(tracks)
+
+
+class StubWhisperModel:
+    """Stands in for a Whisper model: deterministic English-like words every ~0.4s, grouped into ~4s segments."""
+
+    def transcribe(self, audio, word_timestamps=True, **kwargs):
+        rng = random.Random(len(audio))
+        seconds = len(audio) / SAMPLE_RATE
+        segments, t = [], 0.0
+        while t < seconds - 0.5:
+            words, seg_start = [], t
+            while t < min(seg_start + 4.0, seconds - 0.3):
+                duration = rng.uniform(0.2, 0.6)
+                words.append({"word": " " + rng.choice(WORDS), "start": t, "end": t + duration, "probability": 0.9})
+                t += duration
+            text = "".join(w["word"] for w in words)
+            segment = {"id": len(segments), "start": seg_start, "end": t, "text": text}
+            if word_timestamps: segment["words"] = words
+            segments.append(segment)
+            t += 0.1
+        return {"text": "".join(s["text"] for s in segments), "segments": segments, "language": "en"}
+
+
+def install_stub_models(audio_processor, sizes, inference_mode, num_speakers=2):
+    """Puts the stubs into the model registry under the keys the pipeline looks up, so nothing real is loaded."""
+    audio_processor.model_registry.get("diarization", lambda: StubDiarizationPipeline(num_speakers))
+    for size in sizes:
+        key = f"whisper:{size}" if inference_mode == "fp32" else f"whisper:{size}:{inference_mode}"
+        audio_processor.model_registry.get(key, StubWhisperModel)
+
+
+# --- Measurement ---
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values: return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples, audio_seconds, peak_rss_bytes):
+    values = sorted(samples)
+    summary = {"n": len(values), "mean": sum(values) / len(values), "min": values[0], "max": values[-1]}
+    for pct in PERCENTILES: summary[f"p{pct}"] = percentile(values, pct)
+    summary["rtf_p50"] = summary["p50"] / audio_seconds if audio_seconds else None
+    summary["peak_rss_mb"] = peak_rss_bytes / (1024 * 1024) if peak_rss_bytes else None
+    return summary
+
+
+def _time_stage(repeats, fn, peaks, stage):
+    import metrics
+    samples, result = [], None
+    for _ in range(repeats):
+        with metrics.track_peak_rss(peaks, stage):
+            start = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def run_clip(audio_processor, clip, size, inference_mode, repeats, store):
+    """Every stage in isolation (each fed the previous stage's output), then end to end. Returns {stage: summary}."""
+    import vad
+    import torch
+    import word_store
+    from alignment import speaker_labels, assign_segment_speakers, group_into_turns, without_words
+    from compact_dialogue import CompactDialogue
+    peaks, samples = {}, {}
+
+    samples["decode"], audio = _time_stage(repeats, lambda: audio_processor.decode_audio_16k_mono(clip["path"]), peaks, "decode")
+    if audio is None or audio.size == 0: raise RuntimeError(f"Could not decode {clip['path']}")
+    audio_seconds = len(audio) / audio_processor.SAMPLE_RATE
+    samples["vad"], _ = _time_stage(repeats, lambda: vad.trim_silence(audio, audio_processor.SAMPLE_RATE), peaks, "vad")
+
+    pipeline = audio_processor._load_diarization_pipeline()
+    model = audio_processor._load_whisper_model(size, inference_mode)
+    diarization_input = {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": audio_processor.SAMPLE_RATE}
+    samples["diarization"], (diar_segments, unique_speakers, _) = _time_stage(
+        repeats, lambda: audio_processor._run_diarization(pipeline, diarization_input), peaks, "diarization")
+    samples["transcription"], (transcription, _) = _time_stage(
+        repeats, lambda: audio_processor._run_transcription(model, audio), peaks, "transcription")
+
+    def _align():
+        speakers = assign_segment_speakers(transcription["segments"], diar_segments, speaker_labels(unique_speakers))
+        return group_into_turns(transcription["segments"], speakers, with_words=True)
+    samples["alignment"], utterances = _time_stage(repeats, _align, peaks, "alignment")
+    dialogue = without_words(utterances)
+    samples["preprocessing"], (processed_text, turn_lemmas) = _time_stage(
+        repeats, lambda: audio_processor.preprocess_dialogue(dialogue), peaks, "preprocessing")
+    samples["word_tagging"], _ = _time_stage(repeats, lambda: audio_processor.tag_utterance_words(utterances), peaks, "word_tagging")
+    # Lemma vectors are cached after the first pass, so this measures the steady state for known vocabulary
+    samples["embedding"], _ = _time_stage(
+        repeats, lambda: audio_processor.embed_dialogue(utterances, dialogue, turn_lemmas), peaks, "embedding")
+
+    writer = store.word_writer()
+    def _store():
+        job_id = store.create_job({'audio_filename': clip["name"], 'status': 'queued', 'whisper_model_size': size})
+        word_store.persist_utterances(writer, job_id, utterances)
+        store.update_job(job_id, {'raw_transcript': transcription["text"],
+                                  'dialogue_compact': CompactDialogue.from_turns(dialogue).to_text(),
+                                  'processed_text': processed_text, 'status': 'completed'})
+    samples["storage"], _ = _time_stage(repeats, _store, peaks, "storage")
+
+    def _end_to_end():
+        result = audio_processor.process_audio_and_return_dialogue(clip["path"], whisper_model_size=size, inference_mode=inference_mode)
+        if result.get("error"): raise RuntimeError(result["error"])
+    samples["end_to_end"], _ = _time_stage(repeats, _end_to_end, peaks, "end_to_end")
+
+    return audio_seconds, {stage: summarize(samples[stage], audio_seconds, peaks.get(stage)) for stage in STAGES}
+
+
+def run_size(args):
+    """Internal: one Whisper size over the whole corpus, in this process. Prints the results as JSON on the last line."""
+    import torch
+    if args.threads > 0: torch.set_num_threads(args.threads)
+    import audio_processor
+    import storage
+    import embeddings
+    clips = json.loads(args.clips_json)
+    if args.models == "stub":
+        install_stub_models(audio_processor, [args.size], args.mode)
+    else:
+        audio_processor.warm_up([args.size if args.mode == "fp32" else f"{args.size}:{args.mode}"])
+
+    tmp_dir = tempfile.mkdtemp()
+    store = storage.SQLReportStore(f"sqlite:///{os.path.join(tmp_dir, 'bench.sqlite3')}")
+    embeddings.EMBEDDINGS_PATH = os.path.join(tmp_dir, 'embeddings.sqlite3') # keep the real lemma cache untouched
+    results = []
+    for clip in clips:
+        # One untimed pass so lazy initialisation (spaCy load, allocator growth) doesn't land in the first sample
+        run_clip(audio_processor, clip, args.size, args.mode, 1, store)
+        audio_seconds, stages = run_clip(audio_processor, clip, args.size, args.mode, args.repeats, store)
+        for stage, summary in stages.items():
+            results.append(dict(summary, clip=clip["name"], size=args.size, stage=stage, audio_seconds=audio_seconds))
+    print(json.dumps(results))
+
+
+def environment_info(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {"git_commit": commit or None, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "models": args.models, "inference_mode": args.mode, "threads": args.threads,
+            "repeats": args.repeats, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+# --- Compare ---
+def compare(base_path, new_path, threshold):
+    """Prints the p50 change per (clip, size, stage); returns the number of regressions above threshold."""
+    with open(base_path, encoding="utf-8") as f: base = json.load(f)
+    with open(new_path, encoding="utf-8") as f: new = json.load(f)
+    base_rows = {(r["clip"], r["size"], r["stage"]): r for r in base["results"]}
+    print(f"base {base['environment'].get('git_commit')} ({base_path}) -> new {new['environment'].get('git_commit')} ({new_path})")
+    print(f"{'clip':32s} {'size':7s} {'stage':14s} {'base p50':>10s} {'new p50':>10s} {'change':>8s} {'peak RSS':>10s}")
+    regressions = 0
+    for r in new["results"]:
+        b = base_rows.get((r["clip"], r["size"], r["stage"]))
+        if b is None: continue
+        change = (r["p50"] - b["p50"]) / b["p50"] if b["p50"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        rss = f"{r['peak_rss_mb'] - b['peak_rss_mb']:+9.1f}M" if r["peak_rss_mb"] is not None and b["peak_rss_mb"] is not None else f"{'n/a':>10s}"
+        print(f"{r['clip']:32s} {r['size']:7s} {r['stage']:14s} {b['p50'] * 1000:9.1f}ms {r['p50'] * 1000:9.1f}ms {change:+8.1%} {rss}{flag}")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio pipeline stage by stage")
+    parser.add_argument("--sizes", default="small", help="Comma-separated Whisper sizes (default: small)")
+    parser.add_argument("--mode", default="fp32", choices=["fp32", "int8"], help="Whisper inference mode")
+    parser.add_argument("--models", default="real", choices=["real", "stub"], help="'stub' needs no model weights")
+    parser.add_argument("--corpus", default=None, help="Directory of real recordings (default: generated synthetic corpus)")
+    parser.add_argument("--lengths", default="30,120,600", help="Synthetic clip lengths in seconds")
+    parser.add_argument("--speakers", default="1,2,4", help="Synthetic speaker counts")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--out", default=None, help="Write the JSON results here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown counted as a regression in --compare")
+    parser.add_argument("--size", help=argparse.SUPPRESS) # internal: run one size
+    parser.add_argument("--clips-json", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+    if args.size:
+        run_size(args)
+        return
+
+    if args.corpus:
+        clips = load_corpus(args.corpus)
+    else:
+        clips = build_corpus(DEFAULT_CORPUS_DIR, [float(s) for s in args.lengths.split(",")], [int(s) for s in args.speakers.split(",")])
+    if not clips: raise SystemExit("Corpus is empty.")
+    print(f"Corpus: {len(clips)} clips; models: {args.models}; sizes: {args.sizes}; {args.repeats} runs per stage")
+
+    results = []
+    for size in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+        proc = subprocess.run([sys.executable, __file__, "--size", size, "--mode", args.mode, "--models", args.models,
+                               "--repeats", str(args.repeats), "--threads", str(args.threads), "--clips-json", json.dumps(clips)],
+                              cwd=BACKEND_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{size}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''}")
+            continue
+        size_results = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.extend(size_results)
+        for r in size_results:
+            rtf = f"RTF {r['rtf_p50']:7.4f}" if r["rtf_p50"] is not None else ""
+            rss = f"{r['peak_rss_mb']:7.1f} MB" if r["peak_rss_mb"] is not None else "    n/a"
+            print(f"{size:7s} {r['clip']:32s} {r['stage']:14s} p50 {r['p50'] * 1000:9.1f}ms  p90 {r['p90'] * 1000:9.1f}ms  "
+                  f"{rtf}  peak RSS {rss}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({"environment": environment_info(args), "corpus": [{k: c[k] for k in ("name", "seconds", "speakers", "sha256")} for c in clips],
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# ai-report-generator/backend/compact_dialogue.py
+#
+# Columnar form of a dialogue ([{"speaker", "text", "start", "end"}, ...]): speaker labels are
+# stored once and referenced by small ints, start/end times are float32 arrays and all turn
+# texts share one UTF-8 buffer indexed by offsets. The binary serialization (zlib-compressed)
+# is stored as dialogue_compact (new jobs no longer write dialogue_json; stored_turns() decodes
+# either), and lets the API answer time-range queries (?from=&to=) by bisecting the start times
+# instead of parsing and shipping every turn.
+# Only the standard library is used, so the web process can decode it without the ML stack.
+
+import sys
+import zlib
+import base64
+import struct
+from array import array
+from bisect import bisect_left
+
+# --- Configuration ---
+FORMAT_MAGIC = b"CDLG"
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+_HEADER = struct.Struct("<4sBII") # magic, version, turns, bytes of speaker labels
+
+
+def _le_bytes(values):
+    """Array contents in little-endian order, whatever the host byte order."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big": values.byteswap()
+    return values
+
+
+class CompactDialogue:
+    """
+    Dialogue turns in columns. Turns are kept in start-time order; a turn without timings gets
+    the previous turn's end (0 for the first), so every turn has a position on the timeline.
+    """
+
+    __slots__ = ("speakers", "speaker_ids", "starts", "ends", "offsets", "text")
+
+    def __init__(self, speakers, speaker_ids, starts, ends, offsets, text):
+        self.speakers = speakers       # [label, ...]; speaker_ids index into this
+        self.speaker_ids = speaker_ids # array('H')
+        self.starts = starts           # array('f') seconds
+        self.ends = ends               # array('f') seconds
+        self.offsets = offsets         # array('I'), len(turns) + 1 byte offsets into text
+        self.text = text               # bytes, UTF-8
+
+    @classmethod
+    def from_turns(cls, turns):
+        speakers, speaker_index = [], {}
+        speaker_ids, starts, ends, offsets = array("H"), array("f"), array("f"), array("I", [0])
+        buffer = bytearray()
+        previous_end = 0.0
+        for turn in sorted(turns, key=lambda t: t.get("start") if t.get("start") is not None else float("-inf")):
+            speaker = turn.get("speaker") or "Unknown"
+            if speaker not in speaker_index:
+                speaker_index[speaker] = len(speakers)
+                speakers.append(speaker)
+            start = turn.get("start") if turn.get("start") is not None else previous_end
+            end = turn.get("end") if turn.get("end") is not None else start
+            speaker_ids.append(speaker_index[speaker])
+            starts.append(start)
+            ends.append(end)
+            buffer += (turn.get("text") or "").encode("utf-8")
+            offsets.append(len(buffer))
+            previous_end = end
+        return cls(speakers, speaker_ids, starts, ends, offsets, bytes(buffer))
+
+    def __len__(self):
+        return len(self.speaker_ids)
+
+    def turn(self, i):
+        return {"speaker": self.speakers[self.speaker_ids[i]],
+                "text": self.text[self.offsets[i]:self.offsets[i + 1]].decode("utf-8"),
+                "start": round(self.starts[i], 3), "end": round(self.ends[i], 3)}
+
+    def to_turns(self, lo=0, hi=None):
+        return [self.turn(i) for i in range(lo, len(self) if hi is None else hi)]
+
+    def index_range(self, from_seconds=None, to_seconds=None):
+        """
+        (lo, hi) turn indices of the turns starting in [from_seconds, to_seconds). A turn belongs to
+        the page its start falls in (one that straddles the boundary is not repeated on the next
+        page), so consecutive pages [a, b), [b, c), ... return every turn exactly once.
+        """
+        lo = 0 if from_seconds is None else bisect_left(self.starts, from_seconds)
+        hi = len(self) if to_seconds is None else bisect_left(self.starts, to_seconds)
+        return lo, max(lo, hi)
+
+    def duration(self):
+        return max(self.ends, default=0.0)
+
+    # --- Serialization ---
+    def to_bytes(self):
+        labels = "\n".join(self.speakers).encode("utf-8")
+        raw = b"".join((_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, len(self), len(labels)), labels,
+                        _le_bytes(self.speaker_ids), _le_bytes(self.starts), _le_bytes(self.ends),
+                        _le_bytes(self.offsets), self.text))
+        return zlib.compress(raw, COMPRESSION_LEVEL)
+
+    @classmethod
+    def from_bytes(cls, data):
+        raw = zlib.decompress(data)
+        magic, version, count, labels_length = _HEADER.unpack_from(raw)
+        if magic != FORMAT_MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a compact dialogue (magic {magic!r}, version {version})")
+        pos = _HEADER.size
+        speakers = raw[pos:pos + labels_length].decode("utf-8").split("\n") if labels_length else []
+        pos += labels_length
+        columns = []
+        for typecode, length in (("H", count), ("f", count), ("f", count), ("I", count + 1)):
+            nbytes = length * array(typecode).itemsize
+            columns.append(_from_le_bytes(typecode, raw[pos:pos + nbytes]))
+            pos += nbytes
+        return cls(speakers, *columns, raw[pos:])
+
+    # Text form for the dialogue_compact column (a text column in every backend, Supabase included)
+    def to_text(self):
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_text(cls, text):
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def stored_turns(record):
+    """A transcripts_log row's dialogue turns: decoded from dialogue_compact, or dialogue_json for rows written before it."""
+    if record.get("dialogue_compact"):
+        return CompactDialogue.from_text(record["dialogue_compact"]).to_turns()
+    return record.get("dialogue_json") or []
@@ -0,0 +1,318 @@
+# ai-report-generator/backend/embeddings.py
+#
+# 128-d embeddings for words (words.embedding in database/schema.sql) and dialogue turns, plus
+# a nearest-neighbour index over the turns for "find similar utterances" (similar wording: the
+# vectors are orthographic, so synonyms and paraphrases are not matched).
+#
+# A term's embedding is the sum of its hashed character n-grams (fastText-style subwords)
+# projected to EMBEDDING_DIM by a fixed random projection matrix, L2-normalized. It needs no
+# model, so the web process can embed a query the same way the workers embed transcripts,
+# and related forms ("invoice" / "invoicing") land close together. A whole job is embedded in
+# one vectorized NumPy pass over its unique lemmas; recently used lemma vectors are kept in a
+# bounded in-process LRU (computing one is a few microseconds, cheaper than any disk lookup).
+#
+# Turn vectors (mean of the turn's lemma vectors) are stored with random-hyperplane LSH codes
+# in SIMILARITY_LSH_TABLES indexed columns. A query only reads the rows sharing a bucket with
+# it (or a bucket one bit away) and ranks those exactly by cosine similarity.
+
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from search_index import tokenize
+
+# --- Configuration ---
+EMBEDDINGS_ENABLED = os.getenv("EMBEDDINGS_ENABLED", "1").lower() in ("1", "true", "yes")
+EMBEDDING_DIM = 128 # vector(128) in database/schema.sql
+# Changing any of these changes every vector; bump EMBEDDING_VERSION so a fresh index is built
+EMBEDDING_VERSION = 1
+EMBEDDING_HASH_BUCKETS = 2 ** 15 # rows of the projection matrix (16 MB as float32)
+EMBEDDING_NGRAM_SIZES = (3, 4, 5)
+EMBEDDING_SEED = 1234
+SIMILARITY_LSH_TABLES = 4
+SIMILARITY_LSH_BITS = 12
+EMBEDDINGS_PATH = os.getenv("EMBEDDINGS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', f'embeddings-v{EMBEDDING_VERSION}.sqlite3'))
+LEMMA_MEMORY_CACHE_SIZE = int(os.getenv("LEMMA_MEMORY_CACHE_SIZE", "100000"))
+# Upper bound on rows scored per similarity query
+SIMILARITY_MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "20000"))
+# Below this many indexed turns every row is scored (exact and still cheap)
+SIMILARITY_EXACT_MAX_ROWS = int(os.getenv("SIMILARITY_EXACT_MAX_ROWS", "5000"))
+
+_HASH_COLUMNS = [f"h{t}" for t in range(SIMILARITY_LSH_TABLES)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turn_vectors (
+    id integer PRIMARY KEY,
+    job_id text NOT NULL,
+    turn_index integer NOT NULL,
+    speaker text,
+    start_time real,
+    end_time real,
+    text text,
+    vector blob NOT NULL,
+    """ + ",\n    ".join(f"{c} integer NOT NULL" for c in _HASH_COLUMNS) + """
+);
+CREATE INDEX IF NOT EXISTS turn_vectors_job_id_idx ON turn_vectors (job_id, turn_index);
+CREATE TABLE IF NOT EXISTS stats (
+    name text PRIMARY KEY,
+    value integer NOT NULL
+);
+""" + "".join(f"CREATE INDEX IF NOT EXISTS turn_vectors_{c}_idx ON turn_vectors ({c});\n" for c in _HASH_COLUMNS)
+
+_init_lock = threading.Lock()
+_initialized = False
+_projection = None
+_planes = None
+_memory_cache = OrderedDict() # lemma -> float32 vector, least recently used first
+_memory_lock = threading.Lock()
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(EMBEDDINGS_PATH), exist_ok=True)
+    conn = sqlite3.connect(EMBEDDINGS_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL") # web process queries while workers index
+                conn.executescript(_SCHEMA)
+                # Row counts are kept in stats so queries never count the table; seeded once for older files
+                if conn.execute("SELECT COUNT(*) FROM stats").fetchone()[0] == 0:
+                    conn.execute("INSERT INTO stats (name, value) SELECT 'turns', COUNT(*) FROM turn_vectors")
+                    conn.execute("INSERT INTO stats (name, value) SELECT 'jobs', COUNT(DISTINCT job_id) FROM turn_vectors")
+                conn.commit()
+                _initialized = True
+    return conn
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn: # commits on success, rolls back on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def _projection_matrix():
+    """EMBEDDING_HASH_BUCKETS x EMBEDDING_DIM, identical in every process (fixed seed)."""
+    global _projection
+    if _projection is None:
+        rng = np.random.default_rng(EMBEDDING_SEED)
+        _projection = (rng.standard_normal((EMBEDDING_HASH_BUCKETS, EMBEDDING_DIM), dtype=np.float32)
+                       / np.float32(np.sqrt(EMBEDDING_DIM)))
+    return _projection
+
+def _lsh_planes():
+    global _planes
+    if _planes is None:
+        rng = np.random.default_rng(EMBEDDING_SEED + 1)
+        _planes = rng.standard_normal((SIMILARITY_LSH_TABLES * SIMILARITY_LSH_BITS, EMBEDDING_DIM), dtype=np.float32)
+    return _planes
+
+
+# --- Embedding ---
+def _term_buckets(term):
+    """Projection rows for a term: the whole word plus its character n-grams, with word boundaries marked."""
+    marked = f"<{term}>"
+    grams = [marked]
+    for n in EMBEDDING_NGRAM_SIZES:
+        grams.extend(marked[i:i + n] for i in range(len(marked) - n + 1))
+    # crc32 rather than hash(): string hashing is randomized per process
+    return [zlib.crc32(g.encode("utf-8")) % EMBEDDING_HASH_BUCKETS for g in grams]
+
+
+def compute_term_vectors(terms):
+    """L2-normalized vectors for a list of terms as one (len(terms), EMBEDDING_DIM) float32 array."""
+    if not terms: return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    buckets, offsets = [], []
+    for term in terms:
+        offsets.append(len(buckets))
+        buckets.extend(_term_buckets(term))
+    # One gather and one segmented sum for the whole batch
+    vectors = np.add.reduceat(_projection_matrix()[np.asarray(buckets)], np.asarray(offsets), axis=0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def lemma_vectors(lemmas):
+    """{lemma: vector} for the unique lemmas, from the memory cache (LEMMA_MEMORY_CACHE_SIZE entries) or computed."""
+    unique = list(dict.fromkeys(l for l in lemmas if l))
+    found, missing = {}, []
+    with _memory_lock:
+        for lemma in unique:
+            vector = _memory_cache.get(lemma)
+            if vector is None:
+                missing.append(lemma)
+            else:
+                _memory_cache.move_to_end(lemma)
+                found[lemma] = vector
+    if not missing: return found
+
+    computed = dict(zip(missing, compute_term_vectors(missing)))
+    with _memory_lock:
+        for lemma, vector in computed.items():
+            _memory_cache[lemma] = vector
+        while len(_memory_cache) > LEMMA_MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    found.update(computed)
+    return found
+
+
+def vector_literal(vector):
+    """pgvector text form ('[0.1,-0.2,...]'), accepted by Postgres, the Supabase API and the SQLite stand-in."""
+    return "[" + ",".join(f"{x:.5g}" for x in vector.tolist()) + "]"
+
+
+def _mean_vectors(term_lists, vectors):
+    """One normalized mean vector per term list (zeros for empty lists)."""
+    out = np.zeros((len(term_lists), EMBEDDING_DIM), dtype=np.float32)
+    for i, terms in enumerate(term_lists):
+        rows = [vectors[t] for t in terms if t in vectors]
+        if rows: out[i] = np.mean(rows, axis=0)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norms, 1e-12)
+
+
+def _word_key(word):
+    return word.get("lemma") or word.get("word", "").strip(".,!?;:\"'()").lower()
+
+
+def embed_job(utterances, dialogue, turn_lemmas=None):
+    """
+    Embeds one job's vocabulary in a single batch. Sets word["embedding"] (pgvector text) on every
+    word of the utterances, in place, and returns the dialogue turns' vectors as a
+    (len(dialogue), EMBEDDING_DIM) array. Turns use their preprocessing lemmas when given.
+    """
+    turn_terms = [turn_lemmas[i] if turn_lemmas and i < len(turn_lemmas) and turn_lemmas[i] else tokenize(turn.get("text"))
+                  for i, turn in enumerate(dialogue)]
+    word_keys = [_word_key(w) for utt in utterances for w in utt.get("words", [])]
+    vectors = lemma_vectors([t for terms in turn_terms for t in terms] + word_keys)
+    literals = {lemma: vector_literal(vectors[lemma]) for lemma in set(word_keys) if lemma in vectors}
+    for utt in utterances:
+        for word in utt.get("words", []):
+            word["embedding"] = literals.get(_word_key(word))
+    return _mean_vectors(turn_terms, vectors)
+
+
+def embed_text(text):
+    """Query vector for free text (same space as the indexed turns)."""
+    terms = tokenize(text)
+    return _mean_vectors([terms], lemma_vectors(terms))[0]
+
+
+# --- Nearest-Neighbour Index ---
+def _lsh_codes(vectors):
+    """(n, SIMILARITY_LSH_TABLES) bucket codes: the sign pattern of each table's hyperplanes as an integer."""
+    bits = (vectors @ _lsh_planes().T > 0).reshape(len(vectors), SIMILARITY_LSH_TABLES, SIMILARITY_LSH_BITS)
+    return (bits.astype(np.int64) << np.arange(SIMILARITY_LSH_BITS, dtype=np.int64)).sum(axis=2)
+
+
+def _bump(conn, turns=0, jobs=0):
+    conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?", [(turns, "turns"), (jobs, "jobs")])
+
+
+def _remove_job(conn, job_id):
+    removed = conn.execute("DELETE FROM turn_vectors WHERE job_id = ?", (job_id,)).rowcount
+    if removed > 0: _bump(conn, turns=-removed, jobs=-1)
+
+
+def index_job(job_id, dialogue, turn_vectors=None):
+    """Adds (or replaces) a job's dialogue turns in the similarity index. Vectors are computed from the text if not given."""
+    if not EMBEDDINGS_ENABLED or not job_id or not dialogue: return
+    start_time = time.time()
+    try:
+        if turn_vectors is None or len(turn_vectors) != len(dialogue):
+            turn_vectors = embed_job([], dialogue)
+        turn_vectors = np.asarray(turn_vectors, dtype=np.float32)
+        keep = np.flatnonzero(np.linalg.norm(turn_vectors, axis=1) > 0) # turns without any content word
+        codes = _lsh_codes(turn_vectors[keep])
+        rows = []
+        for i, code in zip(keep.tolist(), codes.tolist()):
+            turn = dialogue[i]
+            rows.append((job_id, i, turn.get("speaker"), turn.get("start"), turn.get("end"), turn.get("text"),
+                         turn_vectors[i].tobytes(), *code))
+        with _db() as conn:
+            _remove_job(conn, job_id)
+            conn.executemany(f"INSERT INTO turn_vectors (job_id, turn_index, speaker, start_time, end_time, text, vector, {', '.join(_HASH_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * (7 + len(_HASH_COLUMNS)))})", rows)
+            _bump(conn, turns=len(rows), jobs=1 if rows else 0)
+        print(f"Similarity index: indexed job {job_id} ({len(rows)} turns) in {time.time() - start_time:.2f}s")
+    except Exception as e:
+        print(f"Warning: similarity indexing failed for job {job_id}: {e}")
+
+
+def remove_job(job_id):
+    with _db() as conn:
+        _remove_job(conn, job_id)
+
+
+def turn_vector(job_id, turn_index):
+    """The stored vector of one indexed turn, or None."""
+    with _db() as conn:
+        row = conn.execute("SELECT vector FROM turn_vectors WHERE job_id = ? AND turn_index = ?", (job_id, turn_index)).fetchone()
+    return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+
+def _probe_codes(code):
+    """The bucket itself and every bucket one bit away (multi-probe LSH)."""
+    return [code] + [code ^ (1 << b) for b in range(SIMILARITY_LSH_BITS)]
+
+
+def similar(query_vector, limit=10, job_id=None, exclude=None):
+    """
+    Turns most similar to query_vector by cosine similarity. exclude is a (job_id, turn_index) to leave
+    out (the query turn itself). Returns {"candidates", "took_ms", "hits": [{"job_id", "turn_index",
+    "speaker", "start", "end", "score", "text"}]}.
+    """
+    start_time = time.perf_counter()
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    result = {"candidates": 0, "hits": []}
+    if not np.any(query_vector):
+        result["took_ms"] = 0.0
+        return result
+    # Text and metadata are only read for the returned hits
+    columns = "id, job_id, turn_index, vector"
+    with _db() as conn:
+        total = conn.execute("SELECT value FROM stats WHERE name = 'turns'").fetchone()[0]
+        if job_id:
+            rows = conn.execute(f"SELECT {columns} FROM turn_vectors WHERE job_id = ?", (job_id,)).fetchall()
+        elif total <= SIMILARITY_EXACT_MAX_ROWS:
+            rows = conn.execute(f"SELECT {columns} FROM turn_vectors").fetchall()
+        else:
+            codes = _lsh_codes(query_vector[None, :])[0].tolist()
+            where, params = [], []
+            for column, code in zip(_HASH_COLUMNS, codes):
+                probes = _probe_codes(code)
+                where.append(f"{column} IN ({','.join('?' * len(probes))})")
+                params.extend(probes)
+            rows = conn.execute(f"SELECT {columns} FROM turn_vectors WHERE {' OR '.join(where)} LIMIT ?",
+                                params + [SIMILARITY_MAX_CANDIDATES]).fetchall()
+        if exclude is not None:
+            rows = [r for r in rows if (r[1], r[2]) != tuple(exclude)]
+        result["candidates"] = len(rows)
+        if rows:
+            matrix = np.frombuffer(b"".join(r[3] for r in rows), dtype=np.float32).reshape(len(rows), EMBEDDING_DIM)
+            scores = matrix @ query_vector
+            top = np.argpartition(-scores, min(limit, len(rows)) - 1)[:limit]
+            for i in top[np.argsort(-scores[top])].tolist():
+                r = conn.execute("SELECT job_id, turn_index, speaker, start_time, end_time, text FROM turn_vectors WHERE id = ?", (rows[i][0],)).fetchone()
+                result["hits"].append({"job_id": r[0], "turn_index": r[1], "speaker": r[2], "start": r[3], "end": r[4],
+                                       "score": round(float(scores[i]), 4), "text": r[5]})
+    result["took_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+    return result
+
+
+def stats():
+    with _db() as conn:
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    with _memory_lock:
+        lemmas = len(_memory_cache)
+    return {"jobs": counters.get("jobs", 0), "turns": counters.get("turns", 0), "cached_lemmas": lemmas}
@@ -0,0 +1,139 @@
+# ai-report-generator/backend/job_events.py
+#
+# In-process event bus for job progress. Worker processes put events on a multiprocessing
+# queue; a dispatcher thread in the web process moves them onto per-job histories that
+# the /api/stream/<job_id> Server-Sent Events endpoint replays and follows.
+
+import os
+import json
+import time
+import threading
+import metrics
+
+# How long a finished job's events stay available for late subscribers / reconnects
+JOB_EVENTS_RETENTION_SECONDS = int(os.getenv("JOB_EVENTS_RETENTION_SECONDS", "600"))
+# Seconds between SSE keep-alive comments while a job is quiet
+SSE_HEARTBEAT_SECONDS = 15
+
+EVENT_STATUS = "status" # {"status": "diarizing"}
+EVENT_TURNS = "turns"   # {"turns": [{"speaker": "A", "text": "..."}]}
+EVENT_DONE = "done"     # {"status": "completed" | "failed", "error": ...}
+# Workers attach {"metrics": {...}} to 'done' (see metrics.observe_job); the dispatcher strips it before publishing
+# Not tied to a job (job_id None): a worker process finished loading its models
+EVENT_WORKER_READY = "worker_ready" # {"pid": 1234, "models": ["diarization", ...], "seconds": 12.3}
+
+
+class _JobHistory:
+    __slots__ = ("events", "finished_at")
+
+    def __init__(self):
+        self.events = [] # list of (event_name, data)
+        self.finished_at = None
+
+
+class JobEventBus:
+    def __init__(self):
+        self._jobs = {}
+        self._cond = threading.Condition()
+
+    def publish(self, job_id, event, data):
+        with self._cond:
+            history = self._jobs.setdefault(job_id, _JobHistory())
+            history.events.append((event, data))
+            if event == EVENT_DONE:
+                history.finished_at = time.time()
+            self._prune()
+            self._cond.notify_all()
+
+    def knows(self, job_id):
+        with self._cond:
+            return job_id in self._jobs
+
+    def _prune(self):
+        # Caller holds self._cond
+        cutoff = time.time() - JOB_EVENTS_RETENTION_SECONDS
+        for job_id in [j for j, h in self._jobs.items() if h.finished_at and h.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def follow(self, job_id, start_index=0, heartbeat=SSE_HEARTBEAT_SECONDS):
+        """
+        Yields (index, event, data) from start_index onwards, blocking for new events until the job's
+        'done' event. Yields None as a heartbeat when nothing happens for `heartbeat` seconds.
+        """
+        index = start_index
+        while True:
+            with self._cond:
+                history = self._jobs.get(job_id)
+                if history is None: return
+                if index >= len(history.events):
+                    self._cond.wait(timeout=heartbeat)
+                    history = self._jobs.get(job_id)
+                    if history is None: return
+                pending = history.events[index:]
+            if not pending:
+                yield None
+                continue
+            for event, data in pending:
+                yield index, event, data
+                index += 1
+                if event == EVENT_DONE: return
+
+
+def format_sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None: lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+bus = JobEventBus()
+
+
+# --- Worker -> Web Process Bridge ---
+_dispatcher_thread = None
+
+class WorkerStatus:
+    """Workers that have reported their models loaded, by pid (read by /readyz)."""
+
+    def __init__(self):
+        self._ready = {}
+        self._lock = threading.Lock()
+
+    def mark_ready(self, info):
+        with self._lock:
+            self._ready[info["pid"]] = dict(info, ready_at=time.time())
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._ready.values())
+
+
+workers = WorkerStatus()
+
+
+def start_dispatcher(event_queue):
+    """Moves (job_id, event, data) tuples from the workers' queue onto the bus. Runs as a daemon thread."""
+    global _dispatcher_thread
+    if _dispatcher_thread is not None: return
+
+    def _dispatch():
+        while True:
+            try:
+                job_id, event, data = event_queue.get()
+                if event == EVENT_WORKER_READY:
+                    workers.mark_ready(data)
+                    print(f"Job worker {data.get('pid')} ready ({data.get('seconds', 0):.1f}s, models: {data.get('models')})")
+                    continue
+                if event == EVENT_DONE and "metrics" in data:
+                    data = dict(data)
+                    metrics.observe_job(data.pop("metrics"))
+                bus.publish(job_id, event, data)
+            except (EOFError, OSError):
+                print("Job event dispatcher: queue closed, stopping.")
+                return
+            except Exception as e:
+                print(f"Job event dispatcher: dropped malformed event: {e}")
+
+    _dispatcher_thread = threading.Thread(target=_dispatch, name="job-event-dispatcher", daemon=True)
+    _dispatcher_thread.start()
@@ -0,0 +1,292 @@
+# ai-report-generator/backend/job_queue.py
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import job_events
+import result_cache
+import word_store
+import storage
+import metrics
+import audio_io
+import search_index
+import embeddings
+from compact_dialogue import CompactDialogue
+
+# --- Configuration ---
+# Number of worker processes. Each worker keeps its own copy of the models in memory,
+# so this is bounded by RAM as much as by cores.
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "2")))
+# Whisper sizes every worker loads at startup (comma separated, e.g. "small,medium,small:int8").
+# Other sizes are loaded on demand and kept in each worker's model registry (MODEL_CACHE_MAX_MB).
+PRELOAD_WHISPER_SIZES = [s.strip() for s in os.getenv("PRELOAD_WHISPER_SIZES", "small").split(",") if s.strip()]
+
+# Start the workers (and load their models) when the server starts rather than on the first upload
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1").lower() in ("1", "true", "yes")
+
+# Job states written to transcripts_log.status, in the order a job moves through them.
+STATUS_QUEUED = "queued"
+STATUS_CONVERTING = "converting"
+STATUS_DIARIZING = "diarizing"
+STATUS_TRANSCRIBING = "transcribing"
+STATUS_PREPROCESSING = "preprocessing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+_executor = None
+
+
+# --- Worker Process Side ---
+_worker_store = None
+_worker_event_queue = None
+_worker_word_writer = None
+
+def _worker_init(preload_sizes, event_queue):
+    """Runs once in every worker process: connects to the database and loads the models."""
+    global _worker_store, _worker_event_queue, _worker_word_writer
+    _worker_event_queue = event_queue
+    from dotenv import load_dotenv
+    dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    if os.path.exists(dotenv_path): load_dotenv(dotenv_path=dotenv_path)
+
+    # Workers only write, so they use the store directly (no read cache)
+    _worker_store = storage.create_store()
+    # WORDS_DB_URL sends word-level rows somewhere other than the job store
+    _worker_word_writer = word_store.open_writer() if word_store.WORDS_DB_URL else _worker_store.word_writer()
+
+    start_time = time.time()
+    import audio_processor
+    print(f"Worker {os.getpid()}: preloading models...")
+    audio_processor.warm_up(preload_sizes)
+    # Lets /readyz in the web process report this worker as ready
+    _publish(None, job_events.EVENT_WORKER_READY, {'pid': os.getpid(), 'models': audio_processor.model_registry.loaded_keys(),
+                                                   'seconds': time.time() - start_time})
+
+def _ping():
+    return os.getpid()
+
+def _publish(job_id, event, data):
+    try: _worker_event_queue.put((job_id, event, data))
+    except Exception as e: print(f"Worker {os.getpid()}: failed to publish '{event}' for job {job_id}: {e}")
+
+def _set_stage(job_id, stage):
+    _update_job(job_id, {'status': stage})
+    _publish(job_id, job_events.EVENT_STATUS, {'status': stage})
+
+def _finish(job_id, fields, job_metrics=None):
+    if job_metrics is not None:
+        job_metrics = dict(job_metrics, status=fields['status'])
+        fields = dict(fields, timings_json=job_metrics)
+    _update_job(job_id, fields)
+    _publish(job_id, job_events.EVENT_STATUS, {'status': fields['status']})
+    done = {'status': fields['status'], 'error': fields.get('error_message')}
+    if job_metrics is not None: done['metrics'] = job_metrics # folded into /metrics by the web process
+    _publish(job_id, job_events.EVENT_DONE, done)
+
+def _update_job(job_id, fields):
+    try:
+        _worker_store.update_job(job_id, fields)
+    except Exception as e:
+        print(f"Worker {os.getpid()}: failed to update job {job_id} with {list(fields)}: {e}")
+
+def _outcome(job_id, status, error=None, timings=None):
+    return {"job_id": job_id, "status": status, "error": error, "timings": timings or {}}
+
+def _job_metrics(result_data):
+    """The per-stage numbers of a pipeline run, as stored in timings_json and sent with 'done'."""
+    if not result_data: return None
+    return {"audio_seconds": result_data.get("audio_seconds"), "timings": result_data.get("timings") or {},
+            "peak_rss_bytes": result_data.get("peak_rss_bytes") or {}}
+
+def _run_job(job_id, audio_path, whisper_model_size, audio_hash=None, inference_mode=None, delete_audio=True,
+             decoded_audio=None, transcription=None, extra_timings=None, pcm_path=None):
+    """
+    Executed inside a worker process. Runs the ML pipeline and records every state change.
+    Returns {"job_id", "status", "error", "timings"}. delete_audio=False leaves audio_path in place
+    (batch runs over the caller's own files). extra_timings overrides stage timings measured by the
+    caller (e.g. this job's share of a batched transcription). pcm_path is the upload already decoded
+    to 16kHz s16le PCM while it was received (see uploads.py); it is used instead of decoding again
+    unless the recording is long enough for windowed processing, and deleted afterwards.
+    """
+    from audio_processor import process_audio_and_return_dialogue, STREAMING_MIN_SECONDS
+    print(f"Worker {os.getpid()}: starting job {job_id}")
+    try:
+        if pcm_path and decoded_audio is None and os.path.exists(pcm_path):
+            pcm_seconds = os.path.getsize(pcm_path) / (2 * audio_io.SAMPLE_RATE)
+            if pcm_seconds < STREAMING_MIN_SECONDS:
+                decoded_audio = audio_io.load_pcm16(pcm_path)
+                print(f"Worker {os.getpid()}: using audio decoded during upload ({pcm_seconds:.1f}s)")
+        result_data = process_audio_and_return_dialogue(
+            audio_path,
+            whisper_model_size=whisper_model_size,
+            inference_mode=inference_mode,
+            decoded_audio=decoded_audio,
+            transcription=transcription,
+            progress_callback=lambda stage: _set_stage(job_id, stage),
+            # Finalized turns go straight to the report page via the event stream
+            partial_callback=lambda turns: _publish(job_id, job_events.EVENT_TURNS, {'turns': turns})
+        )
+        if result_data is not None and extra_timings:
+            result_data["timings"].update(extra_timings)
+        job_metrics = _job_metrics(result_data)
+        if result_data is None or result_data.get("error"):
+            error_msg = result_data.get("error") if result_data else "Unknown ML Error"
+            print(f"Worker {os.getpid()}: job {job_id} failed: {error_msg}")
+            _finish(job_id, {'status': STATUS_FAILED, 'error_message': error_msg}, job_metrics)
+            return _outcome(job_id, STATUS_FAILED, error_msg, result_data.get("timings") if result_data else None)
+
+        # db_insert covers the word-level rows; the final job row update below is a single write
+        start_time_insert = time.time()
+        with metrics.track_peak_rss(job_metrics["peak_rss_bytes"], "db_insert"):
+            if _worker_word_writer is not None and result_data.get("utterances"):
+                try: word_store.persist_utterances(_worker_word_writer, job_id, result_data["utterances"])
+                except Exception as e: print(f"Worker {os.getpid()}: failed to store words for job {job_id}: {e}")
+        job_metrics["timings"]["db_insert"] = time.time() - start_time_insert
+        result_cache.store(audio_hash, result_cache.model_variant(whisper_model_size, result_data.get("inference_mode")),
+                           result_data.get("full_transcript", ""),
+                           result_data.get("dialogue", []), result_data.get("processed_text", ""))
+        _finish(job_id, {
+            'raw_transcript': result_data.get("full_transcript", ""),
+            'dialogue_compact': CompactDialogue.from_turns(result_data.get("dialogue", [])).to_text(),
+            'processed_text': result_data.get("processed_text", ""),
+            'inference_mode': result_data.get("inference_mode"), # what actually ran (int8 falls back to fp32 on GPU)
+            'status': STATUS_COMPLETED,
+        }, job_metrics)
+        # Searchable once completed (a failed index update doesn't fail the job)
+        search_index.index_job(job_id, result_data.get("dialogue", []), result_data.get("turn_lemmas"))
+        embeddings.index_job(job_id, result_data.get("dialogue", []), result_data.get("turn_embeddings"))
+        print(f"Worker {os.getpid()}: job {job_id} completed")
+        return _outcome(job_id, STATUS_COMPLETED, timings=result_data.get("timings"))
+    except Exception as e:
+        print(f"Worker {os.getpid()}: unexpected error in job {job_id}: {e}")
+        _finish(job_id, {'status': STATUS_FAILED, 'error_message': str(e)})
+        return _outcome(job_id, STATUS_FAILED, str(e))
+    finally:
+        for path in (audio_path, pcm_path):
+            if delete_audio and path and os.path.exists(path):
+                try: os.remove(path); print(f"Removed temporary audio file: {path}")
+                except Exception as e_del: print(f"Warning: Failed to delete temp audio {path}: {e_del}")
+
+
+def _run_short_batch(jobs, whisper_model_size, inference_mode=None, delete_audio=True):
+    """
+    Executed inside a worker process for several short clips (jobs = [(job_id, audio_path, audio_hash), ...]).
+    All clips go through Whisper in one batched decode; diarization and the rest of the pipeline
+    then run per clip. A clip that fails to decode or transcribe only fails its own job.
+    """
+    import audio_processor
+    outcomes, decoded = [], []
+    for job_id, audio_path, audio_hash in jobs:
+        _set_stage(job_id, STATUS_CONVERTING)
+        audio = audio_processor.decode_audio_16k_mono(audio_path)
+        if audio is None or audio.size == 0 or len(audio) / audio_processor.SAMPLE_RATE > audio_processor.BATCH_CLIP_MAX_SECONDS:
+            # Undecodable, or longer than probed: the normal single-file path reports/handles it
+            outcomes.append(_run_job(job_id, audio_path, whisper_model_size, audio_hash, inference_mode, delete_audio))
+        else:
+            decoded.append((job_id, audio_path, audio_hash, audio))
+
+    transcriptions = [None] * len(decoded)
+    if decoded:
+        try:
+            mode = audio_processor.resolve_inference_mode(inference_mode)
+            model = audio_processor._load_whisper_model(whisper_model_size, mode)
+            for job_id, *_ in decoded: _set_stage(job_id, STATUS_TRANSCRIBING)
+            start_time = time.time()
+            transcriptions = audio_processor.transcribe_batch(model, [audio for *_, audio in decoded])
+            batch_seconds = time.time() - start_time
+        except Exception as e:
+            # Fall back to transcribing each clip on its own
+            print(f"Worker {os.getpid()}: batched transcription of {len(decoded)} clips failed, running them one by one: {e}")
+            batch_seconds = 0.0
+
+    for (job_id, audio_path, audio_hash, audio), transcription in zip(decoded, transcriptions):
+        # Each clip's share of the batched decode
+        share = {"transcription": batch_seconds / len(decoded)} if transcription is not None else None
+        outcome = _run_job(job_id, audio_path, whisper_model_size, audio_hash, inference_mode, delete_audio,
+                           decoded_audio=audio, transcription=transcription, extra_timings=share)
+        if transcription is not None: outcome["batched"] = True
+        outcomes.append(outcome)
+    return outcomes
+
+
+# --- Web Process Side ---
+def create_cached_job(store, fields, cached):
+    """
+    Stores a completed job straight from a result-cache hit (cached is result_cache.lookup()'s
+    {"raw_transcript", "dialogue_json", "processed_text"}), in the same form a worker writes a
+    finished job, and adds it to the search and similarity indexes. fields holds the rest of the row
+    (audio_filename, audio_hash, ...). Returns the job id.
+    """
+    job_id = store.create_job(dict(fields,
+                                   raw_transcript=cached['raw_transcript'],
+                                   dialogue_compact=CompactDialogue.from_turns(cached['dialogue_json']).to_text(),
+                                   processed_text=cached['processed_text'],
+                                   status=STATUS_COMPLETED))
+    search_index.index_job(job_id, cached['dialogue_json'])
+    embeddings.index_job(job_id, cached['dialogue_json'])
+    return job_id
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        print(f"Starting job worker pool with {JOB_WORKERS} worker(s)...")
+        # 'spawn' so workers don't inherit torch/CUDA state or Flask's sockets from the parent
+        mp_context = multiprocessing.get_context("spawn")
+        event_queue = mp_context.Queue()
+        job_events.start_dispatcher(event_queue)
+        _executor = ProcessPoolExecutor(
+            max_workers=JOB_WORKERS,
+            mp_context=mp_context,
+            initializer=_worker_init,
+            initargs=(PRELOAD_WHISPER_SIZES, event_queue)
+        )
+    return _executor
+
+def _log_job_outcome(job_ids, future):
+    exc = future.exception()
+    if exc is not None:
+        for job_id in job_ids:
+            print(f"ERROR: job {job_id} crashed its worker: {exc}")
+            # The worker never got to publish its 'done' event; close the stream for subscribers
+            job_events.bus.publish(job_id, job_events.EVENT_DONE, {'status': STATUS_FAILED, 'error': str(exc)})
+
+def submit_job(job_id, audio_path, whisper_model_size, audio_hash=None, inference_mode=None, delete_audio=True, pcm_path=None):
+    """
+    Queues a job for the worker pool and returns immediately. The worker owns (and deletes) audio_path
+    (and pcm_path, if given) from here on unless delete_audio=False. The future resolves to
+    {"job_id", "status", "error", "timings"}.
+    """
+    job_events.bus.publish(job_id, job_events.EVENT_STATUS, {'status': STATUS_QUEUED})
+    future = _get_executor().submit(_run_job, job_id, audio_path, whisper_model_size, audio_hash, inference_mode, delete_audio,
+                                    pcm_path=pcm_path)
+    future.add_done_callback(lambda f: _log_job_outcome([job_id], f))
+    print(f"Job {job_id} queued ({whisper_model_size}, {inference_mode or 'default'} inference).")
+    return future
+
+def submit_short_batch(jobs, whisper_model_size, inference_mode=None, delete_audio=True):
+    """
+    Queues several short clips (jobs = [(job_id, audio_path, audio_hash), ...]) as one task, so one
+    worker transcribes them in a single batched Whisper decode. Resolves to a list of job outcomes.
+    """
+    job_ids = [job_id for job_id, _, _ in jobs]
+    for job_id in job_ids: job_events.bus.publish(job_id, job_events.EVENT_STATUS, {'status': STATUS_QUEUED})
+    future = _get_executor().submit(_run_short_batch, jobs, whisper_model_size, inference_mode, delete_audio)
+    future.add_done_callback(lambda f: _log_job_outcome(job_ids, f))
+    print(f"Batch of {len(jobs)} short clips queued ({whisper_model_size}).")
+    return future
+
+def start_workers():
+    """Spawns every worker now (each loads its models in the initializer) instead of on the first upload."""
+    executor = _get_executor()
+    # With the 'spawn' context the pool starts a new worker per submit while none is idle,
+    # so JOB_WORKERS no-op tasks bring the whole pool up.
+    for _ in range(JOB_WORKERS):
+        executor.submit(_ping)
+
+def shutdown(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,190 @@
+# ai-report-generator/backend/metrics.py
+#
+# Per-stage performance instrumentation exposed in the Prometheus text format at /metrics.
+# Workers measure their stages (duration, peak RSS) and send the numbers to the web process
+# with the job's 'done' event; the web process folds them into the histograms below, so one
+# /metrics scrape covers every worker. Peak RSS needs psutil (backend/requirements.txt); without
+# it no RSS is recorded (reported as n/a), since getrusage only offers the process's lifetime
+# high-water mark, which would charge every stage with the largest stage that ran before it.
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# How often the RSS sampler looks at the process while a stage is running
+RSS_SAMPLE_SECONDS = float(os.getenv("METRICS_RSS_SAMPLE_SECONDS", "0.05"))
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+RSS_BUCKETS = tuple(mb * 1024 * 1024 for mb in (128, 256, 512, 1024, 2048, 3072, 4096, 6144, 8192, 12288, 16384))
+AUDIO_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+# --- Metric Types ---
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', repr(float(bound)))])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("report_stage_duration_seconds", "Wall time per pipeline stage.", DURATION_BUCKETS, ["stage"])
+STAGE_RTF = Histogram("report_stage_real_time_factor", "Stage seconds per second of audio processed.", RTF_BUCKETS, ["stage"])
+STAGE_PEAK_RSS = Histogram("report_stage_peak_rss_bytes", "Peak resident memory of the process running the stage.", RSS_BUCKETS, ["stage"])
+STAGE_AUDIO_SECONDS = Counter("report_stage_audio_seconds_total", "Seconds of audio processed per stage.", ["stage"])
+JOB_AUDIO_SECONDS = Histogram("report_job_audio_seconds", "Length of the recordings processed.", AUDIO_BUCKETS)
+JOBS_TOTAL = Counter("report_jobs_total", "Finished jobs by final status.", ["status"])
+METRICS = [STAGE_SECONDS, STAGE_RTF, STAGE_PEAK_RSS, STAGE_AUDIO_SECONDS, JOB_AUDIO_SECONDS, JOBS_TOTAL]
+
+# Timings keys that are totals over other stages rather than stages of their own
+_AGGREGATE_TIMINGS = ("diarization_and_transcription",)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in METRICS: lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def observe_stage(stage, seconds, audio_seconds=None, peak_rss_bytes=None):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if audio_seconds:
+        STAGE_RTF.observe(seconds / audio_seconds, stage=stage)
+        STAGE_AUDIO_SECONDS.inc(audio_seconds, stage=stage)
+    if peak_rss_bytes:
+        STAGE_PEAK_RSS.observe(peak_rss_bytes, stage=stage)
+
+
+def observe_job(job_metrics):
+    """Folds one finished job's numbers ({"status", "audio_seconds", "timings", "peak_rss_bytes"}) into the metrics."""
+    audio_seconds = job_metrics.get("audio_seconds")
+    peaks = job_metrics.get("peak_rss_bytes") or {}
+    for stage, seconds in (job_metrics.get("timings") or {}).items():
+        if stage in _AGGREGATE_TIMINGS or not isinstance(seconds, (int, float)): continue
+        observe_stage(stage, seconds, audio_seconds, peaks.get(stage))
+    if audio_seconds: JOB_AUDIO_SECONDS.observe(audio_seconds)
+    JOBS_TOTAL.inc(status=job_metrics.get("status", "unknown"))
+
+
+# --- Peak RSS Measurement ---
+def current_rss_bytes():
+    """Resident memory of this process right now, or None without psutil."""
+    if psutil is None: return None
+    return psutil.Process().memory_info().rss
+
+
+class _RSSSampler:
+    """One daemon thread per process that samples RSS while at least one stage window is open."""
+
+    def __init__(self):
+        self._windows = {} # window id -> peak bytes
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._next_id = 0
+
+    def open(self):
+        with self._lock:
+            window_id = self._next_id
+            self._next_id += 1
+            self._windows[window_id] = current_rss_bytes()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return window_id
+
+    def close(self, window_id):
+        rss = current_rss_bytes()
+        with self._lock:
+            return max(self._windows.pop(window_id, 0), rss)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = bool(self._windows)
+            if not active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            rss = current_rss_bytes()
+            with self._lock:
+                for window_id, peak in self._windows.items():
+                    if rss > peak: self._windows[window_id] = rss
+            time.sleep(RSS_SAMPLE_SECONDS)
+
+
+_sampler = _RSSSampler()
+
+
+@contextmanager
+def track_peak_rss(peaks, stage):
+    """
+    Records the highest RSS seen while the block runs into peaks[stage] (keeps the larger value if
+    already set). Without psutil nothing is recorded, so the stage has no peak RSS (n/a).
+    """
+    if psutil is None:
+        yield
+        return
+    window_id = _sampler.open()
+    try:
+        yield
+    finally:
+        peak = _sampler.close(window_id)
+        peaks[stage] = max(peaks.get(stage, 0), peak)
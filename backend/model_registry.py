@@ -0,0 +1,90 @@
+# ai-report-generator/backend/model_registry.py
+
+import gc
+import time
+import threading
+from collections import OrderedDict
+
+
+def estimate_model_bytes(model, size_hint=0):
+    """Bytes held by a model's parameters and buffers, or size_hint for objects that aren't torch modules."""
+    try:
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        # Dynamically quantized layers keep their int8 weights in packed params, not in parameters()
+        for module in model.modules():
+            if hasattr(module, "_packed_params") and hasattr(module._packed_params, "_weight_bias"):
+                for t in module._packed_params._weight_bias():
+                    if t is not None: total += t.numel() * t.element_size()
+        return total or size_hint
+    except AttributeError:
+        return size_hint
+
+
+class ModelRegistry:
+    """
+    Keeps several loaded models resident at once, keyed by name (e.g. "whisper:small").
+
+    - LRU eviction once the estimated total size exceeds max_bytes. The most recently
+      loaded model is never evicted, so a single model larger than the budget still works.
+    - Loading is thread-safe: concurrent get() calls for the same key wait on one load
+      instead of each loading their own copy. Loads of different keys run in parallel.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (model, nbytes), least recently used first
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, loader, size_hint=0):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+
+            start_time = time.time()
+            model = loader()
+            nbytes = estimate_model_bytes(model, size_hint)
+            print(f"Model registry: loaded '{key}' (~{nbytes / 1e6:.0f} MB) in {time.time() - start_time:.2f}s")
+
+            with self._lock:
+                self._entries[key] = (model, nbytes)
+                self._evict_over_budget()
+            return model
+
+    def _evict_over_budget(self):
+        # Caller holds self._lock
+        evicted = False
+        while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+            key, (_, nbytes) = self._entries.popitem(last=False)
+            print(f"Model registry: evicted '{key}' (~{nbytes / 1e6:.0f} MB) to stay within {self.max_bytes / 1e6:.0f} MB")
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def total_bytes(self):
+        return sum(nbytes for _, nbytes in self._entries.values())
+
+    def is_loaded(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def loaded_keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def evict(self, key):
+        with self._lock:
+            removed = self._entries.pop(key, None)
+        if removed is not None:
+            gc.collect()
+        return removed is not None
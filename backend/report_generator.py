@@ -0,0 +1,216 @@
+# ai-report-generator/backend/report_generator.py
+#
+# Report generation from a finished job's stored dialogue and processed_text. Runs in the
+# web process and never touches the audio or the ML models, so regenerating a report (another
+# report type, or new custom instructions) costs milliseconds instead of a pipeline run.
+#
+# Reports are extractive: speaker statistics, keywords (lemma counts from processed_text), the
+# highest-scoring turns as key points and, for "detailed", questions, action items and the
+# timestamped transcript. Custom instructions are used as focus terms: turns mentioning them
+# score higher and get their own section.
+#
+# Generated reports are memoized by (job_id, report_type, prompt hash) in an LRU with a TTL,
+# so repeat views and regenerations of the same variant are served from memory.
+
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from search_index import tokenize
+from compact_dialogue import stored_turns
+
+# --- Configuration ---
+GENERATED_REPORT_CACHE_MAX_ENTRIES = int(os.getenv("GENERATED_REPORT_CACHE_MAX_ENTRIES", "512"))
+GENERATED_REPORT_CACHE_TTL_SECONDS = int(os.getenv("GENERATED_REPORT_CACHE_TTL_SECONDS", "3600"))
+MAX_PROMPT_CHARS = 2000
+
+REPORT_TYPES = {
+    # report type -> how much of each section to include
+    "brief": {"keywords": 10, "key_points": 5, "questions": 0, "action_items": 0, "transcript": False},
+    "detailed": {"keywords": 25, "key_points": 12, "questions": 10, "action_items": 10, "transcript": True},
+}
+
+# Words of the instructions themselves, not of the conversation ("focus on delivery dates")
+_INSTRUCTION_WORDS = frozenset("""
+focus focusing emphasize emphasise highlight include mention summarize summarise summary report please about
+more less detail details detailed brief key points point want make give show list add only also
+""".split())
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_ACTION_RE = re.compile(r"\b(i'll|we'll|i will|we will|need to|needs to|have to|should|let's|follow up|make sure|by (?:monday|tuesday|wednesday|thursday|friday|tomorrow|next week))\b", re.IGNORECASE)
+
+
+def prompt_hash(prompt):
+    """Cache key part for the custom instructions (whitespace and case don't make a new variant)."""
+    normalized = " ".join((prompt or "").lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _fmt_time(seconds):
+    if seconds is None: return None
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def _speaker_stats(dialogue):
+    stats = {}
+    for turn in dialogue:
+        entry = stats.setdefault(turn.get("speaker") or "Unknown", {"turns": 0, "words": 0, "seconds": 0.0})
+        entry["turns"] += 1
+        entry["words"] += len((turn.get("text") or "").split())
+        if turn.get("start") is not None and turn.get("end") is not None:
+            entry["seconds"] += max(0.0, turn["end"] - turn["start"])
+    total_words = sum(s["words"] for s in stats.values()) or 1
+    return [{"speaker": speaker, "turns": s["turns"], "words": s["words"], "seconds": round(s["seconds"], 1),
+             "share": round(s["words"] / total_words, 3)}
+            for speaker, s in sorted(stats.items(), key=lambda item: -item[1]["words"])]
+
+
+def _keyword_counts(processed_text, dialogue):
+    # processed_text holds the lemmas of every turn; it starts with "[" when preprocessing failed
+    if processed_text and not processed_text.startswith("["):
+        return Counter(tokenize(processed_text))
+    return Counter(t for turn in dialogue for t in tokenize(turn.get("text")))
+
+
+def _sentences(dialogue):
+    """(turn index, speaker, start, sentence) for every sentence of every turn."""
+    for i, turn in enumerate(dialogue):
+        for sentence in _SENTENCE_RE.split((turn.get("text") or "").strip()):
+            if sentence: yield i, turn.get("speaker"), turn.get("start"), sentence
+
+
+def _item(turn_index, speaker, start, text):
+    return {"turn_index": turn_index, "speaker": speaker, "time": _fmt_time(start), "text": text}
+
+
+def generate(job_id, record, report_type="brief", prompt=""):
+    """
+    Renders a report from a stored transcripts_log row ({"dialogue_compact" or "dialogue_json", "processed_text", ...}).
+    Returns {"job_id", "report_type", "prompt", "generated_at", "sections": [{"id", "title", ...}]}.
+    """
+    options = REPORT_TYPES[report_type]
+    dialogue = stored_turns(record)
+    keyword_counts = _keyword_counts(record.get("processed_text"), dialogue)
+    focus_terms = list(dict.fromkeys(t for t in tokenize(prompt) if t not in _INSTRUCTION_WORDS))
+    sections = []
+
+    duration = max((t.get("end") or 0.0 for t in dialogue), default=0.0)
+    speakers = _speaker_stats(dialogue)
+    sections.append({"id": "overview", "title": "Overview", "stats": {
+        "speakers": len(speakers), "turns": len(dialogue), "duration": _fmt_time(duration),
+        "words": sum(s["words"] for s in speakers)}, "speakers": speakers})
+
+    keywords = [{"term": term, "count": count} for term, count in keyword_counts.most_common(options["keywords"])]
+    sections.append({"id": "keywords", "title": "Keywords", "items": keywords})
+
+    # Key points: sentences carrying the most frequent vocabulary, boosted by the focus terms
+    top_terms = {k["term"]: k["count"] for k in keywords}
+    scored = []
+    for turn_index, speaker, start, sentence in _sentences(dialogue):
+        terms = tokenize(sentence)
+        if len(terms) < 3: continue # skip "Okay, sounds good."
+        score = sum(top_terms.get(t, 0) for t in terms) / len(terms) ** 0.5
+        score *= 1 + sum(1 for t in terms if t in focus_terms)
+        scored.append((score, turn_index, speaker, start, sentence))
+    key_points = sorted(sorted(scored, key=lambda s: -s[0])[:options["key_points"]], key=lambda s: s[1])
+    sections.append({"id": "key_points", "title": "Key Points",
+                     "items": [_item(i, speaker, start, sentence) for _, i, speaker, start, sentence in key_points]})
+
+    if focus_terms:
+        focus = [_item(i, turn.get("speaker"), turn.get("start"), turn.get("text"))
+                 for i, turn in enumerate(dialogue) if set(tokenize(turn.get("text"))) & set(focus_terms)]
+        sections.append({"id": "focus", "title": f"Focus: {', '.join(focus_terms)}", "items": focus[:max(options["key_points"], 10)]})
+
+    if options["questions"]:
+        questions = [_item(i, speaker, start, s) for i, speaker, start, s in _sentences(dialogue) if s.endswith("?")]
+        sections.append({"id": "questions", "title": "Questions Raised", "items": questions[:options["questions"]]})
+    if options["action_items"]:
+        actions = [_item(i, speaker, start, s) for i, speaker, start, s in _sentences(dialogue) if _ACTION_RE.search(s)]
+        sections.append({"id": "action_items", "title": "Action Items", "items": actions[:options["action_items"]]})
+    if options["transcript"]:
+        sections.append({"id": "transcript", "title": "Transcript",
+                         "items": [_item(i, t.get("speaker"), t.get("start"), t.get("text")) for i, t in enumerate(dialogue)]})
+
+    return {"job_id": job_id, "report_type": report_type, "prompt": prompt, "generated_at": time.time(), "sections": sections}
+
+
+# --- Memoization ---
+class ReportCache:
+    """
+    Generated reports keyed by (job_id, report_type, prompt hash). LRU bounded by max_entries,
+    entries expire after ttl_seconds. Same shape as storage.CachedReportStore.
+    """
+
+    def __init__(self, max_entries=GENERATED_REPORT_CACHE_MAX_ENTRIES, ttl_seconds=GENERATED_REPORT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._reports = OrderedDict() # key -> (expires_at, report), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._reports.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None: del self._reports[key]
+                self.misses += 1
+                return None
+            self._reports.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, report):
+        with self._lock:
+            self._reports[key] = (time.time() + self.ttl_seconds, report)
+            self._reports.move_to_end(key)
+            while len(self._reports) > self.max_entries:
+                self._reports.popitem(last=False)
+
+    def invalidate(self, job_id):
+        with self._lock:
+            for key in [k for k in self._reports if k[0] == job_id]:
+                del self._reports[key]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._reports), "hits": self.hits, "misses": self.misses,
+                    "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
+
+
+_cache = ReportCache()
+
+
+def get_report(job_id, load_record, report_type="brief", prompt=""):
+    """
+    The memoized report for (job_id, report_type, prompt). load_record() is only called on a miss and
+    returns the stored row (or None). Returns (report or None, cached: bool).
+    Raises ValueError for an unknown report type or an over-long prompt.
+    """
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type '{report_type}' (expected one of {sorted(REPORT_TYPES)})")
+    prompt = (prompt or "").strip()
+    if len(prompt) > MAX_PROMPT_CHARS:
+        raise ValueError(f"Custom instructions are limited to {MAX_PROMPT_CHARS} characters")
+    key = (job_id, report_type, prompt_hash(prompt))
+    report = _cache.get(key)
+    if report is not None: return report, True
+    record = load_record()
+    if record is None: return None, False
+    start_time = time.time()
+    report = generate(job_id, record, report_type, prompt)
+    report["generation_seconds"] = round(time.time() - start_time, 4)
+    _cache.put(key, report)
+    print(f"Generated {report_type} report for job {job_id} (prompt {key[2]}) in {report['generation_seconds']:.3f}s")
+    return report, False
+
+
+def invalidate(job_id):
+    _cache.invalidate(job_id)
+
+
+def stats():
+    return _cache.stats()
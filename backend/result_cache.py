@@ -0,0 +1,151 @@
+# ai-report-generator/backend/result_cache.py
+#
+# Persistent cache of finished pipeline results, keyed by the SHA-256 of the uploaded
+# audio bytes plus the Whisper model size. A repeated upload (browser retry, same call
+# uploaded by someone else) returns the stored transcript instead of re-running
+# ffmpeg + pyannote + Whisper. Backed by a local SQLite file so both the web process
+# and the worker processes can use it.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- Configuration ---
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'result_cache.sqlite3'))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    audio_hash text NOT NULL,
+    whisper_model_size text NOT NULL,
+    raw_transcript text,
+    dialogue_json text,
+    processed_text text,
+    nbytes integer NOT NULL,
+    created_at real NOT NULL,
+    last_access real NOT NULL,
+    hits integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (audio_hash, whisper_model_size)
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name text PRIMARY KEY,
+    value integer NOT NULL
+);
+"""
+_COUNTERS = ("hits", "misses", "stores", "evictions")
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(RESULT_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(RESULT_CACHE_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL") # web process reads while workers write
+                conn.executescript(_SCHEMA)
+                conn.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", [(c,) for c in _COUNTERS])
+                conn.commit()
+                _initialized = True
+    return conn
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn: # commits on success, rolls back on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def _bump(conn, counter, amount=1):
+    conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, counter))
+
+
+def model_variant(whisper_model_size, inference_mode="fp32"):
+    """Cache key part for the model that produced a result; int8 output can differ slightly from fp32."""
+    return whisper_model_size if inference_mode in (None, "", "fp32") else f"{whisper_model_size}:{inference_mode}"
+
+
+def lookup(audio_hash, whisper_model_size):
+    """Returns {"raw_transcript", "dialogue_json", "processed_text"} for a cached result, or None."""
+    if not RESULT_CACHE_ENABLED or not audio_hash: return None
+    try:
+        with _db() as conn:
+            row = conn.execute(
+                "SELECT raw_transcript, dialogue_json, processed_text FROM results WHERE audio_hash = ? AND whisper_model_size = ?",
+                (audio_hash, whisper_model_size)
+            ).fetchone()
+            if row is None:
+                _bump(conn, "misses")
+                return None
+            conn.execute(
+                "UPDATE results SET last_access = ?, hits = hits + 1 WHERE audio_hash = ? AND whisper_model_size = ?",
+                (time.time(), audio_hash, whisper_model_size)
+            )
+            _bump(conn, "hits")
+        return {"raw_transcript": row[0], "dialogue_json": json.loads(row[1]) if row[1] else [], "processed_text": row[2]}
+    except Exception as e:
+        print(f"Warning: result cache lookup failed: {e}")
+        return None
+
+
+def store(audio_hash, whisper_model_size, raw_transcript, dialogue, processed_text):
+    """Saves a completed result, then evicts least-recently-used entries beyond the size limits."""
+    if not RESULT_CACHE_ENABLED or not audio_hash: return
+    dialogue_json = json.dumps(dialogue or [])
+    nbytes = len(raw_transcript or "") + len(dialogue_json) + len(processed_text or "")
+    now = time.time()
+    try:
+        with _db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (audio_hash, whisper_model_size, raw_transcript, dialogue_json, processed_text, nbytes, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (audio_hash, whisper_model_size, raw_transcript, dialogue_json, processed_text, nbytes, now, now)
+            )
+            _bump(conn, "stores")
+            _evict(conn)
+    except Exception as e:
+        print(f"Warning: result cache store failed: {e}")
+
+
+def _evict(conn):
+    count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results").fetchone()
+    max_bytes = RESULT_CACHE_MAX_MB * 1024 * 1024
+    if count <= RESULT_CACHE_MAX_ENTRIES and total_bytes <= max_bytes: return
+    evicted = 0
+    for audio_hash, size, nbytes in conn.execute("SELECT audio_hash, whisper_model_size, nbytes FROM results ORDER BY last_access").fetchall():
+        if count <= RESULT_CACHE_MAX_ENTRIES and total_bytes <= max_bytes: break
+        conn.execute("DELETE FROM results WHERE audio_hash = ? AND whisper_model_size = ?", (audio_hash, size))
+        count -= 1
+        total_bytes -= nbytes
+        evicted += 1
+    _bump(conn, "evictions", evicted)
+    print(f"Result cache: evicted {evicted} entries (now {count} entries, {total_bytes / 1e6:.1f} MB)")
+
+
+def stats():
+    with _db() as conn:
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results").fetchone()
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    return {
+        **counters,
+        "entries": count,
+        "bytes": total_bytes,
+        "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+        "max_entries": RESULT_CACHE_MAX_ENTRIES,
+        "max_bytes": RESULT_CACHE_MAX_MB * 1024 * 1024,
+    }
@@ -0,0 +1,260 @@
+# ai-report-generator/backend/search_index.py
+#
+# Inverted index over finished transcripts for /api/search. Every dialogue turn is one
+# document (job id, speaker, start/end time), indexed under its lowercased words and the
+# spaCy lemmas from preprocessing, so "invoice" also finds "invoices" without loading spaCy
+# in the web process. Jobs are added incrementally when they complete and ranked with BM25.
+#
+# Postings are stored with an impact score (the BM25 term-frequency part at indexing time)
+# and read highest-impact first, at most SEARCH_MAX_POSTINGS_PER_TERM per query term. A query
+# therefore touches a bounded number of rows however large the corpus gets; exact BM25 is
+# then computed for those candidates with the current corpus statistics. Speaker/job filters
+# are applied in the postings query itself, so the cutoff counts only matching turns.
+# Backed by a local SQLite file (WAL) shared by the worker processes (writers) and the web
+# process (reader), like result_cache.py.
+
+import os
+import re
+import time
+import heapq
+import math
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- Configuration ---
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "1").lower() in ("1", "true", "yes")
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'search_index.sqlite3'))
+SEARCH_MAX_POSTINGS_PER_TERM = int(os.getenv("SEARCH_MAX_POSTINGS_PER_TERM", "5000"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 160
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Kept out of the index: they match nearly every turn and would only slow queries down
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from had has have he her him his i if in into is it its me my no not of on or our
+she so than that the their them then there these they this to too us was we were what when which who will with
+you your yeah yes okay ok um uh oh just like do does did can could would should
+""".split())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id integer PRIMARY KEY,
+    term text NOT NULL UNIQUE,
+    df integer NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id integer PRIMARY KEY,
+    job_id text NOT NULL,
+    turn_index integer NOT NULL,
+    speaker text,
+    start_time real,
+    end_time real,
+    length integer NOT NULL,
+    text text
+);
+CREATE INDEX IF NOT EXISTS docs_job_id_idx ON docs (job_id);
+CREATE INDEX IF NOT EXISTS docs_speaker_idx ON docs (speaker);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id integer NOT NULL,
+    doc_id integer NOT NULL,
+    tf integer NOT NULL,
+    length integer NOT NULL,
+    impact real NOT NULL,
+    PRIMARY KEY (term_id, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_impact_idx ON postings (term_id, impact DESC, doc_id, tf, length);
+CREATE INDEX IF NOT EXISTS postings_doc_idx ON postings (doc_id);
+CREATE TABLE IF NOT EXISTS stats (
+    name text PRIMARY KEY,
+    value integer NOT NULL
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(SEARCH_INDEX_PATH), exist_ok=True)
+    conn = sqlite3.connect(SEARCH_INDEX_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL") # web process searches while workers index
+                conn.executescript(_SCHEMA)
+                conn.executemany("INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)", [("docs",), ("total_length",)])
+                conn.commit()
+                _initialized = True
+    return conn
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn: # commits on success, rolls back on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def tokenize(text):
+    """Lowercased word tokens without stop words."""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOP_WORDS]
+
+
+def _doc_terms(text, lemmas):
+    """{term: tf} for one turn: its words plus any lemma that differs from every word."""
+    words = tokenize(text)
+    counts = {}
+    for w in words: counts[w] = counts.get(w, 0) + 1
+    surface = set(counts)
+    for lemma in lemmas or ():
+        for t in tokenize(lemma):
+            if t not in surface: counts[t] = counts.get(t, 0) + 1
+    return counts, len(words)
+
+
+def _bm25_tf(tf, length, avg_length):
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1.0)))
+
+
+# --- Indexing ---
+def _remove_job(conn, job_id):
+    doc_ids = [row[0] for row in conn.execute("SELECT id FROM docs WHERE job_id = ?", (job_id,))]
+    if not doc_ids: return
+    for start in range(0, len(doc_ids), 500):
+        chunk = doc_ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        conn.execute(f"UPDATE terms SET df = df - (SELECT COUNT(*) FROM postings p WHERE p.term_id = terms.id AND p.doc_id IN ({marks})) "
+                     f"WHERE id IN (SELECT term_id FROM postings WHERE doc_id IN ({marks}))", chunk + chunk)
+        conn.execute(f"DELETE FROM postings WHERE doc_id IN ({marks})", chunk)
+    removed_length = conn.execute("SELECT COALESCE(SUM(length), 0) FROM docs WHERE job_id = ?", (job_id,)).fetchone()[0]
+    conn.execute("DELETE FROM docs WHERE job_id = ?", (job_id,))
+    conn.execute("UPDATE stats SET value = value - ? WHERE name = 'docs'", (len(doc_ids),))
+    conn.execute("UPDATE stats SET value = value - ? WHERE name = 'total_length'", (removed_length,))
+
+
+def index_job(job_id, dialogue, turn_lemmas=None):
+    """
+    Adds (or replaces) a job's dialogue turns ({"speaker", "text", "start", "end"}) in the index.
+    turn_lemmas is index-aligned with dialogue (see audio_processor.preprocess_dialogue).
+    """
+    if not SEARCH_INDEX_ENABLED or not job_id or not dialogue: return
+    start_time = time.time()
+    try:
+        with _db() as conn:
+            _remove_job(conn, job_id)
+            stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            docs = []
+            for i, turn in enumerate(dialogue):
+                lemmas = turn_lemmas[i] if turn_lemmas and i < len(turn_lemmas) else None
+                counts, length = _doc_terms(turn.get("text"), lemmas)
+                if counts: docs.append((i, turn, counts, length))
+            if not docs: return
+            added_length = sum(length for *_, length in docs)
+            avg_length = (stats.get("total_length", 0) + added_length) / (stats.get("docs", 0) + len(docs))
+
+            term_ids = {}
+            all_terms = sorted({t for *_, counts, _ in docs for t in counts})
+            conn.executemany("INSERT OR IGNORE INTO terms (term, df) VALUES (?, 0)", [(t,) for t in all_terms])
+            for start in range(0, len(all_terms), 500):
+                chunk = all_terms[start:start + 500]
+                term_ids.update(conn.execute(f"SELECT term, id FROM terms WHERE term IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+
+            postings, df_increments = [], {}
+            for i, turn, counts, length in docs:
+                cursor = conn.execute(
+                    "INSERT INTO docs (job_id, turn_index, speaker, start_time, end_time, length, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, i, turn.get("speaker"), turn.get("start"), turn.get("end"), length, turn.get("text")))
+                for term, tf in counts.items():
+                    postings.append((term_ids[term], cursor.lastrowid, tf, length, _bm25_tf(tf, length, avg_length)))
+                    df_increments[term_ids[term]] = df_increments.get(term_ids[term], 0) + 1
+            conn.executemany("INSERT INTO postings (term_id, doc_id, tf, length, impact) VALUES (?, ?, ?, ?, ?)", postings)
+            conn.executemany("UPDATE terms SET df = df + ? WHERE id = ?", [(n, tid) for tid, n in df_increments.items()])
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'docs'", (len(docs),))
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'total_length'", (added_length,))
+        print(f"Search index: indexed job {job_id} ({len(docs)} turns, {len(postings)} postings) in {time.time() - start_time:.2f}s")
+    except Exception as e:
+        print(f"Warning: search indexing failed for job {job_id}: {e}")
+
+
+def remove_job(job_id):
+    with _db() as conn:
+        _remove_job(conn, job_id)
+
+
+# --- Querying ---
+def _snippet(text, terms):
+    text = text or ""
+    lowered = text.lower()
+    positions = [m.start() for t in terms for m in [re.search(r"\b" + re.escape(t), lowered)] if m]
+    start = max(0, min(positions) - SNIPPET_CHARS // 4) if positions else 0
+    snippet = text[start:start + SNIPPET_CHARS]
+    return ("..." if start > 0 else "") + snippet + ("..." if start + SNIPPET_CHARS < len(text) else "")
+
+
+def search(query, limit=20, speaker=None, job_id=None):
+    """
+    BM25-ranked dialogue turns for the query. Returns {"query", "terms", "candidates", "took_ms",
+    "hits": [{"job_id", "turn_index", "speaker", "start", "end", "score", "snippet"}]}.
+    """
+    start_time = time.perf_counter()
+    terms = list(dict.fromkeys(tokenize(query)))
+    result = {"query": query, "terms": terms, "candidates": 0, "hits": []}
+    if not terms:
+        result["took_ms"] = 0.0
+        return result
+    with _db() as conn:
+        stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        num_docs = stats.get("docs", 0)
+        avg_length = stats.get("total_length", 0) / num_docs if num_docs else 1.0
+        # Filters join docs into the postings query, so the per-term cutoff applies to matching turns only
+        filters, filter_params = "", []
+        if job_id:
+            filters += " AND d.job_id = ?"
+            filter_params.append(job_id)
+        if speaker:
+            filters += " AND d.speaker = ?"
+            filter_params.append(speaker)
+        postings_query = ("SELECT p.doc_id, p.tf, p.length FROM postings p JOIN docs d ON d.id = p.doc_id "
+                          f"WHERE p.term_id = ?{filters} ORDER BY p.impact DESC LIMIT ?") if filters \
+            else "SELECT doc_id, tf, length FROM postings WHERE term_id = ? ORDER BY impact DESC LIMIT ?"
+        scores = {}
+        for term in terms:
+            row = conn.execute("SELECT id, df FROM terms WHERE term = ?", (term,)).fetchone()
+            if row is None or row[1] <= 0: continue
+            term_id, df = row
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            # Highest-impact postings first; the cutoff bounds the work for very common terms
+            for doc_id, tf, length in conn.execute(postings_query, [term_id, *filter_params, SEARCH_MAX_POSTINGS_PER_TERM]):
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * _bm25_tf(tf, length, avg_length)
+        result["candidates"] = len(scores)
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        rows = {}
+        if ranked:
+            doc_ids = [doc_id for doc_id, _ in ranked]
+            rows = {row[0]: row[1:] for row in conn.execute(
+                f"SELECT id, job_id, turn_index, speaker, start_time, end_time, text FROM docs WHERE id IN ({','.join('?' * len(doc_ids))})",
+                doc_ids)}
+        hits = []
+        for doc_id, score in ranked:
+            row = rows.get(doc_id)
+            if row is None: continue
+            hits.append({"job_id": row[0], "turn_index": row[1], "speaker": row[2], "start": row[3], "end": row[4],
+                         "score": round(score, 4), "snippet": _snippet(row[5], terms)})
+    result["hits"] = hits
+    result["took_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+    return result
+
+
+def stats():
+    with _db() as conn:
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        jobs = conn.execute("SELECT COUNT(DISTINCT job_id) FROM docs").fetchone()[0]
+        terms = conn.execute("SELECT COUNT(*) FROM terms WHERE df > 0").fetchone()[0]
+    return {"jobs": jobs, "turns": counters.get("docs", 0), "terms": terms}
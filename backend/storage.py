@@ -0,0 +1,275 @@
+# ai-report-generator/backend/storage.py
+#
+# Storage for transcripts_log rows behind one small interface, so the app can run against
+# Supabase in production or a local pooled SQLite/Postgres database offline.
+#
+#   STORAGE_BACKEND=supabase (default)  uses SUPABASE_URL / SUPABASE_KEY
+#   STORAGE_BACKEND=sql                 uses STORAGE_DB_URL (sqlite:///path or postgresql://...)
+#
+# The web process wraps the store in CachedReportStore: rows whose status is final never
+# change again, so they are served from memory after the first read.
+
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import word_store
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+STORAGE_DB_URL = os.getenv("STORAGE_DB_URL", "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'local.sqlite3'))
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "8"))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "256"))
+REPORT_CACHE_TTL_SECONDS = int(os.getenv("REPORT_CACHE_TTL_SECONDS", "3600"))
+
+TABLE = "transcripts_log"
+# Statuses after which a row is immutable (mirrors job_queue.FINAL_STATUSES)
+FINAL_STATUSES = ("completed", "failed")
+JSON_COLUMNS = ("dialogue_json", "timings_json")
+
+# SQLite equivalent of the Supabase transcripts_log table
+SQLITE_TRANSCRIPTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts_log (
+    id text NOT NULL PRIMARY KEY,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    audio_filename text NULL,
+    audio_hash text NULL,
+    raw_transcript text NULL,
+    dialogue_json text NULL,
+    processed_text text NULL,
+    status text NULL,
+    whisper_model_size text NULL,
+    report_type_requested text NULL,
+    inference_mode text NULL,
+    error_message text NULL,
+    timings_json text NULL,
+    dialogue_compact text NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_log_audio_hash_idx ON transcripts_log (audio_hash, whisper_model_size);
+"""
+# Columns added after the table was first created locally: (name, type)
+SQLITE_ADDED_COLUMNS = (("inference_mode", "text"), ("timings_json", "text"), ("dialogue_compact", "text"))
+
+
+class ReportStore:
+    """Interface implemented by every backend. Rows are plain dicts keyed by column name."""
+
+    def create_job(self, fields):
+        """Inserts a row and returns its id as a string."""
+        raise NotImplementedError
+
+    def update_job(self, job_id, fields):
+        raise NotImplementedError
+
+    def get_job(self, job_id, columns=None):
+        """The row (only `columns` if given), or None if it doesn't exist."""
+        raise NotImplementedError
+
+    def word_writer(self):
+        """A word_store row writer for the speakers/utterances/words tables of this database."""
+        raise NotImplementedError
+
+
+# --- Supabase ---
+class SupabaseReportStore(ReportStore):
+    def __init__(self, client):
+        self.client = client
+
+    def create_job(self, fields):
+        response = self.client.table(TABLE).insert(fields).execute()
+        if not response.data:
+            raise RuntimeError("No data returned after insert")
+        return str(response.data[0]['id'])
+
+    def update_job(self, job_id, fields):
+        self.client.table(TABLE).update(fields).eq('id', job_id).execute()
+
+    def get_job(self, job_id, columns=None):
+        response = self.client.table(TABLE).select(", ".join(columns) if columns else "*").eq('id', job_id).maybe_single().execute()
+        return response.data if response and response.data else None
+
+    def word_writer(self):
+        return word_store.SupabaseRowWriter(self.client)
+
+
+# --- Local SQL (SQLite / Postgres) ---
+class _SQLiteConnectionPool:
+    """Fixed-size pool of SQLite connections shared between threads."""
+
+    def __init__(self, path, size):
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._pool = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._pool.put(conn)
+
+    def getconn(self): return self._pool.get()
+    def putconn(self, conn): self._pool.put(conn)
+
+
+class SQLReportStore(ReportStore):
+    def __init__(self, db_url, pool_size=STORAGE_POOL_SIZE):
+        self.db_url = db_url
+        if db_url.startswith("sqlite:///"):
+            self.placeholder = "?"
+            self._pool = _SQLiteConnectionPool(db_url[len("sqlite:///"):], pool_size)
+            with self._connection() as conn:
+                conn.executescript(SQLITE_TRANSCRIPTS_SCHEMA + word_store.SQLITE_SCHEMA)
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")}
+                for name, col_type in SQLITE_ADDED_COLUMNS:
+                    if name not in existing: conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {name} {col_type} NULL")
+        elif db_url.startswith(("postgres://", "postgresql://")):
+            try:
+                from psycopg2.pool import ThreadedConnectionPool
+            except ImportError:
+                raise RuntimeError("STORAGE_DB_URL points at Postgres but psycopg2 is not installed (pip install psycopg2-binary)")
+            self.placeholder = "%s"
+            # Tables come from database/schema.sql (apply it once to a new database; it is idempotent for transcripts_log)
+            self._pool = ThreadedConnectionPool(1, pool_size, db_url)
+        else:
+            raise ValueError(f"Unsupported STORAGE_DB_URL: {db_url}")
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn)
+
+    @staticmethod
+    def _encode(fields):
+        return {k: json.dumps(v) if k in JSON_COLUMNS and v is not None else v for k, v in fields.items()}
+
+    @staticmethod
+    def _decode(row):
+        for k in JSON_COLUMNS:
+            if isinstance(row.get(k), str): row[k] = json.loads(row[k])
+        return row
+
+    def create_job(self, fields):
+        fields = dict(self._encode(fields), id=str(uuid.uuid4()))
+        columns = list(fields)
+        sql = f"INSERT INTO {TABLE} ({', '.join(columns)}) VALUES ({', '.join([self.placeholder] * len(columns))})"
+        with self._connection() as conn:
+            conn.cursor().execute(sql, [fields[c] for c in columns])
+        return fields["id"]
+
+    def update_job(self, job_id, fields):
+        fields = self._encode(fields)
+        columns = list(fields)
+        sql = f"UPDATE {TABLE} SET {', '.join(f'{c} = {self.placeholder}' for c in columns)} WHERE id = {self.placeholder}"
+        with self._connection() as conn:
+            conn.cursor().execute(sql, [fields[c] for c in columns] + [job_id])
+
+    def get_job(self, job_id, columns=None):
+        sql = f"SELECT {', '.join(columns) if columns else '*'} FROM {TABLE} WHERE id = {self.placeholder}"
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, [job_id])
+            row = cursor.fetchone()
+            if row is None: return None
+            names = [d[0] for d in cursor.description]
+        row = dict(zip(names, row))
+        if row.get("created_at") is not None: row["created_at"] = str(row["created_at"]) # datetime under psycopg2
+        return self._decode(row)
+
+    def word_writer(self):
+        # Dedicated connection: a worker holds its writer for its whole lifetime
+        return word_store.open_writer(db_url=self.db_url)
+
+
+# --- Read-Through Cache ---
+class CachedReportStore(ReportStore):
+    """
+    In-process read-through cache in front of another store. Only rows with a final status are
+    cached (they are immutable); everything else is read from the database every time, with just
+    the requested columns. LRU bounded by REPORT_CACHE_MAX_ENTRIES, entries expire after
+    REPORT_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, inner, max_entries=REPORT_CACHE_MAX_ENTRIES, ttl_seconds=REPORT_CACHE_TTL_SECONDS):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._rows = OrderedDict() # job_id -> (expires_at, row)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, job_id):
+        with self._lock:
+            entry = self._rows.get(job_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.time():
+                del self._rows[job_id]
+                self.misses += 1
+                return None
+            self._rows.move_to_end(job_id)
+            self.hits += 1
+            return entry[1]
+
+    def _remember(self, job_id, row):
+        with self._lock:
+            self._rows[job_id] = (time.time() + self.ttl_seconds, row)
+            self._rows.move_to_end(job_id)
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, job_id):
+        with self._lock:
+            self._rows.pop(job_id, None)
+
+    def create_job(self, fields):
+        return self.inner.create_job(fields)
+
+    def update_job(self, job_id, fields):
+        self.invalidate(job_id)
+        self.inner.update_job(job_id, fields)
+
+    def get_job(self, job_id, columns=None):
+        row = self._cached(job_id)
+        if row is not None:
+            return {c: row.get(c) for c in columns} if columns else dict(row)
+        row = self.inner.get_job(job_id, columns)
+        if row is not None and not columns and row.get("status") in FINAL_STATUSES:
+            self._remember(job_id, row)
+            return dict(row)
+        return row
+
+    def word_writer(self):
+        return self.inner.word_writer()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._rows), "hits": self.hits, "misses": self.misses,
+                    "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
+
+
+def create_store():
+    """The configured backend (uncached). Raises if it can't be initialized."""
+    if STORAGE_BACKEND == "sql":
+        print(f"Storage: local SQL database at {STORAGE_DB_URL}")
+        return SQLReportStore(STORAGE_DB_URL)
+    if STORAGE_BACKEND == "supabase":
+        from supabase import create_client
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_KEY") # This should be your Service Role Key for backend
+        if not supabase_url or not supabase_key:
+            raise RuntimeError("SUPABASE_URL or SUPABASE_KEY not found in .env.")
+        print(f"Storage: Supabase at {supabase_url[:20]}...")
+        return SupabaseReportStore(create_client(supabase_url, supabase_key))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
@@ -0,0 +1,351 @@
+# ai-report-generator/backend/streaming.py
+#
+# Windowed ("streaming") processing for long recordings. Audio is read from ffmpeg in
+# overlapping windows, each window is diarized and transcribed on its own, and the
+# results are stitched back into one dialogue. Only the current window is held in
+# memory, so peak memory no longer depends on the length of the recording.
+
+import os
+import time
+import string
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+import audio_processor
+import vad
+import metrics
+from alignment import assign_segment_speakers, without_words, segment_words
+from audio_processor import SAMPLE_RATE, _report_stage
+
+# --- Configuration ---
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "300"))
+STREAM_OVERLAP_SECONDS = float(os.getenv("STREAM_OVERLAP_SECONDS", "10"))
+# Cosine similarity above which a window's speaker is treated as an already-known speaker
+SPEAKER_MATCH_THRESHOLD = float(os.getenv("SPEAKER_MATCH_THRESHOLD", "0.6"))
+# Characters of the previous window's text passed to Whisper as context for the next one
+PROMPT_CONTEXT_CHARS = 200
+
+
+# --- Audio Windows ---
+def iter_audio_windows(input_path, window_seconds=STREAM_WINDOW_SECONDS, overlap_seconds=STREAM_OVERLAP_SECONDS):
+    """
+    Yields (window_start_seconds, float32 samples, is_last) for overlapping windows read
+    incrementally from ffmpeg's stdout. Consecutive windows share overlap_seconds of audio.
+    """
+    window_samples = int(window_seconds * SAMPLE_RATE)
+    overlap_samples = int(overlap_seconds * SAMPLE_RATE)
+    if overlap_samples >= window_samples:
+        raise ValueError("STREAM_OVERLAP_SECONDS must be smaller than STREAM_WINDOW_SECONDS")
+    hop_samples = window_samples - overlap_samples
+
+    command = ['ffmpeg', '-nostdin', '-threads', '0', '-i', input_path,
+               '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-']
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        raise ValueError("ffmpeg command not found. Ensure FFmpeg is installed and in system PATH.")
+
+    try:
+        buffer = np.empty(0, dtype=np.float32)
+        offset_samples = 0
+        while True:
+            needed = window_samples - len(buffer)
+            raw = process.stdout.read(needed * 2) # 2 bytes per s16 sample; blocks until filled or EOF
+            if raw:
+                raw = raw[:len(raw) - (len(raw) % 2)]
+                buffer = np.concatenate([buffer, np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0])
+            if len(buffer) < window_samples:
+                # EOF: the final (partial) window. It is yielded even when it only holds the carried-over
+                # overlap, because the previous window hands ownership of its last half-overlap onwards.
+                if len(buffer) > 0:
+                    yield offset_samples / SAMPLE_RATE, buffer, True
+                break
+            yield offset_samples / SAMPLE_RATE, buffer, False
+            buffer = buffer[hop_samples:].copy()
+            offset_samples += hop_samples
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+
+# --- Cross-Window Speaker Identity ---
+class SpeakerTracker:
+    """Maps each window's local diarization labels to global speakers by comparing speaker embeddings."""
+
+    def __init__(self, threshold=SPEAKER_MATCH_THRESHOLD):
+        self.threshold = threshold
+        # Running mean embedding per global speaker; None for a speaker first heard without a
+        # usable embedding (it can't be compared, so later windows never match it)
+        self.centroids = []
+        self.counts = []
+
+    def _new_speaker(self, embedding):
+        self.centroids.append(None if embedding is None else embedding.copy())
+        self.counts.append(0 if embedding is None else 1)
+        return len(self.centroids) - 1
+
+    def match(self, local_labels, embeddings):
+        """Returns {local_label: global speaker index}. embeddings[i] belongs to local_labels[i]."""
+        mapping = {}
+        if embeddings is None or len(embeddings) < len(local_labels):
+            embeddings = np.full((len(local_labels), 1 if embeddings is None else embeddings.shape[1]), np.nan, dtype=np.float32)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # Non-finite or all-zero embeddings have no direction to compare
+        valid = [i for i in range(len(local_labels))
+                 if np.all(np.isfinite(embeddings[i])) and np.linalg.norm(embeddings[i]) > 0]
+        comparable = [g for g, centroid in enumerate(self.centroids) if centroid is not None]
+
+        if comparable and valid:
+            known = np.stack([self.centroids[g] for g in comparable])
+            known = known / np.linalg.norm(known, axis=1, keepdims=True)
+            local = embeddings[valid] / np.linalg.norm(embeddings[valid], axis=1, keepdims=True)
+            similarity = local @ known.T # (local speakers, comparable global speakers)
+            similarity[~np.isfinite(similarity)] = -np.inf # never let a NaN rank first
+            # Greedy one-to-one assignment, best pairs first
+            for flat_idx in np.argsort(similarity, axis=None)[::-1]:
+                row, col = np.unravel_index(flat_idx, similarity.shape)
+                if not similarity[row, col] >= self.threshold: break
+                label, speaker = local_labels[valid[row]], comparable[col]
+                if label in mapping or speaker in mapping.values(): continue
+                mapping[label] = speaker
+                # Update the running mean so the centroid follows the speaker across the call
+                self.counts[speaker] += 1
+                self.centroids[speaker] += (embeddings[valid[row]] - self.centroids[speaker]) / self.counts[speaker]
+
+        for i, label in enumerate(local_labels):
+            if label not in mapping:
+                # Unmatched (or no usable embedding): a speaker we haven't heard before
+                mapping[label] = self._new_speaker(embeddings[i] if i in valid else None)
+        return mapping
+
+    @staticmethod
+    def label(index):
+        return string.ascii_uppercase[index] if index < len(string.ascii_uppercase) else f"SPEAKER_{index:02d}"
+
+
+# --- Turn Stitching ---
+class TurnStitcher:
+    """
+    Merges consecutive same-speaker segments across windows; a turn is final once the speaker changes.
+    Turns have the same shape as alignment.group_into_turns(..., with_words=True).
+    """
+
+    def __init__(self):
+        self.turns = []
+        self._current = None
+        self._texts = []
+
+    def add(self, speaker, segment):
+        """Adds one segment (times already on the recording's timeline). Returns the turn it finalized, if any."""
+        finalized = None
+        if self._current is None or speaker != self._current["speaker"]:
+            finalized = self._close()
+            self._current = {"speaker": speaker, "text": "", "start": segment["start"], "end": segment["end"], "words": []}
+        text = segment["text"].strip()
+        if text:
+            self._texts.append(text)
+            self._current["end"] = segment["end"]
+            self._current["words"].extend(segment_words(segment))
+        return finalized
+
+    def _close(self):
+        if self._current is None or not self._texts: return None
+        turn = self._current
+        turn["text"] = " ".join(self._texts)
+        self.turns.append(turn)
+        self._current = None
+        self._texts = []
+        return turn
+
+    def finish(self):
+        return self._close()
+
+
+# --- Per-Window Stages ---
+def _diarize_window(pipeline, window_audio):
+    start_time = time.time()
+    waveform = {"waveform": torch.from_numpy(window_audio).unsqueeze(0), "sample_rate": SAMPLE_RATE}
+    diarization, embeddings = pipeline(waveform, return_embeddings=True)
+    segments = sorted(
+        ({"speaker": speaker, "start": turn.start, "end": turn.end} for turn, _, speaker in diarization.itertracks(yield_label=True)),
+        key=lambda seg: seg["start"]
+    )
+    # embeddings rows follow the order of diarization.labels()
+    return segments, list(diarization.labels()), embeddings, time.time() - start_time
+
+def _transcribe_window(model, window_audio, prompt):
+    start_time = time.time()
+    result = model.transcribe(window_audio, fp16=False if audio_processor.DEVICE.type == 'cpu' else True,
+                              language='en', initial_prompt=prompt or None, word_timestamps=audio_processor.WORD_TIMESTAMPS)
+    return result, time.time() - start_time
+
+
+def _shift_segment(segment, offset):
+    """Moves a window-relative Whisper segment (and its words) onto the recording's timeline."""
+    shifted = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+    if "words" in segment:
+        shifted["words"] = [dict(w, start=w["start"] + offset, end=w["end"] + offset) for w in segment["words"]]
+    return shifted
+
+
+# --- Streaming Pipeline ---
+def process_audio_streaming(input_audio_path, whisper_model_size, progress_callback=None, partial_callback=None,
+                            window_seconds=STREAM_WINDOW_SECONDS, overlap_seconds=STREAM_OVERLAP_SECONDS, inference_mode="fp32"):
+    """
+    Windowed version of process_audio_and_return_dialogue; returns the same results dict.
+    partial_callback(new_turns) is called with the dialogue turns finalized after each window.
+    """
+    results = {"dialogue": [], "full_transcript": None, "processed_text": None, "turn_lemmas": [], "turn_embeddings": None, "utterances": [], "error": None, "timings": {},
+               "inference_mode": inference_mode, "audio_seconds": None, "peak_rss_bytes": {}}
+    timings = results["timings"]
+    peaks = results["peak_rss_bytes"]
+    timings.update({"decode": 0.0, "diarization": 0.0, "transcription": 0.0})
+    start_process_time = time.time()
+    print(f"--- Starting Streaming Audio Processing for: {input_audio_path} (window {window_seconds:.0f}s, overlap {overlap_seconds:.0f}s) ---")
+
+    try:
+        pipeline = audio_processor._load_diarization_pipeline()
+        model = audio_processor._load_whisper_model(whisper_model_size, inference_mode)
+        tracker = SpeakerTracker()
+        stitcher = TurnStitcher()
+        transcript_parts = []
+        half_overlap = overlap_seconds / 2
+        audio_seconds = 0.0
+        vad_totals = {"original_seconds": 0.0, "speech_seconds": 0.0}
+
+        _report_stage(progress_callback, "converting")
+        windows = iter_audio_windows(input_audio_path, window_seconds, overlap_seconds)
+        window_index = 0
+        while True:
+            start_time_decode = time.time()
+            with metrics.track_peak_rss(peaks, "decode"):
+                next_window = next(windows, None)
+            timings["decode"] += time.time() - start_time_decode
+            if next_window is None: break
+            window_start, window_audio, is_last = next_window
+            window_duration = len(window_audio) / SAMPLE_RATE
+            audio_seconds = window_start + window_duration
+            if window_index == 0: _report_stage(progress_callback, "diarizing")
+
+            # Optional VAD: only the window's speech goes through the models
+            timeline = None
+            model_audio = window_audio
+            if vad.VAD_ENABLED:
+                start_time_vad = time.time()
+                model_audio, timeline, window_vad = vad.trim_silence(window_audio, SAMPLE_RATE)
+                timings["vad"] = timings.get("vad", 0.0) + time.time() - start_time_vad
+                vad_totals["original_seconds"] += window_vad["original_seconds"]
+                vad_totals["speech_seconds"] += window_vad["speech_seconds"]
+
+            # Diarize and transcribe this window (in parallel, like the non-streaming path)
+            prompt = " ".join(transcript_parts)[-PROMPT_CONTEXT_CHARS:]
+            if model_audio.size == 0:
+                # Nothing but silence in this window
+                diar_segments, local_labels, embeddings, diar_secs = [], [], None, 0.0
+                transcription_result, trans_secs = {"segments": []}, 0.0
+            elif audio_processor.PARALLEL_STAGES:
+                # The two stages overlap, so both are charged the peak of the window
+                with metrics.track_peak_rss(peaks, "diarization"), metrics.track_peak_rss(peaks, "transcription"), \
+                     audio_processor.parallel_stage_threads(), \
+                     ThreadPoolExecutor(max_workers=2, thread_name_prefix="stream-stage") as stage_pool:
+                    diar_future = stage_pool.submit(_diarize_window, pipeline, model_audio)
+                    trans_future = stage_pool.submit(_transcribe_window, model, model_audio, prompt)
+                    diar_segments, local_labels, embeddings, diar_secs = diar_future.result()
+                    transcription_result, trans_secs = trans_future.result()
+            else:
+                with metrics.track_peak_rss(peaks, "diarization"):
+                    diar_segments, local_labels, embeddings, diar_secs = _diarize_window(pipeline, model_audio)
+                with metrics.track_peak_rss(peaks, "transcription"):
+                    transcription_result, trans_secs = _transcribe_window(model, model_audio, prompt)
+            if timeline is not None:
+                # Back onto the window's own timeline, so the ownership rules below still apply
+                diar_segments = timeline.remap_segments(diar_segments)
+                transcription_result["segments"] = timeline.remap_segments(transcription_result.get("segments", []))
+            timings["diarization"] += diar_secs
+            timings["transcription"] += trans_secs
+            if window_index == 0: _report_stage(progress_callback, "transcribing")
+
+            # Global speaker labels for this window's local ones
+            global_ids = tracker.match(local_labels, embeddings)
+            label_map = {label: SpeakerTracker.label(idx) for label, idx in global_ids.items()}
+
+            # This window owns segments whose midpoint falls between the overlap midpoints
+            own_start = 0.0 if window_index == 0 else half_overlap
+            own_end = float("inf") if is_last else window_duration - half_overlap
+            owned_segments = [
+                seg for seg in transcription_result.get("segments", [])
+                if own_start <= seg["start"] + (seg["end"] - seg["start"]) / 2 < own_end
+            ]
+            speakers = assign_segment_speakers(owned_segments, diar_segments, label_map)
+
+            new_turns = []
+            for seg, speaker in zip(owned_segments, speakers):
+                text = seg["text"].strip()
+                if text: transcript_parts.append(text)
+                finalized = stitcher.add(speaker, _shift_segment(seg, window_start))
+                if finalized: new_turns.append(finalized)
+            if is_last:
+                finalized = stitcher.finish()
+                if finalized: new_turns.append(finalized)
+
+            print(f"Window {window_index} [{window_start:.0f}s-{window_start + window_duration:.0f}s]: "
+                  f"{len(owned_segments)} segments, {len(new_turns)} finalized turns, {len(tracker.centroids)} speakers so far")
+            if partial_callback and new_turns:
+                try: partial_callback(without_words(new_turns))
+                except Exception as e: print(f"Warning: partial callback failed: {e}")
+            window_index += 1
+            del window_audio, model_audio # Release the window before decoding the next one
+
+        if window_index == 0:
+            raise ValueError("Audio conversion failed.")
+
+        results["full_transcript"] = " ".join(transcript_parts).strip()
+        results["utterances"] = stitcher.turns
+        results["dialogue"] = without_words(stitcher.turns) or ([{"speaker": "Unknown", "text": results["full_transcript"]}] if results["full_transcript"] else [])
+        results["audio_seconds"] = audio_seconds
+        if vad.VAD_ENABLED:
+            # Window overlaps are counted once per window, as that is what the models processed
+            original, speech = vad_totals["original_seconds"], vad_totals["speech_seconds"]
+            results["vad"] = {
+                "original_seconds": original, "speech_seconds": speech, "skipped_seconds": original - speech,
+                "skipped_ratio": (original - speech) / original if original else 0.0,
+                "estimated_speedup": original / speech if speech else 1.0,
+            }
+            print(f"VAD skipped {original - speech:.1f}s of {original:.1f}s windowed audio "
+                  f"(estimated speedup {results['vad']['estimated_speedup']:.2f}x)")
+
+        _report_stage(progress_callback, "preprocessing")
+        if results["dialogue"]:
+            start_time_prep = time.time()
+            with metrics.track_peak_rss(peaks, "preprocessing"):
+                results["processed_text"], results["turn_lemmas"] = audio_processor.preprocess_dialogue(results["dialogue"])
+            timings["preprocessing"] = time.time() - start_time_prep
+            start_time_tag = time.time()
+            with metrics.track_peak_rss(peaks, "word_tagging"):
+                audio_processor.tag_utterance_words(results["utterances"])
+            timings["word_tagging"] = time.time() - start_time_tag
+            start_time_embed = time.time()
+            with metrics.track_peak_rss(peaks, "embedding"):
+                results["turn_embeddings"] = audio_processor.embed_dialogue(results["utterances"], results["dialogue"], results["turn_lemmas"])
+            timings["embedding"] = time.time() - start_time_embed
+        else:
+            results["processed_text"] = "[Preprocessing skipped: No raw transcript]"
+
+    except RuntimeError as e:
+        print(f"RUNTIME ERROR during streaming audio processing (likely model loading): {e}")
+        results["error"] = f"Model loading or runtime error: {e}"
+    except ValueError as e:
+        print(f"VALUE ERROR during streaming audio processing: {e}")
+        results["error"] = str(e)
+    except Exception as e:
+        print(f"UNEXPECTED ERROR during streaming audio processing: {e}")
+        results["error"] = str(e)
+        import traceback; traceback.print_exc()
+
+    timings["overall"] = time.time() - start_process_time
+    print(f"Stage timings: " + ", ".join(f"{stage}={secs:.2f}s" for stage, secs in timings.items()))
+    print(f"--- Finished Streaming Audio Processing (Total Time: {timings['overall']:.2f}s) ---")
+    return results
@@ -0,0 +1,9 @@
+# ai-report-generator/backend/tests/conftest.py
+#
+# Backend modules import each other by bare name (they run from the backend directory),
+# so the tests put that directory on sys.path the same way.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
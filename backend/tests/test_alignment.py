@@ -0,0 +1,72 @@
+# ai-report-generator/backend/tests/test_alignment.py
+
+import random
+
+import numpy as np
+
+from alignment import UNKNOWN_SPEAKER, assign_by_overlap, assign_segment_speakers, group_into_turns
+
+
+def _brute_force(seg_starts, seg_ends, turn_starts, turn_ends, turn_speakers, num_speakers):
+    """Reference: total overlap per speaker for every segment/turn pair."""
+    assigned = []
+    for s, e in zip(seg_starts, seg_ends):
+        e = max(e, s + 1e-3)
+        scores = [0.0] * num_speakers
+        for ts, te, sp in zip(turn_starts, turn_ends, turn_speakers):
+            scores[sp] += max(0.0, min(e, te) - max(s, ts))
+        best = max(range(num_speakers), key=lambda i: scores[i])
+        assigned.append(best if scores[best] > 0 else -1)
+    return assigned
+
+
+def test_picks_speaker_with_most_total_overlap():
+    # Speaker 1 overlaps in two short turns (1.5s total), speaker 0 in one longer turn (1.2s)
+    assigned = assign_by_overlap([0.0], [3.0], [0.0, 1.2, 2.2], [0.75, 2.4, 3.0], [1, 0, 1], 2)
+    assert assigned.tolist() == [1]
+
+
+def test_segment_without_overlap_is_unassigned():
+    assigned = assign_by_overlap([0.0, 5.0], [1.0, 6.0], [0.5], [2.0], [0], 1)
+    assert assigned.tolist() == [0, -1]
+
+
+def test_empty_inputs():
+    assert assign_by_overlap([], [], [0.0], [1.0], [0], 1).tolist() == []
+    assert assign_by_overlap([0.0], [1.0], [], [], [], 0).tolist() == [-1]
+
+
+def test_zero_length_segment_still_overlaps():
+    assert assign_by_overlap([1.0], [1.0], [0.0], [2.0], [0], 1).tolist() == [0]
+
+
+def test_long_turn_spanning_many_segments():
+    # The first turn covers everything; later short turns must not hide it from later segments
+    seg_starts = np.arange(0, 100, 1.0)
+    assigned = assign_by_overlap(seg_starts, seg_starts + 1.0, [0.0, 10.0, 20.0], [100.0, 10.5, 20.5], [0, 1, 1], 2)
+    assert set(assigned.tolist()) == {0}
+
+
+def test_matches_brute_force_on_random_input():
+    rng = random.Random(7)
+    for _ in range(50):
+        segs = sorted((rng.uniform(0, 60), rng.uniform(0, 5)) for _ in range(rng.randint(1, 30)))
+        turns = [(rng.uniform(0, 60), rng.uniform(0, 10), rng.randrange(3)) for _ in range(rng.randint(0, 20))]
+        args = ([s for s, _ in segs], [s + d for s, d in segs],
+                [t for t, _, _ in turns], [t + d for t, d, _ in turns], [sp for _, _, sp in turns], 3)
+        assert assign_by_overlap(*args).tolist() == _brute_force(*args)
+
+
+def test_assign_segment_speakers_uses_display_labels():
+    segments = [{"start": 0.0, "end": 1.0}, {"start": 1.0, "end": 2.0}, {"start": 10.0, "end": 11.0}]
+    diarization = [{"speaker": "SPEAKER_01", "start": 0.0, "end": 1.1}, {"speaker": "SPEAKER_00", "start": 1.1, "end": 2.0}]
+    labels = assign_segment_speakers(segments, diarization, {"SPEAKER_01": "A", "SPEAKER_00": "B"})
+    assert labels == ["A", "B", UNKNOWN_SPEAKER]
+
+
+def test_group_into_turns_merges_consecutive_speakers():
+    segments = [{"text": " Hi.", "start": 0.0, "end": 1.0}, {"text": " How are you?", "start": 1.0, "end": 2.0},
+                {"text": " Fine.", "start": 2.0, "end": 3.0}]
+    turns = group_into_turns(segments, ["A", "A", "B"])
+    assert turns == [{"speaker": "A", "text": "Hi. How are you?", "start": 0.0, "end": 2.0},
+                     {"speaker": "B", "text": "Fine.", "start": 2.0, "end": 3.0}]
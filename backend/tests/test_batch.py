@@ -0,0 +1,75 @@
+# ai-report-generator/backend/tests/test_batch.py
+
+import os
+
+import pytest
+
+import batch
+import job_queue
+import result_cache
+import search_index
+import embeddings
+from compact_dialogue import stored_turns
+
+DIALOGUE = [
+    {"speaker": "A", "text": "Please send the invoice today.", "start": 0.0, "end": 2.0},
+    {"speaker": "B", "text": "The invoice goes out this afternoon.", "start": 2.0, "end": 4.5},
+]
+CACHED = {"raw_transcript": "Please send the invoice today. The invoice goes out this afternoon.",
+          "dialogue_json": DIALOGUE, "processed_text": "send invoice today invoice go afternoon"}
+
+
+class _MemoryStore:
+    def __init__(self):
+        self.rows = {}
+
+    def create_job(self, fields):
+        job_id = f"job-{len(self.rows) + 1}"
+        self.rows[job_id] = dict(fields)
+        return job_id
+
+
+@pytest.fixture(autouse=True)
+def index_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_PATH", os.path.join(str(tmp_path), "search_index.sqlite3"))
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_ENABLED", True)
+    monkeypatch.setattr(search_index, "_initialized", False)
+    monkeypatch.setattr(embeddings, "EMBEDDINGS_PATH", os.path.join(str(tmp_path), "embeddings.sqlite3"))
+    monkeypatch.setattr(embeddings, "EMBEDDINGS_ENABLED", True)
+    monkeypatch.setattr(embeddings, "_initialized", False)
+
+
+@pytest.fixture
+def cache_hit(monkeypatch):
+    monkeypatch.setattr(result_cache, "lookup", lambda audio_hash, variant: CACHED)
+    monkeypatch.setattr(batch, "probe_durations", lambda paths: {p: 4.5 for p in paths})
+    # A cache hit must never reach the worker pool
+    monkeypatch.setattr(job_queue, "submit_job", lambda *a, **k: pytest.fail("cache hit was queued"))
+    monkeypatch.setattr(job_queue, "submit_short_batch", lambda *a, **k: pytest.fail("cache hit was queued"))
+
+
+def test_cache_hit_stores_completed_row_in_compact_form(cache_hit, tmp_path):
+    audio_path = tmp_path / "call.wav"
+    audio_path.write_bytes(b"RIFF")
+    store = _MemoryStore()
+    manifest, tracked = batch.run_batch(store, [{"path": str(audio_path), "name": "call.wav", "audio_hash": "ab" * 32}], "small")
+    assert tracked == []
+    [(job_id, row)] = store.rows.items()
+    assert row["status"] == job_queue.STATUS_COMPLETED
+    assert "dialogue_json" not in row
+    assert stored_turns(row) == DIALOGUE
+    assert row["raw_transcript"] == CACHED["raw_transcript"] and row["audio_filename"] == "call.wav"
+    assert manifest.to_dict()["files"][0]["job_id"] == job_id
+    assert not audio_path.exists() # uploads are deleted once served from the cache
+
+
+def test_cache_hit_is_searchable_and_similar(cache_hit, tmp_path):
+    audio_path = tmp_path / "call.wav"
+    audio_path.write_bytes(b"RIFF")
+    store = _MemoryStore()
+    batch.run_batch(store, [{"path": str(audio_path), "name": "call.wav", "audio_hash": "ab" * 32}], "small")
+    [job_id] = store.rows
+    hits = search_index.search("invoice", job_id=job_id)["hits"]
+    assert sorted(hit["turn_index"] for hit in hits) == [0, 1]
+    similar = embeddings.similar(embeddings.embed_text("invoice going out"), limit=5)["hits"]
+    assert sorted((hit["job_id"], hit["turn_index"]) for hit in similar) == [(job_id, 0), (job_id, 1)]
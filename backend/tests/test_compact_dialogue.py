@@ -0,0 +1,76 @@
+# ai-report-generator/backend/tests/test_compact_dialogue.py
+
+import zlib
+import random
+
+import pytest
+
+from compact_dialogue import CompactDialogue, stored_turns
+
+DIALOGUE = [
+    {"speaker": "SPEAKER_00", "text": "Hello, thanks for joining.", "start": 0.0, "end": 2.5},
+    {"speaker": "SPEAKER_01", "text": "Grüße — happy to be here. 👋", "start": 2.5, "end": 6.0},
+    {"speaker": "SPEAKER_00", "text": "", "start": 6.0, "end": 6.5},
+    {"speaker": "Unknown", "text": "Let's start with the invoice.", "start": 6.5, "end": 12.25},
+]
+
+
+def test_round_trip_through_text():
+    dialogue = CompactDialogue.from_text(CompactDialogue.from_turns(DIALOGUE).to_text())
+    assert dialogue.to_turns() == DIALOGUE
+    assert dialogue.speakers == ["SPEAKER_00", "SPEAKER_01", "Unknown"]
+    assert dialogue.duration() == 12.25
+
+
+def test_stored_turns_reads_either_column():
+    assert stored_turns({"dialogue_compact": CompactDialogue.from_turns(DIALOGUE).to_text(), "dialogue_json": None}) == DIALOGUE
+    assert stored_turns({"dialogue_json": DIALOGUE}) == DIALOGUE # rows written before dialogue_compact
+    assert stored_turns({"dialogue_json": None, "dialogue_compact": None}) == []
+
+
+def test_empty_dialogue_round_trips():
+    dialogue = CompactDialogue.from_bytes(CompactDialogue.from_turns([]).to_bytes())
+    assert len(dialogue) == 0 and dialogue.to_turns() == [] and dialogue.index_range(0, 10) == (0, 0)
+
+
+def test_turns_are_sorted_and_missing_timings_filled():
+    turns = [{"speaker": "B", "text": "second", "start": 5.0, "end": 6.0},
+             {"speaker": None, "text": "first", "start": 1.0, "end": 2.0},
+             {"speaker": "B", "text": "untimed"}]
+    dialogue = CompactDialogue.from_turns(turns)
+    assert [t["text"] for t in dialogue.to_turns()] == ["untimed", "first", "second"]
+    assert dialogue.turn(0) == {"speaker": "B", "text": "untimed", "start": 0.0, "end": 0.0}
+    assert dialogue.turn(1)["speaker"] == "Unknown"
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        CompactDialogue.from_bytes(zlib.compress(b"XXXX" + bytes(16)))
+
+
+def test_index_range_assigns_turns_by_start_time():
+    dialogue = CompactDialogue.from_turns(DIALOGUE)
+    # The turn 2.5-6.0 straddles 5.0 and belongs to the page it starts in
+    assert dialogue.index_range(0, 5) == (0, 2)
+    assert dialogue.index_range(5, 10) == (2, 4)
+    assert dialogue.index_range(2.5, 2.5) == (1, 1)
+    assert dialogue.index_range(None, None) == (0, 4)
+    assert dialogue.index_range(20, None) == (4, 4)
+
+
+def test_consecutive_pages_cover_every_turn_exactly_once():
+    rng = random.Random(7)
+    turns, t = [], 0.0
+    for i in range(300):
+        start = t + rng.choice([0.0, 0.0, rng.uniform(0, 2)]) # some turns start at the same time
+        end = start + rng.uniform(0, 20)                     # long turns straddle page boundaries
+        turns.append({"speaker": f"S{i % 3}", "text": f"turn {i}", "start": start, "end": end})
+        t = start
+    dialogue = CompactDialogue.from_turns(turns)
+    for page_seconds in (0.5, 3.0, 7.0, 60.0):
+        seen, start = [], 0.0
+        while start <= dialogue.duration():
+            lo, hi = dialogue.index_range(start, start + page_seconds)
+            seen.extend(t["text"] for t in dialogue.to_turns(lo, hi))
+            start += page_seconds
+        assert sorted(seen) == sorted(t["text"] for t in turns)
@@ -0,0 +1,66 @@
+# ai-report-generator/backend/tests/test_embeddings.py
+
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+import embeddings
+
+
+@pytest.fixture(autouse=True)
+def embeddings_path(tmp_path, monkeypatch):
+    path = os.path.join(str(tmp_path), "embeddings.sqlite3")
+    monkeypatch.setattr(embeddings, "EMBEDDINGS_PATH", path)
+    monkeypatch.setattr(embeddings, "EMBEDDINGS_ENABLED", True)
+    monkeypatch.setattr(embeddings, "_initialized", False)
+    return path
+
+
+DIALOGUE_A = [
+    {"speaker": "A", "text": "Please send the invoice today.", "start": 0.0, "end": 2.0},
+    {"speaker": "B", "text": "The delivery schedule slipped again.", "start": 2.0, "end": 4.0},
+    {"speaker": "A", "text": "Okay.", "start": 4.0, "end": 4.5}, # only stop words: not indexed
+]
+DIALOGUE_B = [{"speaker": "C", "text": "Invoicing runs on Fridays.", "start": 0.0, "end": 3.0}]
+
+
+def _counts():
+    stats = embeddings.stats()
+    return stats["jobs"], stats["turns"]
+
+
+def test_row_counts_follow_index_replace_and_remove():
+    embeddings.index_job("job-a", DIALOGUE_A)
+    embeddings.index_job("job-b", DIALOGUE_B)
+    assert _counts() == (2, 3)
+    embeddings.index_job("job-a", DIALOGUE_A[:1]) # re-indexing replaces the job's turns
+    assert _counts() == (2, 2)
+    embeddings.remove_job("job-a")
+    embeddings.remove_job("job-a") # removing twice changes nothing
+    assert _counts() == (1, 1)
+
+
+def test_counts_are_seeded_from_an_existing_index(embeddings_path, monkeypatch):
+    embeddings.index_job("job-a", DIALOGUE_A)
+    embeddings.index_job("job-b", DIALOGUE_B)
+    # A file written before the stats table existed
+    with sqlite3.connect(embeddings_path) as conn: conn.execute("DROP TABLE stats")
+    monkeypatch.setattr(embeddings, "_initialized", False)
+    assert _counts() == (2, 3)
+
+
+@pytest.mark.parametrize("exact_max_rows", [5000, 0]) # exact scan, LSH buckets
+def test_similar_ranks_shared_word_forms_first(monkeypatch, exact_max_rows):
+    monkeypatch.setattr(embeddings, "SIMILARITY_EXACT_MAX_ROWS", exact_max_rows)
+    embeddings.index_job("job-a", DIALOGUE_A)
+    embeddings.index_job("job-b", DIALOGUE_B)
+    query = embeddings.turn_vector("job-a", 0)
+    assert np.isclose(np.linalg.norm(query), 1.0)
+    result = embeddings.similar(query, limit=2, exclude=("job-a", 0))
+    hits = [(hit["job_id"], hit["turn_index"]) for hit in result["hits"]]
+    assert ("job-a", 0) not in hits
+    if exact_max_rows: # LSH may legitimately miss a far-away turn; the exact scan sees every row
+        assert hits == [("job-b", 0), ("job-a", 1)]
+    assert embeddings.similar(query, job_id="job-b")["hits"][0]["job_id"] == "job-b"
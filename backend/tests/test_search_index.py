@@ -0,0 +1,81 @@
+# ai-report-generator/backend/tests/test_search_index.py
+
+import os
+
+import pytest
+
+import search_index
+
+
+@pytest.fixture(autouse=True)
+def index_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_PATH", os.path.join(str(tmp_path), "search_index.sqlite3"))
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_ENABLED", True)
+    monkeypatch.setattr(search_index, "_initialized", False)
+
+
+DIALOGUE_A = [
+    {"speaker": "A", "text": "The invoice for March is still open.", "start": 0.0, "end": 3.0},
+    {"speaker": "B", "text": "I sent the invoice last week, invoice number 42.", "start": 3.0, "end": 7.0},
+    {"speaker": "A", "text": "Then let's talk about the delivery schedule.", "start": 7.0, "end": 10.0},
+]
+DIALOGUE_B = [
+    {"speaker": "A", "text": "Did the invoices go out?", "start": 0.0, "end": 2.0},
+    {"speaker": "C", "text": "Delivery is planned for Friday.", "start": 2.0, "end": 4.0},
+]
+
+
+def _hits(results):
+    return [(hit["job_id"], hit["turn_index"]) for hit in results["hits"]]
+
+
+def test_ranks_turns_by_bm25():
+    search_index.index_job("job-a", DIALOGUE_A)
+    results = search_index.search("invoice")
+    # Turn 1 mentions the term twice
+    assert _hits(results) == [("job-a", 1), ("job-a", 0)]
+    assert results["hits"][0]["score"] > results["hits"][1]["score"]
+    assert results["hits"][0]["speaker"] == "B" and results["hits"][0]["start"] == 3.0
+
+
+def test_lemmas_are_indexed():
+    search_index.index_job("job-b", DIALOGUE_B, turn_lemmas=[["do", "the", "invoice", "go", "out"], ["delivery", "be", "plan"]])
+    assert _hits(search_index.search("invoice")) == [("job-b", 0)]
+    assert _hits(search_index.search("plan")) == [("job-b", 1)]
+
+
+def test_stop_words_only_query_returns_nothing():
+    search_index.index_job("job-a", DIALOGUE_A)
+    assert search_index.search("the and of")["hits"] == []
+
+
+def test_reindexing_replaces_and_removing_deletes():
+    search_index.index_job("job-a", DIALOGUE_A)
+    search_index.index_job("job-a", [{"speaker": "A", "text": "Only the schedule now.", "start": 0.0, "end": 1.0}])
+    assert search_index.search("invoice")["hits"] == []
+    assert _hits(search_index.search("schedule")) == [("job-a", 0)]
+    assert search_index.stats() == {"jobs": 1, "turns": 1, "terms": 3}
+
+    search_index.remove_job("job-a")
+    assert search_index.search("schedule")["hits"] == []
+    assert search_index.stats() == {"jobs": 0, "turns": 0, "terms": 0}
+
+
+def test_filters_by_job_and_speaker():
+    search_index.index_job("job-a", DIALOGUE_A)
+    search_index.index_job("job-b", DIALOGUE_B)
+    assert sorted(_hits(search_index.search("delivery"))) == [("job-a", 2), ("job-b", 1)]
+    assert _hits(search_index.search("delivery", job_id="job-b")) == [("job-b", 1)]
+    assert _hits(search_index.search("delivery", speaker="A")) == [("job-a", 2)]
+    assert _hits(search_index.search("delivery", speaker="C", job_id="job-a")) == []
+
+
+def test_filters_apply_before_the_postings_cutoff(monkeypatch):
+    # job-a's turns have the higher impact; with a cutoff of 1 posting per term an unfiltered
+    # query only sees job-a, but a job-b filter must still find job-b's turn
+    monkeypatch.setattr(search_index, "SEARCH_MAX_POSTINGS_PER_TERM", 1)
+    search_index.index_job("job-a", [{"speaker": "A", "text": "budget", "start": 0.0, "end": 1.0}])
+    search_index.index_job("job-b", [{"speaker": "B", "text": "budget review meeting notes for the quarter", "start": 0.0, "end": 1.0}])
+    assert _hits(search_index.search("budget")) == [("job-a", 0)]
+    assert _hits(search_index.search("budget", job_id="job-b")) == [("job-b", 0)]
+    assert _hits(search_index.search("budget", speaker="B")) == [("job-b", 0)]
@@ -0,0 +1,50 @@
+# ai-report-generator/backend/tests/test_speaker_tracker.py
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch") # streaming.py runs the models as well
+from streaming import SpeakerTracker
+
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_same_speakers_keep_their_ids_across_windows():
+    tracker = SpeakerTracker(threshold=0.5)
+    a, b = _unit(1, 0, 0), _unit(0, 1, 0)
+    assert tracker.match(["S0", "S1"], np.stack([a, b])) == {"S0": 0, "S1": 1}
+    # Local labels are arbitrary per window: here S0 is the second global speaker
+    assert tracker.match(["S0", "S1"], np.stack([b, a])) == {"S0": 1, "S1": 0}
+
+
+def test_dissimilar_speaker_becomes_new_global_speaker():
+    tracker = SpeakerTracker(threshold=0.5)
+    tracker.match(["S0"], np.stack([_unit(1, 0, 0)]))
+    assert tracker.match(["S0"], np.stack([_unit(0, 0, 1)])) == {"S0": 1}
+
+
+def test_assignment_is_one_to_one():
+    tracker = SpeakerTracker(threshold=0.5)
+    tracker.match(["S0"], np.stack([_unit(1, 0, 0)]))
+    # Both resemble global speaker 0; only the closer one gets it
+    mapping = tracker.match(["S0", "S1"], np.stack([_unit(1, 0.4, 0), _unit(1, 0.1, 0)]))
+    assert mapping == {"S1": 0, "S0": 1}
+
+
+def test_speaker_without_embedding_never_captures_a_match():
+    tracker = SpeakerTracker(threshold=0.5)
+    a = _unit(1, 0, 0)
+    embeddings = np.stack([a, np.full(3, np.nan, dtype=np.float32)])
+    assert tracker.match(["S0", "S1"], embeddings) == {"S0": 0, "S1": 1}
+    with np.errstate(all="raise"): # no divide-by-zero on the missing centroid
+        assert tracker.match(["S0"], np.stack([a])) == {"S0": 0}
+        assert tracker.match(["S0", "S1"], np.stack([np.zeros(3, dtype=np.float32), a])) == {"S1": 0, "S0": 2}
+
+
+def test_missing_embeddings_array():
+    tracker = SpeakerTracker(threshold=0.5)
+    assert tracker.match(["S0", "S1"], None) == {"S0": 0, "S1": 1}
+    assert tracker.match(["S0"], np.stack([_unit(1, 0, 0)])) == {"S0": 2}
@@ -0,0 +1,132 @@
+# ai-report-generator/backend/tests/test_uploads.py
+
+import io
+import os
+import hashlib
+
+import pytest
+
+import uploads
+from uploads import ResumableUploads, UploadOffsetMismatch, UploadTooLarge, UploadChecksumMismatch
+
+DATA = bytes(range(256)) * 40 # 10240 bytes
+
+
+class _DroppedConnection(io.RawIOBase):
+    """A request body that delivers `limit` bytes and then fails like a reset connection."""
+
+    def __init__(self, data, limit):
+        self.stream = io.BytesIO(data[:limit])
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        if not chunk: raise ConnectionResetError("client went away")
+        return chunk
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResumableUploads(str(tmp_path), decode_while_receiving=False)
+
+
+def test_chunks_in_order_complete_with_hash(store):
+    meta = store.create("call.wav", len(DATA), sha256=hashlib.sha256(DATA).hexdigest())
+    upload_id = meta["upload_id"]
+    assert store.append(upload_id, 0, io.BytesIO(DATA[:4000]), chunk_size=1000)["offset"] == 4000
+    assert store.append(upload_id, 4000, io.BytesIO(DATA[4000:]), chunk_size=1000)["offset"] == len(DATA)
+    part_path, audio_hash, pcm_path = store.complete(upload_id)
+    assert audio_hash == hashlib.sha256(DATA).hexdigest()
+    assert pcm_path is None
+    with open(part_path, 'rb') as f: assert f.read() == DATA
+
+
+def test_wrong_offset_is_rejected_with_server_offset(store):
+    upload_id = store.create("call.wav", len(DATA))["upload_id"]
+    store.append(upload_id, 0, io.BytesIO(DATA[:3000]))
+    with pytest.raises(UploadOffsetMismatch) as excinfo:
+        store.append(upload_id, 5000, io.BytesIO(DATA[5000:]))
+    assert excinfo.value.expected == 3000
+    assert store.get(upload_id)["offset"] == 3000
+
+
+def test_dropped_connection_keeps_received_bytes_and_resumes(store):
+    upload_id = store.create("call.wav", len(DATA))["upload_id"]
+    meta = store.append(upload_id, 0, _DroppedConnection(DATA, 2500), chunk_size=1000)
+    assert meta["offset"] == 2500
+    store.append(upload_id, 2500, io.BytesIO(DATA[2500:]), chunk_size=1000)
+    part_path, audio_hash, _ = store.complete(upload_id)
+    assert audio_hash == hashlib.sha256(DATA).hexdigest()
+    with open(part_path, 'rb') as f: assert f.read() == DATA
+
+
+def test_bytes_past_committed_offset_are_truncated_on_resume(tmp_path, store):
+    upload_id = store.create("call.wav", len(DATA))["upload_id"]
+    store.append(upload_id, 0, io.BytesIO(DATA[:3000]))
+    # A crash after writing but before the offset was saved leaves garbage past the offset
+    with open(os.path.join(str(tmp_path), upload_id + ".part"), 'ab') as f: f.write(b"garbage" * 100)
+    # ...and a restarted process has no live hash state
+    restarted = ResumableUploads(str(tmp_path), decode_while_receiving=False)
+    restarted.append(upload_id, 3000, io.BytesIO(DATA[3000:]))
+    part_path, audio_hash, _ = restarted.complete(upload_id)
+    assert audio_hash == hashlib.sha256(DATA).hexdigest()
+    with open(part_path, 'rb') as f: assert f.read() == DATA
+
+
+def test_chunk_past_declared_size_keeps_what_fits(store):
+    upload_id = store.create("call.wav", 1000)["upload_id"]
+    with pytest.raises(UploadTooLarge):
+        store.append(upload_id, 0, io.BytesIO(DATA[:1500]))
+    assert store.get(upload_id)["offset"] == 1000
+
+
+def test_checksum_mismatch_discards_upload(store):
+    upload_id = store.create("call.wav", len(DATA), sha256="0" * 64)["upload_id"]
+    store.append(upload_id, 0, io.BytesIO(DATA))
+    with pytest.raises(UploadChecksumMismatch):
+        store.complete(upload_id)
+    assert store.get(upload_id) is None
+
+
+def test_create_rejects_oversized_upload(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        ResumableUploads(str(tmp_path), max_bytes=100, decode_while_receiving=False).create("call.wav", 101)
+
+
+# --- Multipart ---
+def _multipart(parts, boundary="testboundary"):
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if filename is not None: body += b"Content-Type: application/octet-stream\r\n"
+        body += b"\r\n" + content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return io.BytesIO(body), f"multipart/form-data; boundary={boundary}"
+
+
+def test_receive_multipart_streams_files_and_collects_fields(tmp_path):
+    pytest.importorskip("werkzeug")
+    stream, content_type = _multipart([("reportType", None, b"detailed"), ("audioFile", "../my call.wav", DATA),
+                                       ("other", "ignored.bin", b"xyz")])
+    fields, files = uploads.receive_multipart(stream, content_type, str(tmp_path), ["audioFile"], chunk_size=700)
+    assert fields == {"reportType": "detailed"}
+    assert len(files) == 1
+    f = files[0]
+    assert f["field"] == "audioFile" and f["filename"] == "my_call.wav"
+    assert f["sha256"] == hashlib.sha256(DATA).hexdigest() and f["bytes"] == len(DATA)
+    with open(f["path"], 'rb') as out: assert out.read() == DATA
+    assert os.listdir(str(tmp_path)) == [os.path.basename(f["path"])]
+
+
+def test_receive_multipart_removes_everything_when_too_large(tmp_path):
+    pytest.importorskip("werkzeug")
+    stream, content_type = _multipart([("audioFiles", "a.wav", DATA[:100]), ("audioFiles", "b.wav", DATA)])
+    with pytest.raises(UploadTooLarge):
+        uploads.receive_multipart(stream, content_type, str(tmp_path), ["audioFiles"], max_bytes=1000, chunk_size=300)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_receive_multipart_rejects_other_content_types(tmp_path):
+    pytest.importorskip("werkzeug")
+    with pytest.raises(ValueError):
+        uploads.receive_multipart(io.BytesIO(b"{}"), "application/json", str(tmp_path), ["audioFile"])
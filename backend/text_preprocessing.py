@@ -0,0 +1,104 @@
+# ai-report-generator/backend/text_preprocessing.py
+#
+# Lean spaCy preprocessing. The pipeline only ever reads is_stop, is_punct and lemma_,
+# so the dependency parser and NER are excluded when the model is loaded, and texts are
+# run through nlp.pipe in batches (one text per dialogue turn) instead of as one doc.
+
+import os
+import time
+import string
+# spaCy itself is imported on first use (it takes about a second to import)
+
+# --- Configuration ---
+SPACY_MODEL_NAME = "en_core_web_sm"
+# The rule-based lemmatizer still needs tok2vec + tagger + attribute_ruler for POS tags
+SPACY_EXCLUDE = ["parser", "ner", "senter"]
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "64"))
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1"))
+# Texts longer than this are split at whitespace before going through spaCy, keeping every
+# doc far below nlp.max_length (1,000,000 chars by default) and its memory use bounded.
+MAX_CHUNK_CHARS = 100_000
+
+
+def load_lean_model():
+    import spacy
+    print(f"Loading SpaCy model '{SPACY_MODEL_NAME}' (excluding {SPACY_EXCLUDE})...")
+    try:
+        return spacy.load(SPACY_MODEL_NAME, exclude=SPACY_EXCLUDE)
+    except OSError: # Model not found
+        print(f"Downloading SpaCy '{SPACY_MODEL_NAME}' model as it was not found...")
+        try:
+             spacy.cli.download(SPACY_MODEL_NAME)
+             nlp = spacy.load(SPACY_MODEL_NAME, exclude=SPACY_EXCLUDE)
+             print("SpaCy model downloaded and loaded.")
+             return nlp
+        except Exception as e_spacy_dl:
+             print(f"ERROR downloading/loading SpaCy model: {e_spacy_dl}")
+             raise RuntimeError("Failed to get SpaCy model") # Re-raise to signal failure
+    except Exception as e_spacy_load: # Other loading errors
+         print(f"ERROR loading SpaCy model: {e_spacy_load}")
+         raise RuntimeError("Failed to load SpaCy model") # Re-raise
+
+
+def split_long_text(text, max_chars=MAX_CHUNK_CHARS):
+    """Splits text into pieces of at most max_chars, breaking at whitespace where possible."""
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            split_at = text.rfind(" ", start, end)
+            if split_at > start: end = split_at
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+def lemmatize_texts(nlp, texts, batch_size=SPACY_BATCH_SIZE, n_process=SPACY_N_PROCESS):
+    """Lowercases each text and returns its lemmas with stop words and punctuation removed, one list per text."""
+    owners, pieces = [], []
+    for idx, text in enumerate(texts):
+        for piece in split_long_text((text or "").lower()):
+            owners.append(idx)
+            pieces.append(piece)
+
+    lemmas_per_text = [[] for _ in texts]
+    for owner, doc in zip(owners, nlp.pipe(pieces, batch_size=batch_size, n_process=n_process)):
+        lemmas_per_text[owner].extend(
+            token.lemma_ for token in doc
+            if not token.is_stop and not token.is_punct and token.lemma_.strip()
+        )
+    return lemmas_per_text
+
+
+def preprocess_turns(nlp, turn_texts, batch_size=SPACY_BATCH_SIZE, n_process=SPACY_N_PROCESS):
+    """
+    Preprocesses one text per dialogue turn.
+    Returns {"processed_text": all lemmas joined with spaces, "turn_lemmas": [[lemma, ...] per turn]}.
+    """
+    start_time = time.time()
+    turn_lemmas = lemmatize_texts(nlp, turn_texts, batch_size=batch_size, n_process=n_process)
+    processed_text = " ".join(lemma for lemmas in turn_lemmas for lemma in lemmas)
+    print(f"Preprocessed {len(turn_texts)} texts in {time.time() - start_time:.2f}s. "
+          f"Original length: {sum(len(t or '') for t in turn_texts)}, Processed length: {len(processed_text)}")
+    return {"processed_text": processed_text, "turn_lemmas": turn_lemmas}
+
+
+def tag_words(nlp, word_lists, batch_size=SPACY_BATCH_SIZE):
+    """
+    POS tag and lemma for already-tokenized words (e.g. Whisper's word timestamps), one list per utterance.
+    Each list becomes a pre-tokenized Doc so tokens stay one-to-one with the input words.
+    Returns [[(pos_tag, lemma), ...] per list].
+    """
+    from spacy.tokens import Doc
+    docs = []
+    for words in word_lists:
+        # Trailing punctuation ("Hello,") would otherwise end up in the lemma
+        cleaned = [w.strip(string.punctuation) or w for w in words]
+        docs.append(Doc(nlp.vocab, words=cleaned))
+    return [
+        [(token.pos_ or None, token.lemma_.lower() or None) for token in doc]
+        for doc in nlp.pipe(docs, batch_size=batch_size)
+    ]
@@ -0,0 +1,290 @@
+# ai-report-generator/backend/uploads.py
+#
+# Size-bounded upload handling. receive_multipart() parses a multipart/form-data body straight
+# from the request stream, writing each file to disk while hashing it (and optionally feeding it
+# to ffmpeg), and stops as soon as MAX_UPLOAD_MB is exceeded. ResumableUploads implements
+# chunked, resumable uploads for long recordings over flaky links: the client declares the
+# total size, PUTs the file in pieces at the offset the server reports, and after a dropped
+# connection asks for the offset (HEAD) and continues from there. While chunks arrive they are
+# also fed to ffmpeg (audio_io.IncrementalDecoder), so decoding overlaps with the upload and
+# the worker can start from decoded PCM.
+
+import os
+import re
+import json
+import time
+import hashlib
+import secrets
+import threading
+
+from audio_io import IncrementalDecoder
+from result_cache import HASH_CHUNK_BYTES
+
+# --- Configuration ---
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "1024"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# Unfinished resumable uploads untouched for this long are deleted
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+# Feed resumable uploads to ffmpeg while they arrive
+UPLOAD_DECODE_WHILE_RECEIVING = os.getenv("UPLOAD_DECODE_WHILE_RECEIVING", "1").lower() in ("1", "true", "yes")
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+class UploadOffsetMismatch(ValueError):
+    def __init__(self, expected):
+        super().__init__(f"Upload offset mismatch; the server has {expected} bytes")
+        self.expected = expected
+
+class UploadChecksumMismatch(ValueError):
+    pass
+
+
+# --- Streaming Multipart Uploads ---
+class _FileSink:
+    """Receives one uploaded file: writes it to disk, hashes it and (optionally) feeds ffmpeg as bytes arrive."""
+
+    def __init__(self, path, max_bytes, decode):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hasher = hashlib.sha256()
+        self.bytes = 0
+        self.out = open(path, 'wb')
+        self.decoder = IncrementalDecoder(path + ".pcm") if decode else None
+
+    def write(self, data):
+        self.bytes += len(data)
+        if self.bytes > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        self.hasher.update(data)
+        self.out.write(data)
+        if self.decoder is not None: self.decoder.feed(data)
+
+    def close(self):
+        self.out.close()
+        pcm_path = self.decoder.finish() if self.decoder is not None else None
+        return {"path": self.path, "sha256": self.hasher.hexdigest(), "bytes": self.bytes, "pcm_path": pcm_path}
+
+    def abort(self):
+        self.out.close()
+        if self.decoder is not None: self.decoder.abort()
+        if os.path.exists(self.path): os.remove(self.path)
+
+
+def receive_multipart(stream, content_type, dest_dir, file_fields, max_bytes=MAX_UPLOAD_BYTES,
+                      decode_while_receiving=False, chunk_size=HASH_CHUNK_BYTES):
+    """
+    Parses a multipart/form-data request body straight from the socket stream (instead of letting
+    Werkzeug spool it to a temp file first). Parts named in file_fields are written to dest_dir
+    while they arrive, hashed on the way and, with decode_while_receiving, fed to ffmpeg; other
+    file parts are skipped. Returns (form fields {name: value}, [{"field", "filename", "path",
+    "sha256", "bytes", "pcm_path"}, ...]). Raises UploadTooLarge once a file passes max_bytes,
+    removing everything written so far.
+    """
+    # Werkzeug ships with Flask, so it's always there in the web process
+    from werkzeug.http import parse_options_header
+    from werkzeug.utils import secure_filename
+    from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+    mimetype, options = parse_options_header(content_type or "")
+    if mimetype != "multipart/form-data" or not options.get("boundary"):
+        raise ValueError("Expected a multipart/form-data body")
+    parser = MultipartDecoder(options["boundary"].encode("latin-1"), max_form_memory_size=1024 * 1024)
+    fields, files = {}, []
+    part, sink, field_chunks = None, None, None
+    try:
+        while True:
+            data = stream.read(chunk_size)
+            parser.receive_data(data or None) # None marks the end of the body
+            event = parser.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    part, sink, field_chunks = event, None, []
+                elif isinstance(event, File):
+                    part, field_chunks = event, None
+                    filename = secure_filename(event.filename or "")
+                    sink = None
+                    if event.name in file_fields and filename:
+                        sink = _FileSink(os.path.join(dest_dir, f"{secrets.token_hex(8)}_{filename}"), max_bytes, decode_while_receiving)
+                        sink.filename = filename
+                elif isinstance(event, Data):
+                    if field_chunks is not None: field_chunks.append(event.data)
+                    elif sink is not None: sink.write(event.data)
+                    if not event.more_data:
+                        if field_chunks is not None:
+                            fields[part.name] = b"".join(field_chunks).decode("utf-8", "replace")
+                        elif sink is not None:
+                            files.append(dict(sink.close(), field=part.name, filename=sink.filename))
+                            sink = None
+                event = parser.next_event()
+            if not data or isinstance(event, Epilogue): break
+    except Exception:
+        if sink is not None: sink.abort()
+        for f in files:
+            for path in (f["path"], f["pcm_path"]):
+                if path and os.path.exists(path): os.remove(path)
+        raise
+    return fields, files
+
+
+# --- Resumable Uploads ---
+class _LiveUpload:
+    """In-memory state of an upload this process is receiving (lost on restart; rebuilt from the file)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hasher = None
+        self.decoder = None
+
+
+class ResumableUploads:
+    """
+    Upload sessions stored under root: <id>.part holds the bytes received so far and <id>.json
+    the session ({"upload_id", "filename", "size", "offset", "sha256", "params", "job", ...}).
+    The offset in the JSON is only advanced after the bytes are on disk, so it is always safe
+    to resume from.
+    """
+
+    def __init__(self, root, max_bytes=MAX_UPLOAD_BYTES, decode_while_receiving=UPLOAD_DECODE_WHILE_RECEIVING):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.decode_while_receiving = decode_while_receiving
+        os.makedirs(root, exist_ok=True)
+        self._live = {}
+        self._live_lock = threading.Lock()
+
+    def _paths(self, upload_id):
+        base = os.path.join(self.root, upload_id)
+        return base + ".json", base + ".part", base + ".pcm"
+
+    def _save_meta(self, meta):
+        meta["updated_at"] = time.time()
+        meta_path = self._paths(meta["upload_id"])[0]
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _live_state(self, upload_id):
+        with self._live_lock:
+            return self._live.setdefault(upload_id, _LiveUpload())
+
+    def get(self, upload_id):
+        """The session dict, or None for unknown/malformed ids."""
+        if not _UPLOAD_ID_RE.match(upload_id or ""): return None
+        try:
+            with open(self._paths(upload_id)[0], encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def create(self, filename, size, sha256=None, params=None):
+        if size <= 0: raise ValueError("Upload size must be positive")
+        if size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        self.cleanup_stale()
+        upload_id = secrets.token_hex(16)
+        meta = {"upload_id": upload_id, "filename": filename, "size": size, "offset": 0, "sha256": (sha256 or "").lower() or None,
+                "params": params or {}, "job": None, "created_at": time.time()}
+        open(self._paths(upload_id)[1], 'wb').close()
+        self._save_meta(meta)
+        return meta
+
+    def append(self, upload_id, offset, source_stream, chunk_size=HASH_CHUNK_BYTES):
+        """
+        Writes the request body at offset (which must equal the session's offset). Bytes received
+        before a dropped connection are kept and count towards the new offset. Returns the session.
+        """
+        meta = self.get(upload_id)
+        if meta is None: raise KeyError(upload_id)
+        live = self._live_state(upload_id)
+        with live.lock: # one writer per upload
+            meta = self.get(upload_id)
+            if offset != meta["offset"]: raise UploadOffsetMismatch(meta["offset"])
+            _, part_path, pcm_path = self._paths(upload_id)
+            remaining = meta["size"] - meta["offset"]
+            written = 0
+            try:
+                with open(part_path, 'r+b') as out:
+                    out.truncate(meta["offset"]) # drop bytes past the committed offset (e.g. a crash mid-write)
+                    if live.hasher is None:
+                        # First chunk in this process (or after a restart): rebuild the hash from what is on disk
+                        live.hasher = hashlib.sha256()
+                        for chunk in iter(lambda: out.read(chunk_size), b""): live.hasher.update(chunk)
+                        # ffmpeg has to see the stream from the first byte
+                        if self.decode_while_receiving and meta["offset"] == 0:
+                            live.decoder = IncrementalDecoder(pcm_path)
+                    out.seek(meta["offset"])
+                    while True:
+                        chunk = source_stream.read(min(chunk_size, remaining - written + 1))
+                        if not chunk: break
+                        overflow = written + len(chunk) > remaining
+                        chunk = chunk[:remaining - written] # keep what fits the declared size
+                        out.write(chunk)
+                        live.hasher.update(chunk)
+                        if live.decoder is not None: live.decoder.feed(chunk)
+                        written += len(chunk)
+                        if overflow:
+                            raise UploadTooLarge(f"Chunk runs past the declared size of {meta['size']} bytes")
+            except UploadTooLarge:
+                raise
+            except Exception as e:
+                print(f"Upload {upload_id}: connection ended after {written} bytes of this chunk: {e}")
+            finally:
+                if written:
+                    meta["offset"] += written
+                    self._save_meta(meta)
+            return meta
+
+    def _reset_live(self, upload_id):
+        with self._live_lock:
+            live = self._live.pop(upload_id, None)
+        if live is not None and live.decoder is not None: live.decoder.abort()
+
+    def complete(self, upload_id):
+        """
+        For a fully received upload: returns (part path, sha256, pcm path or None). The caller takes
+        ownership of both files. Raises UploadChecksumMismatch (and discards the upload) if the client
+        declared a different sha256.
+        """
+        meta = self.get(upload_id)
+        live = self._live_state(upload_id)
+        with live.lock:
+            _, part_path, _ = self._paths(upload_id)
+            if live.hasher is None:
+                live.hasher = hashlib.sha256()
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""): live.hasher.update(chunk)
+            audio_hash = live.hasher.hexdigest()
+            pcm_path = live.decoder.finish() if live.decoder is not None else None
+        with self._live_lock:
+            self._live.pop(upload_id, None)
+        if meta["sha256"] and meta["sha256"] != audio_hash:
+            if pcm_path and os.path.exists(pcm_path): os.remove(pcm_path)
+            self.discard(upload_id)
+            raise UploadChecksumMismatch(f"sha256 mismatch: declared {meta['sha256']}, received {audio_hash}")
+        return part_path, audio_hash, pcm_path
+
+    def record_job(self, upload_id, job):
+        """Remembers the job queued for a completed upload, so a retried final chunk gets the same answer."""
+        meta = self.get(upload_id)
+        if meta is None: return
+        meta["job"] = job
+        self._save_meta(meta)
+
+    def discard(self, upload_id):
+        self._reset_live(upload_id)
+        for path in self._paths(upload_id):
+            if os.path.exists(path): os.remove(path)
+
+    def cleanup_stale(self):
+        cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"): continue
+            upload_id = name[:-len(".json")]
+            meta = self.get(upload_id)
+            if meta is not None and meta.get("updated_at", 0) < cutoff:
+                print(f"Removing stale upload {upload_id} ({meta['offset']}/{meta['size']} bytes)")
+                self.discard(upload_id)
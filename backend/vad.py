@@ -0,0 +1,139 @@
+# ai-report-generator/backend/vad.py
+#
+# Energy-based voice activity detection, run on the decoded waveform before diarization and
+# transcription. Non-speech regions (silence, low-level room noise) are cut out, the speech
+# spans are concatenated, and both models only see that shorter buffer. SpeechTimeline maps
+# timestamps on the compacted audio back to the original recording.
+#
+# Hold music and other loud non-speech is not caught by an energy detector; it is only skipped
+# if it sits below the adaptive threshold.
+
+import os
+import numpy as np
+
+# --- Configuration ---
+VAD_ENABLED = os.getenv("VAD_ENABLED", "0").lower() in ("1", "true", "yes")
+VAD_FRAME_MS = 30
+# A frame is speech if its energy is this many dB above the recording's noise floor...
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))
+# ...and above this absolute level (dBFS), so near-digital-silence files aren't treated as all speech
+VAD_MIN_DB = float(os.getenv("VAD_MIN_DB", "-50"))
+# Percentile of frame energies taken as the noise floor
+NOISE_FLOOR_PERCENTILE = 10
+# Speech kept on both sides of every span, so word onsets/decays aren't clipped
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "200"))
+# Pauses shorter than this stay in (natural pauses between words and sentences)
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", "1000"))
+# Isolated bursts shorter than this (clicks, bumps) are dropped
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))
+
+
+def frame_energies_db(audio, sample_rate, frame_ms=VAD_FRAME_MS):
+    """RMS energy in dBFS per non-overlapping frame (the trailing partial frame is dropped)."""
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    num_frames = len(audio) // frame_len
+    if num_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = audio[:num_frames * frame_len].reshape(num_frames, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _runs(mask):
+    """(start, end) index pairs of the True runs in a boolean array, end exclusive."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def detect_speech(audio, sample_rate, frame_ms=VAD_FRAME_MS):
+    """
+    Speech spans as an (N, 2) int array of [start_sample, end_sample), sorted and non-overlapping.
+    Frames above max(noise floor + VAD_MARGIN_DB, VAD_MIN_DB) count as speech; short gaps are
+    bridged, short bursts dropped and every span padded by VAD_PAD_MS.
+    """
+    energies = frame_energies_db(audio, sample_rate, frame_ms)
+    if energies.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    threshold = max(np.percentile(energies, NOISE_FLOOR_PERCENTILE) + VAD_MARGIN_DB, VAD_MIN_DB)
+    starts, ends = _runs(energies > threshold)
+    if starts.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # Bridge pauses shorter than VAD_MIN_SILENCE_MS
+    min_gap = VAD_MIN_SILENCE_MS / frame_ms
+    keep_break = (starts[1:] - ends[:-1]) >= min_gap
+    starts = np.concatenate(([starts[0]], starts[1:][keep_break]))
+    ends = np.concatenate((ends[:-1][keep_break], [ends[-1]]))
+
+    long_enough = (ends - starts) >= VAD_MIN_SPEECH_MS / frame_ms
+    starts, ends = starts[long_enough], ends[long_enough]
+    if starts.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    frame_len = int(sample_rate * frame_ms / 1000)
+    pad = int(sample_rate * VAD_PAD_MS / 1000)
+    spans = np.stack([starts * frame_len - pad, ends * frame_len + pad], axis=1)
+    spans = np.clip(spans, 0, len(audio))
+    # Padding can make neighbours touch; merge them
+    merged = [spans[0].tolist()]
+    for start, end in spans[1:].tolist():
+        if start <= merged[-1][1]: merged[-1][1] = max(merged[-1][1], end)
+        else: merged.append([start, end])
+    return np.asarray(merged, dtype=np.int64)
+
+
+class SpeechTimeline:
+    """Maps times on the compacted (speech-only) audio back to the original recording."""
+
+    def __init__(self, spans, sample_rate):
+        spans = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+        lengths = spans[:, 1] - spans[:, 0]
+        self.original_starts = spans[:, 0] / sample_rate
+        self.compact_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) / sample_rate if len(spans) else np.zeros(0)
+        self.compact_ends = self.compact_starts + lengths / sample_rate
+
+    def to_original(self, times):
+        """Original-timeline seconds for compacted-timeline seconds (scalar or array)."""
+        if len(self.compact_starts) == 0:
+            return times
+        t = np.asarray(times, dtype=np.float64)
+        idx = np.clip(np.searchsorted(self.compact_starts, t, side="right") - 1, 0, len(self.compact_starts) - 1)
+        # Times past the end of a span (e.g. a segment end rounded up) stay inside that span
+        mapped = self.original_starts[idx] + np.minimum(t - self.compact_starts[idx], self.compact_ends[idx] - self.compact_starts[idx])
+        return float(mapped) if mapped.ndim == 0 else mapped
+
+    def remap_segments(self, segments):
+        """Copies of {"start", "end", ...} dicts (Whisper segments with their words, diarization turns) on the original timeline."""
+        if not segments:
+            return []
+        starts = self.to_original([seg["start"] for seg in segments])
+        ends = self.to_original([seg["end"] for seg in segments])
+        remapped = []
+        for seg, start, end in zip(segments, starts.tolist(), ends.tolist()):
+            new_seg = dict(seg, start=start, end=end)
+            if seg.get("words"):
+                w_starts = self.to_original([w["start"] for w in seg["words"]]).tolist()
+                w_ends = self.to_original([w["end"] for w in seg["words"]]).tolist()
+                new_seg["words"] = [dict(w, start=ws, end=we) for w, ws, we in zip(seg["words"], w_starts, w_ends)]
+            remapped.append(new_seg)
+        return remapped
+
+
+def trim_silence(audio, sample_rate):
+    """
+    Returns (speech_audio, timeline, stats). speech_audio is the speech spans concatenated;
+    stats holds {"original_seconds", "speech_seconds", "skipped_seconds", "skipped_ratio", "spans"}.
+    """
+    spans = detect_speech(audio, sample_rate)
+    speech_audio = np.concatenate([audio[start:end] for start, end in spans]) if len(spans) else np.empty(0, dtype=audio.dtype)
+    original_seconds = len(audio) / sample_rate
+    speech_seconds = len(speech_audio) / sample_rate
+    stats = {
+        "original_seconds": original_seconds,
+        "speech_seconds": speech_seconds,
+        "skipped_seconds": original_seconds - speech_seconds,
+        "skipped_ratio": (original_seconds - speech_seconds) / original_seconds if original_seconds else 0.0,
+        "spans": int(len(spans)),
+    }
+    return speech_audio, SpeechTimeline(spans, sample_rate), stats
@@ -0,0 +1,157 @@
+# ai-report-generator/backend/word_store.py
+#
+# Writes word-level results into the speakers / utterances / words tables from
+# database/schema.sql. Rows for each table go out as one multi-row INSERT (chunked only
+# when a statement would exceed the driver's parameter limit), never one insert per word.
+#
+# Target is chosen by WORDS_DB_URL:
+#   (unset)                  -> the Supabase project (same tables, via the REST client)
+#   sqlite:///path/to/db     -> local SQLite stand-in, schema created automatically
+#   postgresql://user@host/db -> local/remote Postgres via psycopg2 (optional dependency)
+
+import os
+import time
+import uuid
+import sqlite3
+
+WORDS_DB_URL = os.getenv("WORDS_DB_URL", "")
+# Stay under SQLite's 32766 host-parameter limit (Postgres allows 65535)
+MAX_PARAMS_PER_STATEMENT = 30000
+# Rows per request when writing through the Supabase REST API
+SUPABASE_MAX_ROWS_PER_REQUEST = 5000
+
+SPEAKER_COLUMNS = ("id", "name")
+UTTERANCE_COLUMNS = ("id", "job_id", "speaker_id", "start_time", "end_time", "transcript")
+WORD_COLUMNS = ("id", "speaker_id", "utterance_id", "word", "start_time", "end_time", "pos_tag", "lemma", "embedding")
+
+# SQLite equivalent of the tables in database/schema.sql
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS speakers (
+    id text NOT NULL PRIMARY KEY,
+    name text NOT NULL UNIQUE,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS utterances (
+    id text NOT NULL PRIMARY KEY,
+    job_id text NULL,
+    speaker_id text NOT NULL,
+    start_time real NOT NULL,
+    end_time real NOT NULL,
+    transcript text NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS utterances_job_id_idx ON utterances (job_id);
+CREATE TABLE IF NOT EXISTS words (
+    id text NOT NULL PRIMARY KEY,
+    speaker_id text NULL REFERENCES speakers(id),
+    utterance_id text NULL REFERENCES utterances(id),
+    word text NOT NULL,
+    start_time real NOT NULL,
+    end_time real NOT NULL,
+    pos_tag text NULL,
+    lemma text NULL,
+    sentiment_score real NULL,
+    embedding text NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+# --- Row Writers ---
+class SQLRowWriter:
+    """Multi-row INSERTs over a DB-API connection (sqlite3 or psycopg2)."""
+
+    def __init__(self, conn, placeholder="?"):
+        self.conn = conn
+        self.placeholder = placeholder
+
+    def insert_rows(self, table, columns, rows, ignore_conflicts=False):
+        if not rows: return
+        rows_per_statement = max(1, MAX_PARAMS_PER_STATEMENT // len(columns))
+        row_placeholders = "(" + ", ".join([self.placeholder] * len(columns)) + ")"
+        cursor = self.conn.cursor()
+        for start in range(0, len(rows), rows_per_statement):
+            chunk = rows[start:start + rows_per_statement]
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([row_placeholders] * len(chunk))
+            if ignore_conflicts: sql += " ON CONFLICT DO NOTHING"
+            cursor.execute(sql, [value for row in chunk for value in row])
+
+    def commit(self): self.conn.commit()
+    def rollback(self): self.conn.rollback()
+    def close(self): self.conn.close()
+
+
+class SupabaseRowWriter:
+    """Bulk inserts through the Supabase client: one request per table (per 5000 rows)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def insert_rows(self, table, columns, rows, ignore_conflicts=False):
+        for start in range(0, len(rows), SUPABASE_MAX_ROWS_PER_REQUEST):
+            records = [dict(zip(columns, row)) for row in rows[start:start + SUPABASE_MAX_ROWS_PER_REQUEST]]
+            if ignore_conflicts:
+                self.client.table(table).upsert(records, ignore_duplicates=True).execute()
+            else:
+                self.client.table(table).insert(records).execute()
+
+    # Each REST request is its own transaction
+    def commit(self): pass
+    def rollback(self): pass
+    def close(self): pass
+
+
+def open_writer(supabase_client=None, db_url=None):
+    """Row writer for WORDS_DB_URL (or db_url). Returns None if there is nowhere to write."""
+    db_url = WORDS_DB_URL if db_url is None else db_url
+    if not db_url:
+        return SupabaseRowWriter(supabase_client) if supabase_client is not None else None
+    if db_url.startswith("sqlite:///"):
+        path = db_url[len("sqlite:///"):]
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SQLITE_SCHEMA)
+        return SQLRowWriter(conn, "?")
+    if db_url.startswith(("postgres://", "postgresql://")):
+        try:
+            import psycopg2
+        except ImportError:
+            raise RuntimeError("WORDS_DB_URL points at Postgres but psycopg2 is not installed (pip install psycopg2-binary)")
+        return SQLRowWriter(psycopg2.connect(db_url), "%s")
+    raise ValueError(f"Unsupported WORDS_DB_URL: {db_url}")
+
+
+# --- Persistence ---
+def build_rows(job_id, utterances):
+    """Rows for (speakers, utterances, words) from pipeline utterances ({"speaker", "start", "end", "text", "words"})."""
+    speaker_rows, utterance_rows, word_rows = {}, [], []
+    for utt in utterances:
+        speaker_id = f"{job_id}:{utt['speaker']}" # speakers.name is globally unique, so scope it to the job
+        speaker_rows.setdefault(speaker_id, (speaker_id, speaker_id))
+        utterance_id = str(uuid.uuid4()) # generated client-side so words can reference it in the same batch
+        utterance_rows.append((utterance_id, str(job_id), speaker_id, float(utt["start"]), float(utt["end"]), utt.get("text")))
+        for w in utt.get("words", []):
+            word_rows.append((str(uuid.uuid4()), speaker_id, utterance_id, w["word"], float(w["start"]), float(w["end"]),
+                              w.get("pos_tag"), w.get("lemma"), w.get("embedding")))
+    return list(speaker_rows.values()), utterance_rows, word_rows
+
+
+def persist_utterances(writer, job_id, utterances):
+    """Writes one job's speakers, utterances and words (in foreign-key order). Returns row counts and timing."""
+    start_time = time.time()
+    speaker_rows, utterance_rows, word_rows = build_rows(job_id, utterances)
+    try:
+        writer.insert_rows("speakers", SPEAKER_COLUMNS, speaker_rows, ignore_conflicts=True)
+        writer.insert_rows("utterances", UTTERANCE_COLUMNS, utterance_rows)
+        writer.insert_rows("words", WORD_COLUMNS, word_rows)
+        writer.commit()
+    except Exception:
+        writer.rollback()
+        raise
+    counts = {"speakers": len(speaker_rows), "utterances": len(utterance_rows), "words": len(word_rows),
+              "seconds": time.time() - start_time}
+    print(f"Stored {counts['speakers']} speakers, {counts['utterances']} utterances, {counts['words']} words "
+          f"for job {job_id} in {counts['seconds']:.2f}s")
+    return counts
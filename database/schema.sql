@@ -25,4 +25,42 @@ CREATE TABLE public.words (
     created_at timestamp with time zone NOT NULL DEFAULT now()
 );
 ALTER TABLE public.words ADD CONSTRAINT words_speaker_id_fkey FOREIGN KEY (speaker_id) REFERENCES public.speakers(id) ON UPDATE RESTRICT ON DELETE RESTRICT;
-ALTER TABLE public.words ADD CONSTRAINT words_utterance_id_fkey FOREIGN KEY (utterance_id) REFERENCES public.utterances(id) ON UPDATE RESTRICT ON DELETE RESTRICT;
\ No newline at end of file
+ALTER TABLE public.words ADD CONSTRAINT words_utterance_id_fkey FOREIGN KEY (utterance_id) REFERENCES public.utterances(id) ON UPDATE RESTRICT ON DELETE RESTRICT;
+-- One row per processed upload (backend/storage.py; the SQLite equivalent is SQLITE_TRANSCRIPTS_SCHEMA).
+-- Databases created before the columns below existed get them from the ALTER TABLE statements that follow.
+CREATE TABLE IF NOT EXISTS public.transcripts_log (
+    id uuid NOT NULL PRIMARY KEY DEFAULT gen_random_uuid(),
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    audio_filename text NULL,
+    audio_hash text NULL,
+    raw_transcript text NULL,
+    dialogue_json jsonb NULL,
+    processed_text text NULL,
+    status text NULL,
+    whisper_model_size text NULL,
+    report_type_requested text NULL,
+    inference_mode text NULL,
+    error_message text NULL,
+    timings_json jsonb NULL,
+    dialogue_compact text NULL
+);
+
+-- Background job queue: failure reason for jobs that end in status 'failed'
+ALTER TABLE public.transcripts_log ADD COLUMN IF NOT EXISTS error_message text NULL;
+
+-- Result deduplication: SHA-256 of the uploaded audio bytes (see backend/result_cache.py)
+ALTER TABLE public.transcripts_log ADD COLUMN IF NOT EXISTS audio_hash text NULL;
+CREATE INDEX IF NOT EXISTS transcripts_log_audio_hash_idx ON public.transcripts_log (audio_hash, whisper_model_size);
+
+-- Word-level persistence: utterances are written per job (see backend/word_store.py)
+ALTER TABLE public.utterances ADD COLUMN IF NOT EXISTS job_id text NULL;
+CREATE INDEX IF NOT EXISTS utterances_job_id_idx ON public.utterances (job_id);
+
+-- Whisper inference mode per job: 'fp32' or 'int8' (dynamic quantization, see backend/audio_processor.py)
+ALTER TABLE public.transcripts_log ADD COLUMN IF NOT EXISTS inference_mode text NULL;
+
+-- Per-stage timings, audio seconds and peak RSS of the job's pipeline run (see backend/metrics.py)
+ALTER TABLE public.transcripts_log ADD COLUMN IF NOT EXISTS timings_json jsonb NULL;
+
+-- Columnar, zlib-compressed dialogue (backend/compact_dialogue.py), base64 text; serves ?from=&to= range queries
+ALTER TABLE public.transcripts_log ADD COLUMN IF NOT EXISTS dialogue_compact text NULL;
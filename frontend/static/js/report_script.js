@@ -5,6 +5,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Configuration ---
     const BACKEND_URL = 'http://127.0.0.1:5000'; // Ensure this matches your Flask backend
+    const STATUS_POLL_INTERVAL_MS = 3000; // How often to re-check a job that is still queued/processing
+    const FINAL_STATUSES = ['completed', 'failed'];
+    const DIALOGUE_PAGE_SECONDS = 600; // Dialogue is fetched ten minutes of the call at a time
 
     // --- Select UI Elements ---
     const reportContentDiv = document.getElementById('report-content-dynamic');
@@ -29,6 +32,69 @@ document.addEventListener('DOMContentLoaded', () => {
     if (!statusMessageDiv) { console.error("CRITICAL: #report-status-message div not found!"); return; }
 
 
+    function appendDialogueTurn(container, turn) {
+        const turnP = document.createElement('p');
+        turnP.className = 'dialogue-turn';
+        const speakerSpan = document.createElement('strong');
+        speakerSpan.textContent = `Speaker ${turn.speaker}: `;
+        // Assign colors based on speaker label A, B, C...
+        const speakerColors = { 'A': '#00c7d9', 'B': '#ffab00', 'C': '#ff6b6b', 'Unknown': '#cccccc' };
+        speakerSpan.style.color = speakerColors[turn.speaker] || '#e1e1ff'; // Fallback color
+        speakerSpan.className = `speaker-${turn.speaker}`; // For potential CSS styling
+        turnP.appendChild(speakerSpan);
+        turnP.appendChild(document.createTextNode(turn.text));
+        container.appendChild(turnP);
+    }
+
+    // --- Live Progress via Server-Sent Events ---
+    // Shows stage changes and dialogue turns while the job runs, then loads the full report once on 'done'.
+    function followJobEvents() {
+        if (!window.EventSource) {
+            console.warn("EventSource not supported; falling back to polling.");
+            fetchAndDisplayReport();
+            return;
+        }
+        statusMessageDiv.innerHTML = `<p><i>Connecting to job ${jobId}...</i></p>`;
+        const eventSource = new EventSource(`${BACKEND_URL}/api/stream/${jobId}`);
+        let liveDialogueContainer = null;
+        let finished = false;
+
+        eventSource.addEventListener('status', (e) => {
+            const { status } = JSON.parse(e.data);
+            if (!FINAL_STATUSES.includes(status)) {
+                statusMessageDiv.innerHTML = `<p><i>Job ${jobId} is ${status}...</i></p>`;
+            }
+        });
+
+        eventSource.addEventListener('turns', (e) => {
+            const { turns } = JSON.parse(e.data);
+            if (!liveDialogueContainer) {
+                reportContentDiv.innerHTML = ''; // Clear placeholder "Please wait..."
+                const dialogueHeader = document.createElement('h4');
+                dialogueHeader.textContent = 'Conversation Dialogue (live):';
+                reportContentDiv.appendChild(dialogueHeader);
+                liveDialogueContainer = document.createElement('div');
+                liveDialogueContainer.className = 'dialogue-output';
+                reportContentDiv.appendChild(liveDialogueContainer);
+            }
+            turns.forEach(turn => appendDialogueTurn(liveDialogueContainer, turn));
+        });
+
+        eventSource.addEventListener('done', () => {
+            finished = true;
+            eventSource.close();
+            fetchAndDisplayReport(); // One request for the complete, stored report
+        });
+
+        eventSource.onerror = () => {
+            // EventSource retries on its own; only fall back once the browser has given up
+            if (!finished && eventSource.readyState === EventSource.CLOSED) {
+                console.warn("Event stream closed unexpectedly; fetching report directly.");
+                fetchAndDisplayReport();
+            }
+        };
+    }
+
     async function fetchAndDisplayReport() {
         if (!jobId) { // Should have been caught above, but double check
             displayErrorOnReportPage("Error: No Job ID available to fetch report.");
@@ -39,8 +105,8 @@ document.addEventListener('DOMContentLoaded', () => {
         statusMessageDiv.innerHTML = `<p><i>Fetching report data for Job ID: ${jobId}...</i></p>`;
 
         try {
-            // The API endpoint path is relative to BACKEND_URL
-            const response = await fetch(`${BACKEND_URL}/api/get_report_data/${jobId}`);
+            // The API endpoint path is relative to BACKEND_URL; the dialogue is paged separately below
+            const response = await fetch(`${BACKEND_URL}/api/get_report_data/${jobId}?dialogue=0`);
 
             if (!response.ok) {
                 let errorMsg = `Error fetching report data! Status: ${response.status}`;
@@ -53,45 +119,41 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorMsg);
             }
 
-            const resultData = await response.json(); // This is the content of the "data" field from backend's analysis_results
-            console.log("Fetched report data:", resultData);
+            const responseJson = await response.json(); // { status, data } from the backend
+            console.log("Fetched report data:", responseJson);
+
+            // Fallback when the event stream is unavailable: keep checking until the job reaches a final state
+            if (!FINAL_STATUSES.includes(responseJson.status)) {
+                statusMessageDiv.innerHTML = `<p><i>Job ${jobId} is ${responseJson.status}... this page will update automatically.</i></p>`;
+                setTimeout(fetchAndDisplayReport, STATUS_POLL_INTERVAL_MS);
+                return;
+            }
+            if (responseJson.status === 'failed') {
+                throw new Error(responseJson.data.error_message || "Processing failed on the server.");
+            }
+
+            const resultData = responseJson.data;
 
             statusMessageDiv.innerHTML = "<p style='color:#00c7d9;'>Report loaded successfully!</p>";
             reportContentDiv.innerHTML = ''; // Clear placeholder "Please wait..."
 
             // --- Display Full Transcript (if available) ---
-            if (resultData.full_transcript) {
+            if (resultData.raw_transcript) {
                 const transcriptHeader = document.createElement('h4');
                 transcriptHeader.textContent = 'Full Transcript:';
                 reportContentDiv.appendChild(transcriptHeader);
                 const transcriptPre = document.createElement('pre');
-                transcriptPre.textContent = resultData.full_transcript;
+                transcriptPre.textContent = resultData.raw_transcript;
                 reportContentDiv.appendChild(transcriptPre);
             }
 
-            // --- Display Speaker Dialogue ---
-            if (resultData.dialogue && resultData.dialogue.length > 0) {
-                const dialogueHeader = document.createElement('h4');
-                dialogueHeader.textContent = 'Conversation Dialogue:';
-                reportContentDiv.appendChild(dialogueHeader);
-
-                const dialogueContainer = document.createElement('div');
-                dialogueContainer.className = 'dialogue-output'; // From your CSS
-
-                resultData.dialogue.forEach(turn => {
-                    const turnP = document.createElement('p');
-                    turnP.className = 'dialogue-turn';
-                    const speakerSpan = document.createElement('strong');
-                    speakerSpan.textContent = `Speaker ${turn.speaker}: `;
-                    // Assign colors based on speaker label A, B, C...
-                    const speakerColors = { 'A': '#00c7d9', 'B': '#ffab00', 'C': '#ff6b6b', 'Unknown': '#cccccc' };
-                    speakerSpan.style.color = speakerColors[turn.speaker] || '#e1e1ff'; // Fallback color
-                    speakerSpan.className = `speaker-${turn.speaker}`; // For potential CSS styling
-                    turnP.appendChild(speakerSpan);
-                    turnP.appendChild(document.createTextNode(turn.text));
-                    dialogueContainer.appendChild(turnP);
-                });
-                reportContentDiv.appendChild(dialogueContainer);
+            // --- Display Speaker Dialogue (paged by time range) ---
+            const dialogueSection = document.createElement('div');
+            reportContentDiv.appendChild(dialogueSection);
+            try {
+                await loadDialogue(dialogueSection);
+            } catch (error) {
+                console.warn("Could not load dialogue:", error);
             }
 
             // --- Display Processed Text (if available) ---
@@ -109,7 +171,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 reportContentDiv.appendChild(processedP);
             }
 
-            // TODO Later: Add display logic for entities, keywords, generated summary from data object
+            // --- Generated report for the type chosen at upload ---
+            try {
+                await loadGeneratedReport('');
+            } catch (error) {
+                console.warn("Could not load generated report:", error);
+            }
 
         } catch (error) {
             console.error("Error in fetchAndDisplayReport:", error);
@@ -117,6 +184,63 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Dialogue Paging ---
+    // Turns are requested by start time (?from=&to=), so each page holds different turns
+    async function fetchDialoguePage(fromSeconds) {
+        const toSeconds = fromSeconds + DIALOGUE_PAGE_SECONDS;
+        const response = await fetch(`${BACKEND_URL}/api/get_report_data/${jobId}?from=${fromSeconds}&to=${toSeconds}`);
+        const responseJson = await response.json();
+        if (!response.ok) throw new Error(responseJson.error || `Server error ${response.status}`);
+        return responseJson.data; // { dialogue_json, dialogue_range: { first_turn, turns, total_turns, ... } }
+    }
+
+    async function loadDialogue(section) {
+        let dialogueContainer = null;
+        let moreButton = null;
+        let fromSeconds = 0;
+
+        async function loadNextPage() {
+            if (moreButton) moreButton.disabled = true;
+            let page, range;
+            do { // Skip over stretches without any turn starting in them
+                page = await fetchDialoguePage(fromSeconds);
+                range = page.dialogue_range;
+                fromSeconds += DIALOGUE_PAGE_SECONDS;
+            } while (page.dialogue_json.length === 0 && range.first_turn < range.total_turns);
+            if (range.total_turns === 0) return;
+
+            if (!dialogueContainer) {
+                const dialogueHeader = document.createElement('h4');
+                dialogueHeader.textContent = 'Conversation Dialogue:';
+                section.appendChild(dialogueHeader);
+                dialogueContainer = document.createElement('div');
+                dialogueContainer.className = 'dialogue-output'; // From your CSS
+                section.appendChild(dialogueContainer);
+            }
+            page.dialogue_json.forEach(turn => appendDialogueTurn(dialogueContainer, turn));
+
+            const shown = range.first_turn + range.turns;
+            if (shown < range.total_turns) {
+                if (!moreButton) {
+                    moreButton = document.createElement('button');
+                    moreButton.className = 'btn btn-secondary';
+                    moreButton.addEventListener('click', () => loadNextPage().catch(error => {
+                        console.error("Error loading more dialogue:", error);
+                        moreButton.disabled = false;
+                    }));
+                    section.appendChild(moreButton);
+                }
+                moreButton.textContent = `Show more (${shown} of ${range.total_turns} turns)`;
+                moreButton.disabled = false;
+            } else if (moreButton) {
+                moreButton.remove();
+                moreButton = null;
+            }
+        }
+
+        await loadNextPage();
+    }
+
     function displayErrorOnReportPage(message) {
         console.error("Displaying Error on Report Page:", message);
         if(reportContentDiv) reportContentDiv.innerHTML = ''; // Clear report area
@@ -125,32 +249,80 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // --- Placeholder Function for Submit Prompt (on report.html) ---
-     function handleSubmitRegeneratePromptClick() {
-         if (!regenerateTextInput || !submitRegeneratePromptButton || !statusMessageDiv) return;
-
-          const promptText = regenerateTextInput.value.trim();
-          if (!jobId) {
-               displayErrorOnReportPage("Job ID is missing, cannot submit prompt.");
-               return;
-          }
-          if (!promptText) {
-               displayErrorOnReportPage("Please enter a text prompt.");
-               return;
-          }
-          console.log(`Submitting prompt for Job ID ${jobId}: "${promptText}"`);
-          statusMessageDiv.innerHTML = '<p><i>Submitting prompt... (Feature Not Implemented Yet)</i></p>';
-          submitRegeneratePromptButton.disabled = true;
-
-          setTimeout(() => { // Simulate
-               console.log("Simulated prompt submission complete on report page.");
-               statusMessageDiv.innerHTML = '<p>Prompt submitted (Simulation). Further report generation not implemented.</p>';
-               submitRegeneratePromptButton.disabled = false;
-               const summaryPlaceholder = document.createElement('div');
-               summaryPlaceholder.innerHTML = `<h4 style="margin-top: 20px; color: #ffab00;">Generated Summary (Placeholder)</h4><p>Based on prompt: "${promptText}", a summary would appear here if the backend supported it.</p>`;
-               if (reportContentDiv) reportContentDiv.appendChild(summaryPlaceholder);
-          }, 1500);
-     }
+    // --- Generated Report (served from the stored transcript; repeat variants come from the server cache) ---
+    function renderGeneratedReport(report) {
+        let container = document.getElementById('generated-report');
+        if (!container) {
+            container = document.createElement('div');
+            container.id = 'generated-report';
+            reportContentDiv.prepend(container);
+        }
+        container.innerHTML = '';
+        const header = document.createElement('h4');
+        header.style.color = '#ffab00';
+        header.textContent = `Generated ${report.report_type} report` + (report.prompt ? ` (instructions: "${report.prompt}")` : '');
+        container.appendChild(header);
+
+        report.sections.forEach(section => {
+            const title = document.createElement('h5');
+            title.textContent = section.title;
+            container.appendChild(title);
+            if (section.stats) {
+                const statsP = document.createElement('p');
+                statsP.textContent = `${section.stats.speakers} speakers, ${section.stats.turns} turns, ${section.stats.words} words, ${section.stats.duration}`;
+                container.appendChild(statsP);
+                section.speakers.forEach(s => {
+                    const speakerP = document.createElement('p');
+                    speakerP.textContent = `Speaker ${s.speaker}: ${s.turns} turns, ${Math.round(s.share * 100)}% of words, ${s.seconds}s`;
+                    container.appendChild(speakerP);
+                });
+            }
+            const list = document.createElement('ul');
+            (section.items || []).forEach(item => {
+                const li = document.createElement('li');
+                li.textContent = item.term !== undefined
+                    ? `${item.term} (${item.count})`
+                    : `[${item.time ?? '--:--'}] Speaker ${item.speaker}: ${item.text}`;
+                list.appendChild(li);
+            });
+            if (list.children.length) container.appendChild(list);
+        });
+    }
+
+    async function loadGeneratedReport(promptText) {
+        const response = await fetch(`${BACKEND_URL}/api/report/${jobId}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ prompt: promptText })
+        });
+        const report = await response.json();
+        if (!response.ok) throw new Error(report.error || `Server error ${response.status}`);
+        console.log(`Report ${report.report_type} for job ${jobId} (${report.cached ? 'cached' : 'generated'})`);
+        renderGeneratedReport(report);
+        return report;
+    }
+
+    async function handleSubmitRegeneratePromptClick() {
+        if (!regenerateTextInput || !submitRegeneratePromptButton || !statusMessageDiv) return;
+
+        const promptText = regenerateTextInput.value.trim();
+        if (!jobId) {
+            displayErrorOnReportPage("Job ID is missing, cannot submit prompt.");
+            return;
+        }
+        console.log(`Regenerating report for Job ID ${jobId} with prompt: "${promptText}"`);
+        statusMessageDiv.innerHTML = '<p><i>Regenerating report...</i></p>';
+        submitRegeneratePromptButton.disabled = true;
+        try {
+            const report = await loadGeneratedReport(promptText);
+            statusMessageDiv.innerHTML = `<p style='color:#00c7d9;'>Report regenerated${report.cached ? ' (from cache)' : ''}.</p>`;
+        } catch (error) {
+            console.error("Error regenerating report:", error);
+            statusMessageDiv.innerHTML = `<p style="color:#ff4d4d; font-weight:bold;">Failed to regenerate report: ${error.message}</p>`;
+        } finally {
+            submitRegeneratePromptButton.disabled = false;
+        }
+    }
 
      if(submitRegeneratePromptButton){
           submitRegeneratePromptButton.addEventListener('click', handleSubmitRegeneratePromptClick);
@@ -158,7 +330,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Initial call to fetch data when report.html loads ---
     if(jobId) {
-        fetchAndDisplayReport();
+        followJobEvents();
     } else {
         // This else block is crucial if jobId wasn't found
         console.error("Job ID not found on page load via data-attribute or URL. Cannot fetch report.");